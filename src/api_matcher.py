@@ -0,0 +1,138 @@
+# Copyright (C) 2021 Aurore Fass
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+    Trie of API names, e.g., of the dangerous sinks or of the message passing APIs, to find the
+    ones a callee refers to by following the segments of its path, e.g., ('chrome', 'runtime',
+    'sendMessage'), instead of searching them in a str.
+"""
+
+import functools
+
+CACHE_SIZE = 10000  # Max number of paths whose matches are kept
+
+
+def add_segments(goto, out, segments):
+    """ Adds segments to the trie goto/out, returns the state they lead to. """
+
+    state = 0
+    for segment in segments:
+        next_state = goto[state].get(segment)
+        if next_state is None:
+            next_state = len(goto)
+            goto[state][segment] = next_state
+            goto.append(dict())
+            out.append(())
+        state = next_state
+    return state
+
+
+class ApiMatcher:
+    """ Finds the patterns, e.g., API names, that occur in or end a path, segment by segment. """
+
+    def __init__(self, patterns):
+        self.patterns = list(dict.fromkeys(patterns))  # Without duplicates, in order
+        self.inner = []  # Patterns of one segment, which may occur within a segment of a path
+        self.goto = [dict()]  # State -> {segment: next state}, the trie of the inner segments
+        self.out = [()]  # State -> (first segment, last segment, pattern) of its patterns
+        self.end_goto = [dict()]  # State -> {segment: next state}, the trie of the last segments
+        self.end_out = [()]  # State -> patterns whose segments lead to the state
+        self.cache = dict()  # Path -> matches, cf. find
+
+        for pattern in self.patterns:
+            segments = pattern.split('.')
+            state = add_segments(self.end_goto, self.end_out, reversed(segments))
+            self.end_out[state] += (pattern,)
+            if len(segments) == 1:
+                self.inner.append(pattern)
+            else:
+                # The first segment of a pattern may end a segment of the path and its last
+                # segment start one, e.g., '}.runtime.onMessage' in {...}.runtime.onMessageX
+                state = add_segments(self.goto, self.out, segments[1:-1])
+                self.out[state] += ((segments[0], segments[-1], pattern),)
+
+    def find(self, path):
+        """
+            Patterns in path, as if searched in the str of path, e.g., 'runtime.onMessage' or
+            '.onMessage.addListener' in ('chrome', 'runtime', 'onMessage', 'addListener').
+
+            -------
+            Parameter:
+            - path: tuple of str
+                Segments of a value, cf. pdg_js.call_value.get_path.
+
+            -------
+            Returns:
+            - set of str
+        """
+
+        matches = self.cache.get(path)
+        if matches is None:
+            matches = set()
+            for pattern in self.inner:
+                if any(pattern in segment for segment in path):
+                    matches.add(pattern)
+            goto = self.goto
+            out = self.out
+            length = len(path)
+            for first in range(length - 1):
+                state = 0
+                last = first + 1
+                while True:
+                    for (head, tail, pattern) in out[state]:
+                        if path[first].endswith(head) and path[last].startswith(tail):
+                            matches.add(pattern)
+                    if last == length - 1:
+                        break
+                    state = goto[state].get(path[last])
+                    if state is None:
+                        break
+                    last += 1
+            if len(self.cache) >= CACHE_SIZE:
+                self.cache.clear()
+            self.cache[path] = matches
+        return matches
+
+    def ends(self, path):
+        """
+            Patterns ending path, e.g., 'executeScript' and 'tabs.executeScript' for
+            ('chrome', 'tabs', 'executeScript'), but not 'Script'.
+
+            -------
+            Parameter:
+            - path: tuple of str
+                Segments of a value, cf. pdg_js.call_value.get_path.
+
+            -------
+            Returns:
+            - list of str
+        """
+
+        matches = []
+        state = 0
+        for segment in reversed(path):
+            state = self.end_goto[state].get(segment)
+            if state is None:
+                break
+            matches.extend(self.end_out[state])
+        return matches
+
+
+@functools.lru_cache(maxsize=None)
+def get_matcher(patterns):
+    """ ApiMatcher of the tuple patterns, compiled once. """
+
+    return ApiMatcher(patterns)
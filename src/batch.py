@@ -0,0 +1,282 @@
+# Copyright (C) 2021 Aurore Fass
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+    To analyze, from the command-line, a folder of extensions unpacked with unpack_extension.py
+    with long-lived worker processes. The extensions analyzed are recorded in a journal, so that
+    an interrupted run can be resumed.
+"""
+
+import os
+import json
+import queue
+import logging
+import timeit
+import argparse
+from multiprocessing import Process, Queue, Pipe
+from multiprocessing.connection import wait
+
+from vulnerability_detection import analyze_extension
+from pdg_js import parser_pool
+from pdg_js import utility_df
+
+
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__)))
+EMPTY_PATH = os.path.join(os.path.dirname(SRC_PATH), 'empty')
+
+NUM_WORKERS = os.cpu_count() or 1  # Default number of worker processes
+EXTENSION_TIMEOUT = 3600  # Default wall-clock budget of the analysis of an extension, in seconds
+TIMEOUT_GRACE = 60  # Past the budget, to store the partial results before the worker is killed
+
+# Components written by unpack_extension.unpack_extension in each extension folder
+CS = 'content_scripts.js'
+BP = 'background.js'
+WAR = 'wars.js'
+
+
+def get_component(extension_path, component):
+    """ Path of component in extension_path, or of the empty file if it was not extracted. """
+
+    path = os.path.join(extension_path, component)
+    if not os.path.isfile(path):
+        if component == CS:
+            return os.path.join(EMPTY_PATH, 'contentscript.js')
+        return os.path.join(EMPTY_PATH, 'background.js')
+    return path
+
+
+def get_analysis_path(extension_path, war):
+    """ Path of the analysis results, not to overwrite the background ones with the WAR ones. """
+
+    return os.path.join(extension_path, 'analysis_war.json' if war else 'analysis.json')
+
+
+def read_journal(journal):
+    """ Extensions recorded in the journal, mapped to their last entry. """
+
+    entries = dict()
+    if os.path.isfile(journal):
+        with open(journal) as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:  # E.g., last line of an interrupted run
+                    continue
+                entries[entry['extension']] = entry
+    return entries
+
+
+def write_journal(journal_file, extension, status, elapsed):
+    """ Appends the entry of extension to the journal, flushed for a run killed afterwards. """
+
+    journal_file.write(json.dumps({'extension': extension, 'status': status,
+                                   'time': round(elapsed, 3)}) + '\n')
+    journal_file.flush()
+    os.fsync(journal_file.fileno())
+
+
+def analyze_one_extension(extension_path, options):
+    """ Analyzes the unpacked extension in extension_path within options['timeout'] seconds,
+    returns its status. """
+
+    cs = get_component(extension_path, CS)
+    bp = get_component(extension_path, WAR if options['war'] else BP)
+    try:
+        analyze_extension(cs, bp, json_analysis=get_analysis_path(extension_path, options['war']),
+                          chrome=options['chrome'], war=options['war'],
+                          json_apis=options['apis'],
+                          manifest_path=os.path.join(extension_path, 'manifest.json'),
+                          deadline=utility_df.Timeout(options['timeout']))
+    except Exception:  # The worker can go on with the next extension
+        logging.exception('Something wrong occurred with the analysis of %s', extension_path)
+        return 'error'
+    return 'analyzed'
+
+
+def worker(my_queue, connection, options):
+    """ Worker, analyzing the extensions from my_queue until there are none left. Sends
+    ('start', extension) and ('end', extension, status, elapsed) to the supervisor. """
+
+    parser_pool.reset_parser_pool()  # Own Node.js parser processes, reused for all extensions
+    while True:
+        try:
+            extension, extension_path = my_queue.get(timeout=2)
+        except queue.Empty:
+            break
+        connection.send(('start', extension))
+        start = timeit.default_timer()
+        status = analyze_one_extension(extension_path, options)
+        connection.send(('end', extension, status, timeit.default_timer() - start))
+    connection.close()
+
+
+def run_batch(extensions_path, journal=None, workers=NUM_WORKERS, chrome=True, war=False,
+              json_apis='permissions', retry=False, timeout=EXTENSION_TIMEOUT):
+    """
+        Analyzes the extensions of extensions_path with long-lived worker processes.
+        A worker that dies, e.g., with a Segfault, is replaced and its extension recorded as
+        crashed, so that the other extensions are still analyzed. Likewise, a worker still
+        analyzing an extension TIMEOUT_GRACE seconds after its budget, e.g., stuck where the
+        timeouts of the analysis are not checked, is terminated and replaced, and the extension
+        recorded as timeout.
+
+        -------
+        Parameters:
+        - extensions_path: str
+            Path of the folder containing one folder per unpacked extension.
+        - journal: str/None
+            Path of the JSONL file recording the status of the extensions analyzed. The extensions
+            already recorded are not analyzed again. If None, default will be
+            <extensions_path>/doublex_batch.jsonl (doublex_batch_war.jsonl with war).
+        - workers: int
+            Number of worker processes.
+        - chrome / war / json_apis:
+            Cf. vulnerability_detection.analyze_extension.
+        - retry: bool
+            Whether to analyze again the extensions recorded with an error, as crashed, or as
+            timeout.
+        - timeout: float
+            Wall-clock budget of the analysis of each extension, in seconds.
+
+        -------
+        Returns:
+        - dict
+            Status -> number of extensions analyzed in this run with this status.
+    """
+
+    start = timeit.default_timer()
+    if journal is None:
+        journal = os.path.join(extensions_path,
+                               'doublex_batch_war.jsonl' if war else 'doublex_batch.jsonl')
+    done = read_journal(journal)
+    if retry:
+        done = {extension: entry for extension, entry in done.items()
+                if entry['status'] == 'analyzed'}
+    options = {'chrome': chrome, 'war': war, 'apis': json_apis, 'timeout': timeout}
+
+    my_queue = Queue()
+    tasks = 0
+    for extension in sorted(os.listdir(extensions_path)):
+        extension_path = os.path.join(extensions_path, extension)
+        if os.path.isdir(extension_path) and extension not in done:
+            my_queue.put([extension, extension_path])
+            tasks += 1
+    logging.info('%d extensions to analyze, %d already in %s', tasks, len(done), journal)
+
+    running = dict()  # Connection -> [Process, extension being analyzed, start]
+    stats = dict()
+
+    def start_worker():
+        receiver, sender = Pipe(duplex=False)
+        p = Process(target=worker, args=(my_queue, sender, options))
+        p.start()
+        sender.close()  # Only in the worker now, so that its exit closes the pipe
+        running[receiver] = [p, None, None]
+
+    def finish(extension, status, elapsed):
+        write_journal(journal_file, extension, status, elapsed)
+        stats[status] = stats.get(status, 0) + 1
+
+    with open(journal, 'a') as journal_file:
+        for _ in range(min(workers, tasks)):
+            start_worker()
+
+        while running:
+            started = [current[2] for current in running.values() if current[2] is not None]
+            next_check = None  # Until the next budget to be over, or for any message
+            if started:
+                next_check = max(min(started) + timeout + TIMEOUT_GRACE
+                                 - timeit.default_timer(), 0)
+            for receiver in wait(list(running), timeout=next_check):
+                current = running[receiver]
+                try:
+                    message = receiver.recv()
+                except EOFError:  # Worker exited, e.g., no extensions left or Segfault
+                    del running[receiver]
+                    receiver.close()
+                    p = current[0]
+                    p.join()
+                    if current[1] is not None:  # Died while analyzing an extension
+                        logging.critical('Something wrong occurred with the analysis of %s',
+                                         current[1])
+                        finish(current[1], 'crashed', timeit.default_timer() - current[2])
+                    if p.exitcode != 0:
+                        start_worker()  # Exits if there are no extensions left
+                    continue
+                if message[0] == 'start':
+                    current[1:] = [message[1], timeit.default_timer()]
+                else:
+                    finish(*message[1:])
+                    current[1:] = [None, None]
+
+            for receiver, current in list(running.items()):
+                if current[2] is not None \
+                        and timeit.default_timer() - current[2] > timeout + TIMEOUT_GRACE:
+                    logging.critical('The analysis of %s timed out, terminating its worker',
+                                     current[1])
+                    del running[receiver]
+                    receiver.close()
+                    current[0].terminate()  # Its parser processes exit with their stdin closed
+                    current[0].join()
+                    finish(current[1], 'timeout', timeit.default_timer() - current[2])
+                    start_worker()  # Exits if there are no extensions left
+
+    logging.info('Analyzed the extensions in %s: %s', extensions_path, stats)
+    logging.info('Total elapsed time: %ss', timeit.default_timer() - start)
+    return stats
+
+
+def main():
+    """ Parsing command line parameters. """
+
+    parser = argparse.ArgumentParser(prog='batch',
+                                     formatter_class=argparse.RawTextHelpFormatter,
+                                     description="Static analysis of a folder of browser "
+                                                 "extensions unpacked with unpack_extension.py, "
+                                                 "with several worker processes")
+
+    parser.add_argument("-d", "--directory", dest='d', metavar="path", type=str, required=True,
+                        help="path of the folder containing the unpacked extensions, "
+                             "one folder per extension")
+    parser.add_argument("-w", "--workers", metavar="int", type=int, default=NUM_WORKERS,
+                        help="number of worker processes. Default: number of CPUs")
+    parser.add_argument("--journal", metavar="path", type=str,
+                        help="path of the JSONL file recording the extensions analyzed, which "
+                             "are skipped when running again. "
+                             "Default: DIRECTORY/doublex_batch.jsonl")
+    parser.add_argument("--retry", action='store_true',
+                        help="analyze again the extensions recorded with an error, as crashed, "
+                             "or as timeout")
+    parser.add_argument("--timeout", metavar="float", type=float, default=EXTENSION_TIMEOUT,
+                        help="wall-clock budget of the analysis of each extension, in seconds. "
+                             "Default: %d" % EXTENSION_TIMEOUT)
+
+    parser.add_argument("--war", action='store_true',
+                        help="analyze the WARs (wars.js) instead of the background pages; "
+                             "the results are stored in analysis_war.json")
+    parser.add_argument("--not-chrome", dest='not_chrome', action='store_true',
+                        help="indicate that the extensions are not based on Chromium")
+    parser.add_argument("--apis", metavar="str", type=str, default='permissions',
+                        help="specify the sensitive APIs to consider for the analysis, "
+                             "cf. doublex.py. Default: 'permissions'")
+
+    args = parser.parse_args()
+    run_batch(args.d, journal=args.journal, workers=args.workers, chrome=not args.not_chrome,
+              war=args.war, json_apis=args.apis, retry=args.retry, timeout=args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Copyright (C) 2021 Aurore Fass
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+    Index of the call sites and assignments of a PDG, built in one traversal and shared by the
+    detection phases, instead of each of them traversing the PDG.
+"""
+
+from get_pdg import get_node_computed_value_e
+
+CALLS = ('CallExpression', 'TaggedTemplateExpression')
+
+
+class CallSite:
+    """ CallExpression/TaggedTemplateExpression node, with its callee if any. """
+
+    __slots__ = ('node', 'callee')
+
+    def __init__(self, node):
+        self.node = node
+        self.callee = None  # callee/tag Node
+        if node.children and node.children[0].body in ('callee', 'tag'):
+            self.callee = node.children[0]
+
+    def callee_value(self):
+        """ Value of the callee, computed once per epoch of the PDG, cf. get_node_computed_value.
+        """
+
+        return get_node_computed_value_e(self.callee)
+
+
+class CallSiteIndex:
+    """ Call sites and AssignmentExpression nodes of a PDG, in the order of a depth-first
+    traversal, i.e., in the order the detection phases used to find them. """
+
+    __slots__ = ('sites', 'calls')
+
+    def __init__(self, pdg):
+        self.sites = []  # CallSite or AssignmentExpression Node, in order
+        self.calls = []  # CallSite, in order
+        todo = list(reversed(pdg.children))
+        while todo:
+            node = todo.pop()
+            if node.name in CALLS:
+                call_site = CallSite(node)
+                self.sites.append(call_site)
+                self.calls.append(call_site)
+            elif node.name == 'AssignmentExpression':
+                self.sites.append(node)
+            todo.extend(reversed(node.children))
+
+    def callee_calls(self):
+        """ Call sites with a callee, in order. """
+
+        return [call_site for call_site in self.calls if call_site.callee is not None]
+
+
+def get_call_sites(pdg):
+    """ CallSiteIndex of pdg, built once and stored as attribute of the graph root. """
+
+    call_sites = getattr(pdg, 'call_sites', None)
+    if call_sites is None:
+        call_sites = CallSiteIndex(pdg)
+        setattr(pdg, 'call_sites', call_sites)
+    return call_sites
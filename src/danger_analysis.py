@@ -21,8 +21,10 @@
 import logging
 
 import pdg_js.node as _node
+from pdg_js.call_value import CallValue
 
 import utility
+import api_matcher
 from get_pdg import get_node_computed_value_e
 
 PRINT_DEBUG = utility.PRINT_DEBUG
@@ -65,6 +67,29 @@ class ExtensionAnalysis:
         self.dangers = Danger(direct=[], indirect=[], exfiltration=[])
         self.sinks = Danger(direct=direct_sinks, indirect=indirect_sinks,
                             exfiltration=exfiltration_sinks)
+        self.sink_matcher = SinkMatcher(self.sinks)
+
+
+class SinkMatcher:
+    """ Dangerous sinks of an extension component, compiled once into an ApiMatcher. """
+
+    def __init__(self, sinks):
+        self.order = dict()  # Kind of sinks -> sinks, in the order they are checked
+        self.rank = dict()  # Kind of sinks -> {sink: index of its first occurrence in order}
+        self.xhr = dict()  # Kind of sinks -> first XHR sink, cf. check_async_xhr
+        for which in ('direct', 'indirect', 'exfiltration'):
+            which_sinks = getattr(sinks, which)
+            if which_sinks is None:
+                continue
+            order = [sink for category in which_sinks.values() for sink in category]
+            self.order[which] = order
+            self.rank[which] = dict()
+            for index, sink in enumerate(order):
+                self.rank[which].setdefault(sink, index)
+                if sink in ('XMLHttpRequest().open', 'XMLHttpRequest.open'):
+                    self.xhr.setdefault(which, sink)
+        self.matcher = api_matcher.get_matcher(tuple(sink for order in self.order.values()
+                                                     for sink in order))
 
 
 class Extension:
@@ -89,39 +114,56 @@ def get_sink_name(sink):
     # So that, e.g., $.ajax and jQuery.ajax will be stored as ajax
 
 
-def check_dangerous_sinks(node, value, which_sinks):
-    """ Checks if the value 'value' of node is part of a dangerous sink. """
-
-    for sinks in which_sinks.values():
-        for sink in sinks:
-            found = False
-            if sink in value:
-                if value == sink:  # Perfect match
-                    found = True
-                else:
-                    # sink = '.' + sink  # May be useful to change sink name for debug
-                    if value.endswith('.' + sink):  # Sometimes the sink is used as X.sink
-                        found = True
-                if found:
-                    logging.debug('The dangerous sink %s was called', sink)
-                    if PRINT_DEBUG:
-                        traverse(node)
-                    return True, get_sink_name(sink)
-    return False, None
-
-
-def check_async_xhr(node, value, which_sinks):
-    """ Checks if the value 'value' of node is part of an asynchronous XHR sink. """
-
-    for sinks in which_sinks.values():
-        for sink in sinks:
-            if sink in ('XMLHttpRequest().open', 'XMLHttpRequest.open'):  # Check only for XHR
-                if 'XMLHttpRequest' in value and '.open(' in value:
-                    logging.debug('The dangerous sink %s was called', sink)
-                    if PRINT_DEBUG:
-                        traverse(node)
-                    return True, get_sink_name(sink)
-    return False, None
+def check_dangerous_sinks(node, path, sink_matcher):
+    """
+        Checks if the callee of node, whose path is 'path', is part of dangerous sinks.
+
+        -------
+        Parameters:
+        - node: Node
+            CallExpression/TaggedTemplateExpression.
+        - path: tuple of str
+            Path of the value of the callee of node, cf. pdg_js.call_value.get_path.
+        - sink_matcher: SinkMatcher
+            Dangerous sinks to look for.
+
+        -------
+        Returns:
+        - dict
+            'direct', 'indirect' or 'exfiltration' -> name of the first sink of this kind that
+            the callee is, in the order of the sinks.
+    """
+
+    found = dict()
+    # Perfect match, or sometimes the sink is used as X.sink
+    sinks = sink_matcher.matcher.ends(path)
+    if not sinks:
+        return found
+
+    for which, rank in sink_matcher.rank.items():
+        ranked = [rank[sink] for sink in sinks if sink in rank]
+        if ranked:
+            sink = sink_matcher.order[which][min(ranked)]
+            logging.debug('The dangerous sink %s was called', sink)
+            if PRINT_DEBUG:
+                traverse(node)
+            found[which] = get_sink_name(sink)
+    return found
+
+
+def check_async_xhr(node, value, sink_matcher):
+    """ Checks if the value 'value' of node is part of an asynchronous XHR sink, cf.
+    check_dangerous_sinks. """
+
+    found = dict()
+    if isinstance(value, CallValue) and value.path[-1] == 'open'\
+            and any('XMLHttpRequest' in segment for segment in value.path):
+        for which, sink in sink_matcher.xhr.items():
+            logging.debug('The dangerous sink %s was called', sink)
+            if PRINT_DEBUG:
+                traverse(node)
+            found[which] = get_sink_name(sink)
+    return found
 
 
 def search_call_params(node):
@@ -21,19 +21,23 @@
 import logging
 import timeit
 import json
+import functools
 import graphviz
 
 import pdg_js.node as _node
+from pdg_js.call_value import CallValue, get_path
 from pdg_js.value_filters import display_values
 import pdg_js.utility_df as utility_df
 
 import get_pdg
 from get_pdg import get_node_computed_value_e, get_node_value_e
+from call_sites import CallSite, get_call_sites
 # import display_extension
 import browser_api
 import chrome_api
 import messages
 import utility
+import api_matcher
 
 PRINT_DEBUG = utility.PRINT_DEBUG
 
@@ -158,33 +162,42 @@ def select_message_api_dict(where, chrome):
     return []
 
 
+@functools.lru_cache(maxsize=None)
+def get_message_api_matcher(where, chrome):
+    """ Message passing APIs relevant for the communication channel where, in the order they are
+    checked, and their ApiMatcher, compiled once. """
+
+    mess_apis = [(mess_api, mess_info) for my_dict in select_message_api_dict(where, chrome=chrome)
+                 for (mess_api, mess_info) in my_dict.items()]
+    matcher = api_matcher.get_matcher(tuple(mess_api for (mess_api, _) in mess_apis))
+    return mess_apis, matcher
+
+
 def find_message(node, value, all_messages, where, chrome):
-    """ Checks if value is part of an API to send/receive messages. """
+    """ Checks if value, of the callee of node, is part of an API to send/receive messages. """
 
     found = None
     message_api = get_message_api(chrome)
-    dict_list = select_message_api_dict(where, chrome=chrome)  # Message APIs to check
-
-    for my_dict in dict_list:
-        for (mess_api, mess_info) in my_dict.items():
-            if mess_api in value:  # value is part of an API to exchange messages
-                if not isinstance(mess_info, dict):  # Special case for postMessages
-                    if mess_info:
-                        mess_info = message_api.global_post_message(value)
-                    else:
-                        mess_info = message_api.port_post_message(value)
-
-                # Handles the message sent/received
-                try:
-                    found = handle_message(node, mess_api, mess_info, all_messages, where)
-                    break  # Only working if key order in dict is preserved; break inner loop
-                except utility_df.Timeout.Timeout as e:
-                    raise e  # Will be caught in vulnerability_detection
-                except Exception as e:
-                    logging.exception(e)
-        else:
-            continue  # Inner loop was not broken, continue iterating
-        break  # Inner loop was broken, breaks outer loop
+    mess_apis, matcher = get_message_api_matcher(where, chrome=chrome)  # Message APIs to check
+    value = str(value)  # The value of a(...) in a(...)(...) is searched with its arguments
+    matches = matcher.find(get_path(value))
+
+    for (mess_api, mess_info) in mess_apis:
+        if mess_api in matches:  # value is part of an API to exchange messages
+            if not isinstance(mess_info, dict):  # Special case for postMessages
+                if mess_info:
+                    mess_info = message_api.global_post_message(value)
+                else:
+                    mess_info = message_api.port_post_message(value)
+
+            # Handles the message sent/received
+            try:
+                found = handle_message(node, mess_api, mess_info, all_messages, where)
+                break  # Only working if key order in dict is preserved
+            except utility_df.Timeout.Timeout as e:
+                raise e  # Will be caught in vulnerability_detection
+            except Exception as e:
+                logging.exception(e)
 
     if found is not None:
         logging.debug('Found the message %s', found)
@@ -193,25 +206,23 @@ def find_message(node, value, all_messages, where, chrome):
     return None
 
 
-def find_all_messages(node, all_messages, where, chrome):
+def find_all_messages(pdg, all_messages, where, chrome):
     """ Finds all the nodes exchanging messages in a given PDG and stores them in all_messages. """
 
-    for child in node.children:
-        if child.name in ('CallExpression', 'TaggedTemplateExpression'):
-            if len(child.children) > 0 and child.children[0].body in ('callee', 'tag'):
-                callee = child.children[0]
-                call_expr_value = get_node_computed_value_e(callee)
-                if isinstance(call_expr_value, str):  # No need to check if it is not a str
-                    child.set_value(get_node_computed_value_e(child))
+    for site in get_call_sites(pdg).sites:
+        if isinstance(site, CallSite):
+            if site.callee is not None:
+                child = site.node
+                call_expr_value = site.callee_value()
+                if isinstance(call_expr_value, (str, CallValue)):  # No need to check otherwise
+                    child.set_value(get_node_computed_value_e(child), modified=False)
                     # Checks if call_expr_value is part of an API to exchange messages
                     find_message(child, call_expr_value, all_messages, where=where, chrome=chrome)
                     # if find_message is not None: found a message to be sent/received
 
-        elif where in ('cs2wa', 'wa2cs') and child.name == 'AssignmentExpression':
+        elif where in ('cs2wa', 'wa2cs'):  # AssignmentExpression
             # Detects the onmessage API
-            detect_onmessage(child, all_messages, where, chrome)
-
-        find_all_messages(child, all_messages, where, chrome=chrome)
+            detect_onmessage(site, all_messages, where, chrome)
 
 
 def detect_onmessage(child, all_messages, where, chrome):
@@ -242,7 +253,8 @@ def detect_onmessage(child, all_messages, where, chrome):
                 identifier_value = get_node_value_e(var.children[1])
         elif var.name == 'Identifier':
             identifier_value = get_node_value_e(var)
-        if isinstance(identifier_value, str) and 'onmessage' in identifier_value:
+        if isinstance(identifier_value, (str, CallValue))\
+                and 'onmessage' in str(identifier_value):
             init = child.children[1]
 
             if isinstance(init, (_node.FunctionExpression, _node.FunctionDeclaration)):
@@ -304,6 +316,7 @@ def update_receiver_all_dep(receiver, updated_id):
 
     if receiver.id in updated_id:
         return  # To avoid infinite loops
+    utility_df.check_timeout()  # Raises Timeout.Timeout if linking is taking too long
     updated_id.append(receiver.id)
     try:
         update_receiver_data_dep(receiver, updated_id=updated_id)  # Recursively updates data flow
@@ -335,14 +348,16 @@ def set_message_flow(sender, receiver, graph):
         receiver.set_provenance(sender)  # receiver is depending on sender
 
         old_receiver_value = receiver.value
-        if old_receiver_value is not None and not isinstance(old_receiver_value, str):
+        if old_receiver_value is not None\
+                and not isinstance(old_receiver_value, (str, CallValue)):
             logging.warning('The value %s will be overwritten', receiver.value)
         receiver.set_value(get_node_computed_value_e(sender))  # Receiver gets value of sender
         if isinstance(receiver, _node.Identifier):
             updated_id = list()
             # Receiver data and param flow get value of sender
             update_receiver_all_dep(receiver, updated_id=updated_id)
-        if old_receiver_value is not None and not isinstance(old_receiver_value, str):
+        if old_receiver_value is not None\
+                and not isinstance(old_receiver_value, (str, CallValue)):
             logging.warning('The value %s has been overwritten by %s',
                             old_receiver_value, receiver.value)
 
@@ -362,10 +377,12 @@ def link_message(pdg, sender, receiver, graph):
 
 
 def link_all_messages(pdg1, pdg2, where1, where2, benchmarks, chrome, graph=None,
-                      messages_dict=None):
-    """ Links all messages sent from pdg1/pdg2 to the recipient in the other one. """
+                      messages_dict=None, deadline=None):
+    """ Links all messages sent from pdg1/pdg2 to the recipient in the other one,
+    within 10 minutes and before the deadline (utility_df.Timeout) of the caller, if any. """
 
-    with utility_df.Timeout(600):  # Tries to link CS and BP PDG with messages within 10 minutes
+    # Tries to link CS and BP PDG with messages within 10 minutes
+    with utility_df.Timeout(600, parent=deadline):
 
         start = timeit.default_timer()
         all_messages = []
@@ -409,21 +426,8 @@ def link_all_messages(pdg1, pdg2, where1, where2, benchmarks, chrome, graph=None
         # pdg2 = df_scoping(pdg2, scopes=[_scope.Scope('Global')], id_list=[], entry=1)[0]
         # utility.print_separator()
 
-    try:
-        with utility.Timeout(10):  # Updating provenance should be extra fast
-            update_provenance(pdg1)  # Updates provenance by avoiding inconsistencies
-    except utility.Timeout.Timeout:  # not a timeout but a warning for us
-        logging.exception('Provenance update for %s', pdg1.get_file())
-    except utility_df.Timeout.Timeout as e:
-        raise e  # Will be caught in vulnerability_detection
-
-    try:
-        with utility.Timeout(10):  # Updating provenance should be extra fast
-            update_provenance(pdg2)  # Updates provenance by avoiding inconsistencies
-    except utility.Timeout.Timeout:  # not a timeout but a warning for us
-        logging.exception('Provenance update for %s', pdg2.get_file())
-    except utility_df.Timeout.Timeout as e:
-        raise e  # Will be caught in vulnerability_detection
+    # The missing A -> B -> C provenance is completed on demand, for the nodes checked for
+    # vulnerabilities, cf. vulnerability_detection.ProvenanceIndex
 
     benchmarks['linked messages'] = timeit.default_timer() - start
     utility_df.micro_benchmark('Successfully linked the messages sent and received in',
@@ -432,25 +436,27 @@ def link_all_messages(pdg1, pdg2, where1, where2, benchmarks, chrome, graph=None
     return pdg1, pdg2
 
 
-def produce_extension_pdg(cs_path, bp_path, benchmarks):
+def produce_extension_pdg(cs_path, bp_path, benchmarks, deadline=None):
     """
     Builds the PDG of an extension, meaning 1) produce the PDG of the content script and the PDG
     of the background page, and 2) link them by leveraging the passing messaging APIs.
 
     :param cs_path: str, path of the content script;
     :param bp_path: str, path of the background page;
-    :param benchmarks: dict, storing the time and ram info.
+    :param benchmarks: dict, storing the time and ram info;
+    :param deadline: utility_df.Timeout/None, deadline of the caller.
 
     :return: Node, Node: PDG of the CS and PDG of the BP.
     """
 
     # Builds the 2 PDGs
     utility.print_info('> PDG of ' + cs_path)
-    pdg_cs = get_pdg.get_pdg(file_path=cs_path, res_dict=benchmarks)  # Builds CS PDG
+    pdg_cs = get_pdg.get_pdg(file_path=cs_path, res_dict=benchmarks,
+                             deadline=deadline)  # Builds CS PDG
     update_benchmarks_pdg(benchmarks=benchmarks, whoami='cs')
 
     utility.print_info('---\n> PDG of ' + bp_path)
-    pdg_bp = get_pdg.get_pdg(file_path=bp_path, res_dict=benchmarks)
+    pdg_bp = get_pdg.get_pdg(file_path=bp_path, res_dict=benchmarks, deadline=deadline)
     update_benchmarks_pdg(benchmarks=benchmarks, whoami='bp')
 
     return pdg_cs, pdg_bp
@@ -499,7 +505,7 @@ def fetch_extension_pdg(cs_pdg_path, bp_pdg_path, benchmarks):
     return pdg_cs, pdg_bp
 
 
-def build_extension_pdg(cs_path, bp_path, benchmarks, pdg, chrome, messages_dict):
+def build_extension_pdg(cs_path, bp_path, benchmarks, pdg, chrome, messages_dict, deadline=None):
     """
     Builds the PDG of an extension, meaning links the content script to the background page
     by leveraging the passing messaging APIs.
@@ -509,7 +515,8 @@ def build_extension_pdg(cs_path, bp_path, benchmarks, pdg, chrome, messages_dict
     :param benchmarks: dict, storing the time and ram info;
     :param pdg: bool, True if the PDGs have already been generated and are stored in cs_path/bp_path
         False if cs_path/bp_path are the path of the CS/BP;
-    :param chrome: bool, True if we are handling a chrome extension, False for the rest.
+    :param chrome: bool, True if we are handling a chrome extension, False for the rest;
+    :param deadline: utility_df.Timeout/None, deadline of the caller.
 
     :return: Node, Node: PDG of the CS and PDG of the BP.
     """
@@ -519,7 +526,7 @@ def build_extension_pdg(cs_path, bp_path, benchmarks, pdg, chrome, messages_dict
                                              benchmarks=benchmarks)
     else:  # Generate the CS and BP PDGs before linking them
         pdg_cs, pdg_bp = produce_extension_pdg(cs_path=cs_path, bp_path=bp_path,
-                                               benchmarks=benchmarks)
+                                               benchmarks=benchmarks, deadline=deadline)
 
     utility.print_info('---\n> Links messages')
     graph = graphviz.Digraph(comment='Extension Dependence Graph (EDG)')
@@ -528,7 +535,8 @@ def build_extension_pdg(cs_path, bp_path, benchmarks, pdg, chrome, messages_dict
     try:
         pdg_cs, pdg_bp = link_all_messages(pdg1=pdg_cs, pdg2=pdg_bp, where1='cs2bp',
                                            where2='bp2cs', benchmarks=benchmarks, chrome=chrome,
-                                           graph=graph, messages_dict=messages_dict)
+                                           graph=graph, messages_dict=messages_dict,
+                                           deadline=deadline)
     except utility_df.Timeout.Timeout:
         logging.exception('Linking messages timed out for %s %s', cs_path, bp_path)
         if 'crashes' not in benchmarks:
@@ -567,16 +575,15 @@ def debug_wa_communication(wa_path, path2, who_is, chrome=True):
     # display_extension.draw_extensions(pdg_wa, pdg2, graph)
 
 
-def update_call_expr(node):
+def update_call_expr(pdg):
     """ Debug function to check if the CallExpression's value has been updated. """
 
-    for child in node.children:
-        if child.name in ('CallExpression', 'TaggedTemplateExpression'):
-            child.value = None  # Otherwise not recomputed and old cached value would be returned
-            call_expr_value = get_node_computed_value_e(child)
-            child.set_value(call_expr_value)
-            display_values(var=child)
-        update_call_expr(child)
+    for call_site in get_call_sites(pdg).calls:
+        child = call_site.node
+        child.set_value(None)  # Otherwise not recomputed and old cached value would be returned
+        call_expr_value = get_node_computed_value_e(child)
+        child.set_value(call_expr_value, modified=False)
+        display_values(var=child)
 
 
 def update_benchmarks_pdg(benchmarks, whoami):
@@ -596,23 +603,5 @@ def update_benchmarks_pdg(benchmarks, whoami):
         benchmarks[whoami + ': CFG'] = benchmarks.pop('CFG')
     if 'PDG' in benchmarks:
         benchmarks[whoami + ': PDG'] = benchmarks.pop('PDG')
-
-
-def update_provenance(node):
-    """ Updates the provenance of nodes, not containing all nodes they are depending on.
-    We focus on inconsistencies, e.g., A -> B -> C, meaning that C should depend on A. """
-
-    if isinstance(node, _node.Value):  # C
-        node_prov_parents = node.provenance_parents
-        for prov in node_prov_parents:  # B
-            if isinstance(prov, _node.Value):
-                for prov_child in prov.provenance_parents:  # A
-                    if prov_child not in node_prov_parents:  # if A not in C prov list
-                        # Can happen, e.g., BP sends a message to CS. Even though we rebuild CS PDG,
-                        # we may miss some provenance as we may only add them if we did not already
-                        # compute a given value. This is a workaround to add the missing ones.
-                        logging.debug('Whoops, %s is depending on %s',
-                                      node.attributes, prov_child.attributes)
-                        node.set_provenance(prov_child)
-    for child in node.children:
-        update_provenance(child)
+    if 'PDG cache' in benchmarks:  # Loaded from the cache, instead of got AST, AST, CFG, PDG
+        benchmarks[whoami + ': PDG cache'] = benchmarks.pop('PDG cache')
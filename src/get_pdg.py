@@ -15,32 +15,32 @@
 
 
 """
-    Gets or unpickles a PDG.
+    Gets or loads a stored PDG.
 """
 
 import logging
-import pickle
 
 import pdg_js.node as _node
+from pdg_js import pdg_store
 from pdg_js.build_pdg import get_data_flow
 from pdg_js.js_operators import get_node_computed_value, get_node_value
 import pdg_js.utility_df as utility_df
 
 
-def get_pdg(file_path, res_dict, store_pdgs=None):
+def get_pdg(file_path, res_dict, store_pdgs=None, deadline=None):
     """ Gets the PDG of a given file. """
 
     return get_data_flow(file_path, benchmarks=res_dict, store_pdgs=store_pdgs, save_path_pdg=False,
-                         beautiful_print=False, check_json=False)
+                         beautiful_print=False, check_json=False, deadline=deadline)
 
 
 def unpickle_pdg(pdg_path):
-    """ Tries to unpickle a given PDG. """
+    """ Tries to load a given PDG, stored by build_pdg.store_pdg. """
 
-    logging.info('Unpickling %s', pdg_path)
+    logging.info('Loading %s', pdg_path)
     try:
-        pdg = pickle.load(open(pdg_path, 'rb'))
-        return pdg
+        with open(pdg_path, 'rb') as pdg_file:
+            return pdg_store.load_pdg(pdg_file)
     except utility_df.Timeout.Timeout as e:
         raise e  # Will be caught in vulnerability_detection
     except:
@@ -22,6 +22,7 @@
 import logging
 
 import pdg_js.node as _node
+from pdg_js.call_value import CallValue
 
 from get_pdg import get_node_computed_value_e
 import messages
@@ -177,7 +178,8 @@ def find_promise_resolve(node):
         if len(node.children) > 0 and node.children[0].body in ('callee', 'tag'):
             callee = node.children[0]
             call_expr_value = get_node_computed_value_e(callee)
-            if isinstance(call_expr_value, str) and 'Promise.resolve' in call_expr_value:
+            if isinstance(call_expr_value, (str, CallValue))\
+                    and 'Promise.resolve' in str(call_expr_value):
                 return True, node
 
     for child in node.children:
@@ -191,7 +193,7 @@ def find_promise_resolve(node):
 def browser_runtime_sendMessage(node, mess_type_from):
     """ Handling browser_runtime_sendMessage. """
 
-    if 'then' not in node.value:  # Message sent
+    if 'then' not in str(node.value):  # Message sent
         logging.debug('A browser_runtime_sendMessage message was sent')
         # Params can be (mess), (extensionId, mess), (extensionId, mess, options)
         if len(node.children) == 2:  # Number of children = CallExpr name + number parameters
@@ -235,7 +237,7 @@ def browser_runtime_connect(node, mess_type_from):
 def browser_tabs_sendMessage(node, mess_type_from):
     """ Handling browser_tabs_sendMessage. """
 
-    if 'then' not in node.value:  # Message sent
+    if 'then' not in str(node.value):  # Message sent
         logging.debug('Handling browser_tabs_sendMessage')
         # Param can be (tabId, message, options), (tabId, message)
         if len(node.children) <= 4:
@@ -379,7 +381,7 @@ def add_event_listener(node, mess_type_from):
 
     logging.debug('Handling addEventListener')
     global_obj = ['window', 'this', 'that', 'self', 'top', 'global', 'source']
-    call_expr_value = node.value
+    call_expr_value = str(node.value)
 
     if '.addEventListener' not in call_expr_value or '.addEventListener' in call_expr_value \
             and (any(g in call_expr_value for g in global_obj)):
@@ -616,7 +618,8 @@ def search_depreciated_apis(node, depreciated_apis):
             if len(child.children) > 0 and child.children[0].body in ('callee', 'tag'):
                 callee = child.children[0]
                 call_expr_value = get_node_computed_value_e(callee)
-                if isinstance(call_expr_value, str):  # No need to check if it is not a str
+                if isinstance(call_expr_value, (str, CallValue)):  # No need to check otherwise
+                    call_expr_value = str(call_expr_value)
                     call_expr_value_all = get_node_computed_value_e(child)
                     if 'chrome.extension' in call_expr_value\
                             and (any(api in call_expr_value for api in runtime)
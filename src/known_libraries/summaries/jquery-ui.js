@@ -0,0 +1,3 @@
+// Summary of jQuery UI (cf. library_fingerprints.py): the globals it defines, no data flow from
+// its API to sinks.
+jQuery.ui = {};
@@ -0,0 +1,20 @@
+// Summary of jQuery (cf. library_fingerprints.py): the globals it defines and the data flows from
+// its API to sinks. $.ajax, $.get, and $.post are already considered as sinks where called.
+// Note: $ is defined last, as it gets the properties jQuery has at that time.
+function jQuery(selector, context) {
+    return new jQuery.fn.init(selector, context);
+}
+jQuery.fn = jQuery.prototype = {};
+jQuery.fn.init = function (selector, context) {
+    return this;
+};
+jQuery.globalEval = function (code) {
+    eval(code);
+};
+jQuery.getJSON = function (url, data, callback) {
+    return jQuery.get(url, data, callback, "json");
+};
+jQuery.getScript = function (url, callback) {
+    return jQuery.get(url, undefined, callback, "script");
+};
+var $ = jQuery;
@@ -0,0 +1,158 @@
+# Copyright (C) 2021 Aurore Fass
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+    Recognizing known third-party libraries (e.g., jQuery) by their normalized content hash,
+    whatever their file name, to replace them with a summary of their data flows to sinks.
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+import argparse
+import functools
+
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__)))
+LIBRARIES_PATH = os.path.join(SRC_PATH, 'known_libraries')
+FINGERPRINTS_PATH = os.path.join(LIBRARIES_PATH, 'fingerprints.json')
+SUMMARIES_PATH = os.path.join(LIBRARIES_PATH, 'summaries')
+
+SOURCE_MAP = re.compile(rb'^\s*//[#@]\s*sourceMappingURL=.*$', re.MULTILINE)
+WHITESPACES = re.compile(rb'\s+')
+# Tokens whose whitespaces are normalized differently: string literals, kept as they are, comments,
+# and regex literals (after a punctuator, as their quotes do not start a string), whose runs of
+# whitespaces become one space as in the code. A quote without its closing one is skipped
+TOKENS = re.compile(rb'''
+    (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|`(?:[^`\\]|\\.)*`)
+    |(?P<comment>//[^\n]*|/\*.*?\*/)
+    |(?P<before>[(,=:\[!&|?{;]\s*)(?P<regex>/(?![*/])(?:[^/\\\n\[]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/)
+    |\s+''', re.DOTALL | re.VERBOSE)
+
+
+def normalize_token(match):
+    if match.group('string') is not None:
+        return match.group('string')
+    if match.group('comment') is not None:
+        return WHITESPACES.sub(b' ', match.group('comment'))
+    if match.group('regex') is not None:
+        return WHITESPACES.sub(b' ', match.group('before')) + match.group('regex')
+    return b' '
+
+
+def normalize(content):
+    """ Removes what differs between copies of a library build: BOM, source map, indentation and
+    line endings, i.e., runs of whitespaces outside of the string literals become one space. """
+
+    if content.startswith(b'\xef\xbb\xbf'):
+        content = content[3:]
+    content = SOURCE_MAP.sub(b'', content.replace(b'\r\n', b'\n'))
+    return TOKENS.sub(normalize_token, content).strip()
+
+
+def fingerprint(content):
+    """ Returns the sha256 of the normalized content (bytes) of a script. """
+
+    return hashlib.sha256(normalize(content)).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def get_fingerprints(fingerprints_path=FINGERPRINTS_PATH):
+    """ Returns the dict fingerprint -> {library, version, file} of the known builds. """
+
+    try:
+        with open(fingerprints_path) as json_data:
+            return json.load(json_data)['fingerprints']
+    except (OSError, ValueError, KeyError):
+        logging.exception('Could not load the library fingerprints from %s', fingerprints_path)
+        return dict()
+
+
+def match_library(content):
+    """
+        Looks for a script in the known library builds.
+
+        -------
+        Parameter:
+        - content: bytes
+            Content of the script.
+
+        -------
+        Returns:
+        - dict
+            {library, version, file} of the matching build.
+        - or None if unknown.
+    """
+
+    return get_fingerprints().get(fingerprint(content))
+
+
+@functools.lru_cache(maxsize=None)
+def get_summary(library):
+    """
+        Returns the JS summary of library, modeling only the globals it defines and the data
+        flows from its API to sinks, so that the library code itself is not analyzed.
+    """
+
+    summary_path = os.path.join(SUMMARIES_PATH, library + '.js')
+    try:
+        with open(summary_path) as summary:
+            return summary.read()
+    except OSError:
+        logging.error('No summary for the library %s', library)
+        return ''
+
+
+def add_fingerprint(js_path, library, version, fingerprints_path=FINGERPRINTS_PATH):
+    """ Adds the build js_path of library in version to the fingerprint database. """
+
+    with open(js_path, 'rb') as js_file:
+        content = js_file.read()
+    with open(fingerprints_path) as json_data:
+        database = json.load(json_data)
+    database['fingerprints'][fingerprint(content)] = {'library': library, 'version': version,
+                                                      'file': os.path.basename(js_path)}
+    with open(fingerprints_path, 'w') as json_data:
+        json.dump(database, json_data, indent=2, sort_keys=False)
+        json_data.write('\n')
+    get_fingerprints.cache_clear()
+    if not os.path.isfile(os.path.join(SUMMARIES_PATH, library + '.js')):
+        logging.warning('There is no summary for %s yet, add it in %s', library, SUMMARIES_PATH)
+
+
+def main():
+    """ Parsing command line parameters. """
+
+    parser = argparse.ArgumentParser(prog='library_fingerprints',
+                                     formatter_class=argparse.RawTextHelpFormatter,
+                                     description="Adds a build of a third-party library to the "
+                                                 "fingerprint database")
+
+    parser.add_argument("-s", "--source", dest='s', metavar="path", type=str,
+                        required=True, help="path of the library build (*.js)")
+    parser.add_argument("-l", "--library", dest='l', metavar="str", type=str,
+                        required=True, help="name of the library, "
+                                            "with a summary in known_libraries/summaries/")
+    parser.add_argument("-v", "--version", dest='v', metavar="str", type=str,
+                        required=True, help="version of the library")
+
+    args = parser.parse_args()
+    add_fingerprint(js_path=args.s, library=args.l, version=args.v)
+
+
+if __name__ == "__main__":
+    main()
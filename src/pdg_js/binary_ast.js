@@ -0,0 +1,234 @@
+// Copyright (C) 2021 Aurore Fass
+//
+// This program is free software: you can redistribute it and/or modify
+// it under the terms of the GNU Affero General Public License as published
+// by the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+// GNU Affero General Public License for more details.
+//
+// You should have received a copy of the GNU Affero General Public License
+// along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+// Compact binary encoding of an Esprima AST, decoded by binary_ast.py.
+// Same content as JSON.stringify(ast), as a preorder stream of int32 tags with interned strings,
+// interned object shapes (type + keys) and numeric locations. Layout (little-endian):
+//   header: 'DXAB', then uint32 version, nb_strings, nb_shape_ints, nb_floats, nb_stream,
+//           nb_string_bytes
+//   int32 string byte lengths, int32 shapes (type string or -1, nb_keys, key strings),
+//   float64 numbers, int32 stream, WTF-8 strings (UTF-8, lone surrogates kept as 3 bytes, as
+//   JSON.stringify escapes them).
+
+
+module.exports = {
+    encode: encode,
+};
+
+
+var VERSION = 1;
+
+var NULL = 0;
+var TRUE = 1;
+var FALSE = 2;
+var INT = 3;  // int32 value
+var FLOAT = 4;  // index of a float64
+var BIG_INT = 5;  // index of a float64 holding an integer too big for an int32
+var STRING = 6;  // index of a string
+var ARRAY = 7;  // length, then the elements
+var OBJECT = 8;  // index of a shape, then the values in the shape key order
+var LOC = 9;  // start line, start column, end line, end column
+var RANGE = 10;  // start, end
+
+var INT32_MIN = -2147483648;
+var INT32_MAX = 2147483647;
+
+
+var SURROGATE = /[\uD800-\uDFFF]/;
+
+
+function wtf8(value) {
+    // Buffer.from(value, 'utf8') would replace the lone surrogates with U+FFFD
+    if (!SURROGATE.test(value)) {
+        return Buffer.from(value, 'utf8');
+    }
+    var bytes = [];
+    for (var i = 0; i < value.length; i++) {
+        var code = value.charCodeAt(i);
+        if (code >= 0xD800 && code <= 0xDBFF && i + 1 < value.length) {
+            var low = value.charCodeAt(i + 1);
+            if (low >= 0xDC00 && low <= 0xDFFF) {
+                code = 0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00);
+                i++;
+            }
+        }
+        if (code < 0x80) {
+            bytes.push(code);
+        } else if (code < 0x800) {
+            bytes.push(0xC0 | (code >> 6), 0x80 | (code & 0x3F));
+        } else if (code < 0x10000) {
+            bytes.push(0xE0 | (code >> 12), 0x80 | ((code >> 6) & 0x3F), 0x80 | (code & 0x3F));
+        } else {
+            bytes.push(0xF0 | (code >> 18), 0x80 | ((code >> 12) & 0x3F),
+                0x80 | ((code >> 6) & 0x3F), 0x80 | (code & 0x3F));
+        }
+    }
+    return Buffer.from(bytes);
+}
+
+
+function isInt32(value) {
+    return typeof value === 'number' && Number.isInteger(value) && value >= INT32_MIN
+        && value <= INT32_MAX;
+}
+
+
+function isLoc(value) {
+    var keys = Object.keys(value);
+    return keys.length === 2 && keys[0] === 'start' && keys[1] === 'end'
+        && isPosition(value.start) && isPosition(value.end);
+}
+
+
+function isPosition(value) {
+    if (value === null || typeof value !== 'object') {
+        return false;
+    }
+    var keys = Object.keys(value);
+    return keys.length === 2 && keys[0] === 'line' && keys[1] === 'column'
+        && isInt32(value.line) && isInt32(value.column);
+}
+
+
+/**
+ * Binary encoding of ast.
+ *
+ * @param ast
+ * @returns {Buffer}
+ */
+function encode(ast) {
+    var strings = [];
+    var stringIds = new Map();
+    var shapes = [];
+    var shapeIds = new Map();
+    var floats = [];
+    var stream = new Int32Array(1 << 16);
+    var length = 0;
+
+    function emit(value) {
+        if (length === stream.length) {
+            var bigger = new Int32Array(stream.length * 2);
+            bigger.set(stream);
+            stream = bigger;
+        }
+        stream[length++] = value;
+    }
+
+    function string(value) {
+        var id = stringIds.get(value);
+        if (id === undefined) {
+            id = strings.length;
+            strings.push(value);
+            stringIds.set(value, id);
+        }
+        return id;
+    }
+
+    function shape(type, keys) {
+        var signature = JSON.stringify([type, keys]);
+        var id = shapeIds.get(signature);
+        if (id === undefined) {
+            id = shapeIds.size;
+            shapeIds.set(signature, id);
+            shapes.push(type === null ? -1 : string(type), keys.length);
+            for (var i = 0; i < keys.length; i++) {
+                shapes.push(string(keys[i]));
+            }
+        }
+        return id;
+    }
+
+    // Explicit stack of [value, key] to handle deep ASTs
+    var todo = [[ast, null]];
+    while (todo.length) {
+        var item = todo.pop();
+        var value = item[0];
+        var key = item[1];
+
+        if (value === null || value === undefined || typeof value === 'function') {
+            emit(NULL);  // Only in arrays: undefined properties are skipped, as in JSON
+        } else if (value === true) {
+            emit(TRUE);
+        } else if (value === false) {
+            emit(FALSE);
+        } else if (typeof value === 'number') {
+            if (!isFinite(value)) {
+                emit(NULL);
+            } else if (isInt32(value)) {
+                emit(INT);
+                emit(value);
+            } else {
+                emit(Number.isInteger(value) && Math.abs(value) < 1e21 ? BIG_INT : FLOAT);
+                emit(floats.length);
+                floats.push(value);
+            }
+        } else if (typeof value === 'string') {
+            emit(STRING);
+            emit(string(value));
+        } else if (Array.isArray(value)) {
+            if (key === 'range' && value.length === 2 && isInt32(value[0]) && isInt32(value[1])) {
+                emit(RANGE);
+                emit(value[0]);
+                emit(value[1]);
+            } else {
+                emit(ARRAY);
+                emit(value.length);
+                for (var i = value.length - 1; i >= 0; i--) {
+                    todo.push([value[i], null]);
+                }
+            }
+        } else if (key === 'loc' && isLoc(value)) {
+            emit(LOC);
+            emit(value.start.line);
+            emit(value.start.column);
+            emit(value.end.line);
+            emit(value.end.column);
+        } else {
+            var type = typeof value.type === 'string' ? value.type : null;
+            var keys = Object.keys(value).filter(function (k) {
+                return value[k] !== undefined && typeof value[k] !== 'function'
+                    && !(k === 'type' && type !== null);
+            });
+            emit(OBJECT);
+            emit(shape(type, keys));
+            for (var j = keys.length - 1; j >= 0; j--) {
+                todo.push([value[keys[j]], keys[j]]);
+            }
+        }
+    }
+
+    // Each string encoded on its own, not to pair surrogates across 2 strings
+    var lengths = new Int32Array(strings.length);
+    var encoded = new Array(strings.length);
+    for (var k = 0; k < strings.length; k++) {
+        encoded[k] = wtf8(strings[k]);
+        lengths[k] = encoded[k].length;
+    }
+    var stringBytes = Buffer.concat(encoded);
+
+    var header = Buffer.alloc(28);
+    header.write('DXAB', 0, 'latin1');
+    header.writeUInt32LE(VERSION, 4);
+    header.writeUInt32LE(strings.length, 8);
+    header.writeUInt32LE(shapes.length, 12);
+    header.writeUInt32LE(floats.length, 16);
+    header.writeUInt32LE(length, 20);
+    header.writeUInt32LE(stringBytes.length, 24);
+
+    return Buffer.concat([header, Buffer.from(lengths.buffer),
+        Buffer.from(Int32Array.from(shapes).buffer), Buffer.from(Float64Array.from(floats).buffer),
+        Buffer.from(stream.buffer, 0, length * 4), stringBytes]);
+}
@@ -0,0 +1,229 @@
+# Copyright (C) 2021 Aurore Fass
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+    Decoding of the binary AST format produced by binary_ast.js: preorder stream of int32 tags
+    with interned strings (WTF-8, keeping the lone surrogates), interned object shapes (type + keys)
+    and numeric locations.
+"""
+
+import os
+import sys
+import json
+import array
+import decimal
+import struct
+import timeit
+import tracemalloc
+
+from . import parser_pool
+
+VERSION = 1
+HEADER = struct.Struct('<4s6I')
+
+NULL = 0
+TRUE = 1
+FALSE = 2
+INT = 3
+FLOAT = 4
+BIG_INT = 5
+STRING = 6
+ARRAY = 7
+OBJECT = 8
+LOC = 9
+RANGE = 10
+
+
+class BinaryAst:
+    """ Sections of a binary AST. """
+
+    def __init__(self, data):
+        magic, version, nb_strings, nb_shape_ints, nb_floats, nb_stream, nb_string_bytes = \
+            HEADER.unpack_from(data)
+        if magic != b'DXAB' or version != VERSION:
+            raise ValueError('Not a binary AST of version %d' % VERSION)
+
+        view = memoryview(data)
+        offset = HEADER.size
+        lengths, offset = read_array('i', view, offset, nb_strings)
+        shape_ints, offset = read_array('i', view, offset, nb_shape_ints)
+        floats, offset = read_array('d', view, offset, nb_floats)
+        self.stream, offset = read_array('i', view, offset, nb_stream)
+        string_bytes = bytes(view[offset:offset + nb_string_bytes])
+
+        self.strings = []
+        start = 0
+        for length in lengths:
+            self.strings.append(sys.intern(string_bytes[start:start + length]
+                                           .decode('utf-8', 'surrogatepass')))
+            start += length
+
+        self.floats = floats.tolist()
+
+        # Shape: (type or None, tuple of keys)
+        self.shapes = []
+        i = 0
+        while i < len(shape_ints):
+            ast_type = self.strings[shape_ints[i]] if shape_ints[i] != -1 else None
+            nb_keys = shape_ints[i + 1]
+            keys = tuple(self.strings[k] for k in shape_ints[i + 2:i + 2 + nb_keys])
+            self.shapes.append((ast_type, keys))
+            i += 2 + nb_keys
+
+
+def read_array(typecode, view, offset, nb_items):
+    """ Reads nb_items little-endian items of type typecode from view[offset:]. """
+
+    items = array.array(typecode)
+    end = offset + nb_items * items.itemsize
+    items.frombytes(view[offset:end])
+    if sys.byteorder == 'big':
+        items.byteswap()
+    return items, end
+
+
+def value_decoder(binary_ast, next_int):
+    """
+        Returns the functions decoding into dicts/lists a value, from its tag, and an object,
+        from its shape.
+    """
+
+    strings = binary_ast.strings
+    shapes = binary_ast.shapes
+    floats = binary_ast.floats
+
+    def value(tag):
+        if tag == OBJECT:
+            ast_type, keys = shapes[next_int()]
+            return object_value(ast_type, keys)
+        if tag == STRING:
+            return strings[next_int()]
+        if tag == ARRAY:
+            return [value(next_int()) for _ in range(next_int())]
+        if tag == INT:
+            return next_int()
+        if tag == NULL:
+            return None
+        if tag == TRUE:
+            return True
+        if tag == FALSE:
+            return False
+        if tag == FLOAT:
+            return floats[next_int()]
+        if tag == BIG_INT:  # As json.loads on the shortest repr of JSON.stringify, over 2**53 too
+            return int(decimal.Decimal(repr(floats[next_int()])))
+        if tag == LOC:
+            return {'start': {'line': next_int(), 'column': next_int()},
+                    'end': {'line': next_int(), 'column': next_int()}}
+        if tag == RANGE:
+            return [next_int(), next_int()]
+        raise ValueError('Unknown tag %s in binary AST' % tag)
+
+    def object_value(ast_type, keys):
+        dico = {'type': ast_type} if ast_type is not None else {}
+        for key in keys:
+            tag = next_int()
+            if tag == STRING:
+                dico[key] = strings[next_int()]
+            elif tag == LOC:
+                dico[key] = {'start': {'line': next_int(), 'column': next_int()},
+                             'end': {'line': next_int(), 'column': next_int()}}
+            elif tag == RANGE:
+                dico[key] = [next_int(), next_int()]
+            else:
+                dico[key] = value(tag)
+        return dico
+
+    return value, object_value
+
+
+def decode(data):
+    """
+        Decodes a binary AST into the same dicts and lists as json.loads on the JSON AST.
+
+        -------
+        Parameters:
+        - data: bytes
+            Output of binary_ast.js encode function.
+
+        -------
+        Returns:
+        - dict
+            Esprima AST.
+    """
+
+    binary_ast = BinaryAst(data)
+    next_int = iter(binary_ast.stream).__next__
+    value, _ = value_decoder(binary_ast, next_int)
+    return value(next_int())
+
+
+def measure(function, *args):
+    """ Returns the result, the time and the peak memory of function(*args). """
+
+    start = timeit.default_timer()
+    function(*args)
+    elapsed = timeit.default_timer() - start
+    tracemalloc.start()
+    result = function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def benchmark_interchange(files, lean=True):
+    """
+        Compares the JSON and binary AST interchange between parser.js and Python.
+        For each file, prints the size of the AST, the time to get it from the parser process
+        (including the serialization and the transfer), and the time and peak memory to decode
+        it in Python.
+
+        -------
+        Parameters:
+        - files: list
+            Paths of the JS files to benchmark, e.g., large background scripts.
+        - lean: bool
+            Whether to use the lean mode (no tokens and comments). Default: True.
+    """
+
+    pool = parser_pool.get_parser_pool()
+    print('%-30s %6s %10s %10s %10s %10s' % ('file', 'format', 'size (kB)', 'parse (s)',
+                                             'decode (s)', 'peak (MB)'))
+    for input_file in files:
+        json_path = input_file + '.bench.json'
+
+        start = timeit.default_timer()
+        if pool.parse(input_file, json_path, lean=lean) is None:
+            print('%-30s parsing error' % os.path.basename(input_file))
+            continue
+        with open(json_path) as json_data:
+            json_ast = json_data.read()
+        parse_time = timeit.default_timer() - start
+        size = os.path.getsize(json_path)
+        os.remove(json_path)
+        ast, decode_time, peak = measure(json.loads, json_ast)
+        print('%-30s %6s %10.0f %10.3f %10.3f %10.1f'
+              % (os.path.basename(input_file), 'json', size / 1e3, parse_time, decode_time,
+                 peak / 1e6))
+
+        start = timeit.default_timer()
+        data = pool.parse(input_file, lean=lean, binary=True)
+        parse_time = timeit.default_timer() - start
+        binary_ast, decode_time, peak = measure(decode, data)
+        print('%-30s %6s %10.0f %10.3f %10.3f %10.1f'
+              % ('', 'binary', len(data) / 1e3, parse_time, decode_time, peak / 1e6))
+        if binary_ast != ast:
+            print('%-30s the binary and JSON ASTs differ' % '')
@@ -27,15 +27,70 @@
 import logging
 import json
 import os
+import sys
 import subprocess
 
 from . import node as _node
 from . import extended_ast as _extended_ast
+from . import parser_pool
+from . import binary_ast
+from . import utility_df
 
 SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__)))
 
+# Class of the Node to create for each Esprima type, _node.Node otherwise
+NODE_CLASSES = dict.fromkeys(_node.STATEMENTS, _node.Statement)
+NODE_CLASSES.update(dict.fromkeys(_node.VALUE_EXPR, _node.ValueExpr))
+NODE_CLASSES.update({'FunctionDeclaration': _node.FunctionDeclaration,
+                     'FunctionExpression': _node.FunctionExpression,
+                     'ArrowFunctionExpression': _node.FunctionExpression,
+                     'ReturnStatement': _node.ReturnStatement,
+                     'Identifier': _node.Identifier})
 
-def get_extended_ast(input_file, json_path, remove_json=True):
+
+def get_binary_ast(input_file, json_path, lean=False):
+    """
+        JavaScript AST production, in the binary format of binary_ast.js.
+
+        -------
+        Parameters:
+        - input_file: str
+            Path of the file to produce an AST from.
+        - json_path: str
+            Path of the file to temporary store the AST in, if not using the parser processes.
+        - lean: bool
+            Indicates whether to skip the tokens and comments, which are only needed to generate
+            the code back with Escodegen. Default: False.
+
+        -------
+        Returns:
+        - bytes
+            The binary AST of input_file.
+        - None if an error occurred.
+    """
+
+    if utility_df.PARSER_DAEMON:
+        return parser_pool.get_parser_pool().parse(input_file, lean=lean, binary=True)
+
+    try:
+        subprocess.run(['node', os.path.join(SRC_PATH, 'parser.js'), input_file, json_path,
+                        '--binary'] + (['--lean'] if lean else []),
+                       stdout=subprocess.PIPE, check=True, timeout=utility_df.remaining_time())
+    except subprocess.TimeoutExpired:  # Process killed
+        raise utility_df.Timeout.Timeout()
+    except subprocess.CalledProcessError:
+        logging.critical('Esprima parsing error for %s', input_file)
+        return None
+    if not os.path.isfile(json_path):
+        logging.critical('Esprima could not produce an AST for %s', input_file)
+        return None
+    with open(json_path, 'rb') as binary_data:
+        data = binary_data.read()
+    os.remove(json_path)
+    return data
+
+
+def get_extended_ast(input_file, json_path, remove_json=True, lean=False, binary=False):
     """
         JavaScript AST production.
 
@@ -48,45 +103,65 @@ def get_extended_ast(input_file, json_path, remove_json=True):
         - remove_json: bool
             Indicates whether to remove or not the JSON file containing the Esprima AST.
             Default: True.
+        - lean: bool
+            Indicates whether to skip the tokens and comments, which are only needed to generate
+            the code back with Escodegen. Default: False.
+        - binary: bool
+            Indicates whether to get the AST in the binary format of binary_ast.js instead of
+            JSON, cf. get_binary_ast. Default: False.
 
         -------
         Returns:
         - ExtendedAst
             The extended AST (i.e., contains type, filename, body, sourceType, range, comments,
-            tokens, and possibly leadingComments) of input_file.
+            tokens, and possibly leadingComments; not the comments and tokens if lean) of
+            input_file.
         - None if an error occurred.
     """
 
-    try:
-        produce_ast = subprocess.run(['node', os.path.join(SRC_PATH, 'parser.js'),
-                                      input_file, json_path],
-                                     stdout=subprocess.PIPE, check=True)
-    except subprocess.CalledProcessError:
-        logging.critical('Esprima parsing error for %s', input_file)
-        return None
-
-    if produce_ast.returncode == 0:
+    if binary:
+        data = get_binary_ast(input_file, json_path, lean)
+        if data is None:
+            return None
+        esprima_ast = binary_ast.decode(data)
 
+    else:
+        if utility_df.PARSER_DAEMON:
+            if parser_pool.get_parser_pool().parse(input_file, json_path, lean) is None:
+                return None
+        else:
+            try:
+                subprocess.run(['node', os.path.join(SRC_PATH, 'parser.js'), input_file,
+                                json_path] + (['--lean'] if lean else []),
+                               stdout=subprocess.PIPE, check=True,
+                               timeout=utility_df.remaining_time())
+            except subprocess.TimeoutExpired:  # Process killed
+                raise utility_df.Timeout.Timeout()
+            except subprocess.CalledProcessError:
+                logging.critical('Esprima parsing error for %s', input_file)
+                return None
+
+        if not os.path.isfile(json_path):
+            logging.critical('Esprima could not produce an AST for %s', input_file)
+            return None
         with open(json_path) as json_data:
             esprima_ast = json.loads(json_data.read())
         if remove_json:
             os.remove(json_path)
 
-        extended_ast = _extended_ast.ExtendedAst()
-        extended_ast.filename = input_file
-        extended_ast.set_type(esprima_ast['type'])
-        extended_ast.set_body(esprima_ast['body'])
-        extended_ast.set_source_type(esprima_ast['sourceType'])
-        extended_ast.set_range(esprima_ast['range'])
+    extended_ast = _extended_ast.ExtendedAst()
+    extended_ast.filename = input_file
+    extended_ast.set_type(esprima_ast['type'])
+    extended_ast.set_body(esprima_ast['body'])
+    extended_ast.set_source_type(esprima_ast['sourceType'])
+    extended_ast.set_range(esprima_ast['range'])
+    if not lean:
         extended_ast.set_tokens(esprima_ast['tokens'])
         extended_ast.set_comments(esprima_ast['comments'])
-        if 'leadingComments' in esprima_ast:
-            extended_ast.set_leading_comments(esprima_ast['leadingComments'])
+    if 'leadingComments' in esprima_ast:
+        extended_ast.set_leading_comments(esprima_ast['leadingComments'])
 
-        return extended_ast
-
-    logging.critical('Esprima could not produce an AST for %s', input_file)
-    return None
+    return extended_ast
 
 
 def indent(depth_dict):
@@ -147,8 +222,28 @@ def beautiful_print_ast(ast, delete_leaf, depth=0, max_depth=2 ** 63):
             print_value(depth, k, v, max_depth, delete_leaf)
 
 
+def depth_first(generator):
+    """
+        Runs generator and, before resuming it, each generator it yields, recursively. With an
+        explicit stack instead of the call stack, so that deeply nested code does not overflow it.
+        The Nodes are still created in the same order, i.e., get the same ids.
+    """
+
+    todo = [generator]
+    steps = 0
+    while todo:
+        steps += 1
+        if steps % utility_df.CHECK_TIMEOUT_STEPS == 0:
+            utility_df.check_timeout()  # Raises Timeout.Timeout if the AST is taking too long
+        child = next(todo[-1], None)
+        if child is None:
+            todo.pop()
+        else:
+            todo.append(child)
+
+
 def create_node(dico, node_body, parent_node, cond=False, filename=''):
-    """ Node creation. """
+    """ Node creation. Returns the Node to build from dico, or None if nothing more to build. """
 
     if dico is None:  # Not a Node, but needed a construct to store, e.g., [, a] = array
         node = _node.Node(name='None', parent=parent_node)
@@ -159,20 +254,8 @@ def create_node(dico, node_body, parent_node, cond=False, filename=''):
         node.filename = filename
 
     elif 'type' in dico:
-        if dico['type'] == 'FunctionDeclaration':
-            node = _node.FunctionDeclaration(name=dico['type'], parent=parent_node)
-        elif dico['type'] == 'FunctionExpression' or dico['type'] == 'ArrowFunctionExpression':
-            node = _node.FunctionExpression(name=dico['type'], parent=parent_node)
-        elif dico['type'] == 'ReturnStatement':
-            node = _node.ReturnStatement(name=dico['type'], parent=parent_node)
-        elif dico['type'] in _node.STATEMENTS:
-            node = _node.Statement(name=dico['type'], parent=parent_node)
-        elif dico['type'] in _node.VALUE_EXPR:
-            node = _node.ValueExpr(name=dico['type'], parent=parent_node)
-        elif dico['type'] == 'Identifier':
-            node = _node.Identifier(name=dico['type'], parent=parent_node)
-        else:
-            node = _node.Node(name=dico['type'], parent=parent_node)
+        node_type = sys.intern(dico['type'])  # Type comparisons and lookups by identity
+        node = NODE_CLASSES.get(node_type, _node.Node)(name=node_type, parent=parent_node)
 
         if not node.is_comment():  # Otherwise comments are children and it is getting messy!
             parent_node.set_child(node)
@@ -182,27 +265,13 @@ def create_node(dico, node_body, parent_node, cond=False, filename=''):
             # are alone. If we do not respect the initial syntax, Escodegen cannot built the
             # JS code back.
         node.filename = filename
-        ast_to_ast_nodes(dico, node)
-
+        return node
 
-def ast_to_ast_nodes(ast, ast_nodes=_node.Node('Program')):
-    """
-        Convert an AST to Node objects.
+    return None
 
-        -------
-        Parameters:
-        - ast: dict
-            Output of get_extended_ast(<input_file>, <json_path>).get_ast().
-        - ast_nodes: Node
-            Current Node to be built. Default: ast_nodes=Node('Program'). Beware, always call the
-            function indicating the default argument, otherwise the last value will be used
-            (because the default parameter is mutable).
 
-        -------
-        Returns:
-        - Node
-            The AST in format Node object.
-    """
+def fill_ast_node(ast, ast_nodes):
+    """ Sets the attributes of ast_nodes from ast, yields the building of its children. """
 
     if 'filename' in ast:
         filename = ast['filename']
@@ -219,17 +288,161 @@ def ast_to_ast_nodes(ast, ast_nodes=_node.Node('Program')):
             if k == 'range':  # Case leadingComments as range: {0: begin, 1: end}
                 ast_nodes.set_attribute(k, ast[k])
             else:
-                create_node(dico=ast[k], node_body=k, parent_node=ast_nodes, filename=filename)
+                node = create_node(dico=ast[k], node_body=k, parent_node=ast_nodes,
+                                   filename=filename)
+                if node is not None:
+                    yield fill_ast_node(ast[k], node)
         elif isinstance(ast[k], list):
             if not ast[k]:  # Case with empty list, e.g. params: []
                 ast_nodes.set_attribute(k, ast[k])
             for el in ast[k]:
                 if isinstance(el, dict):
-                    create_node(dico=el, node_body=k, parent_node=ast_nodes, cond=True,
-                                filename=filename)
+                    node = create_node(dico=el, node_body=k, parent_node=ast_nodes, cond=True,
+                                       filename=filename)
+                    if node is not None:
+                        yield fill_ast_node(el, node)
                 elif el is None:  # Case [None, {stuff about a}] for [, a] = array
                     create_node(dico=el, node_body=k, parent_node=ast_nodes, cond=True,
                                 filename=filename)
+
+
+def ast_to_ast_nodes(ast, ast_nodes=_node.Node('Program')):
+    """
+        Convert an AST to Node objects.
+
+        -------
+        Parameters:
+        - ast: dict
+            Output of get_extended_ast(<input_file>, <json_path>).get_ast().
+        - ast_nodes: Node
+            Current Node to be built. Default: ast_nodes=Node('Program'). Beware, always call the
+            function indicating the default argument, otherwise the last value will be used
+            (because the default parameter is mutable).
+
+        -------
+        Returns:
+        - Node
+            The AST in format Node object.
+    """
+
+    depth_first(fill_ast_node(ast, ast_nodes))
+    return ast_nodes
+
+
+def node_class(node_type):
+    """ Class of the Node to create for a given Esprima type, as in create_node. """
+
+    return NODE_CLASSES.get(node_type, _node.Node)
+
+
+def binary_to_ast_nodes(data, filename=''):
+    """
+        Convert a binary AST to Node objects while decoding it, i.e., without building the dict
+        tree first. Same Nodes as ast_to_ast_nodes(<ast>, ast_nodes=Node('Program')).
+
+        -------
+        Parameters:
+        - data: bytes
+            Output of binary_ast.js encode function.
+        - filename: str
+            Path of the file the AST was produced from.
+
+        -------
+        Returns:
+        - Node
+            The AST in format Node object.
+    """
+
+    ast = binary_ast.BinaryAst(data)
+    shapes = ast.shapes
+    stream = iter(ast.stream)
+    next_int = stream.__next__
+    value, object_value = binary_ast.value_decoder(ast, next_int)
+    classes = {}
+    # Keys stored as attributes, even if their value is a dict or a list, cf. ast_to_ast_nodes
+    attribute_keys = ('filename', 'loc', 'range', 'value', 'regex')
+
+    # To mirror: also builds the dicts and lists json.loads would give, sharing their content
+    # with the Nodes attributes, e.g., as a Property Node has its value both as child and attribute.
+    # fill_list and fill_node yield the building of the children, run by depth_first
+
+    def new_node(node_type, parent, body, cond, node_filename, mirror=False):
+        if node_type not in classes:
+            classes[node_type] = node_class(node_type)
+        node = classes[node_type](name=node_type, parent=parent)
+        if not node.is_comment():  # Otherwise comments are children and it is getting messy!
+            parent.set_child(node)
+        node.set_body(body)
+        if cond:
+            node.set_body_list(True)
+        node.filename = node_filename
+        return node, {'type': node_type} if mirror else None
+
+    def new_none_node(parent, body, node_filename):
+        node = _node.Node(name='None', parent=parent)
+        parent.set_child(node)
+        node.set_body(body)
+        node.set_body_list(True)
+        node.filename = node_filename
+
+    def fill_list(node, key, elements, node_filename=''):
+        mirror = elements is not None
+        length = next_int()
+        for _ in range(length):
+            tag = next_int()
+            if tag == binary_ast.OBJECT:
+                node_type, keys = shapes[next_int()]
+                if node_type is not None:
+                    child, element = new_node(node_type, node, key, True, node_filename, mirror)
+                    yield fill_node(child, keys, element)
+                else:
+                    element = object_value(node_type, keys)
+            elif tag == binary_ast.NULL:  # Case [None, {stuff about a}] for [, a] = array
+                new_none_node(node, key, node_filename)
+                element = None
+            else:
+                element = value(tag)
+            if mirror:
+                elements.append(element)
+        if key in attribute_keys:
+            node.set_attribute(key, elements)
+        elif not length:  # Case with empty list, e.g. params: []
+            node.set_attribute(key, [])
+
+    def fill_node(node, keys, dico=None):
+        for key in keys:
+            tag = next_int()
+            if tag == binary_ast.OBJECT:
+                node_type, keys = shapes[next_int()]
+                if node_type is None or key == 'range':
+                    item = object_value(node_type, keys)
+                else:
+                    child, item = new_node(node_type, node, key, False, '',
+                                           dico is not None or key in attribute_keys)
+                    yield fill_node(child, keys, item)
+                if key in attribute_keys:
+                    node.set_attribute(key, item)
+            elif tag == binary_ast.ARRAY:
+                item = [] if dico is not None or key in attribute_keys else None
+                yield fill_list(node, key, item)
+            else:
+                item = value(tag)
+                if key != 'type':
+                    node.set_attribute(key, item)
+            if dico is not None:
+                dico[key] = item
+
+    ast_nodes = _node.Node('Program')
+    ast_nodes.set_attribute('filename', filename)
+    if next_int() != binary_ast.OBJECT:
+        raise ValueError('The binary AST does not start with the Program')
+    _, keys = shapes[next_int()]
+    for key in keys:  # Only the body is considered, as with ExtendedAst.get_ast
+        tag = next_int()
+        if key == 'body' and tag == binary_ast.ARRAY:
+            depth_first(fill_list(ast_nodes, key, None, node_filename=filename))
+        else:
+            value(tag)
     return ast_nodes
 
 
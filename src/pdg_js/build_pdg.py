@@ -20,11 +20,11 @@
 """
 
 import os
-import pickle
 import logging
 import timeit
 import json
-from multiprocessing import Process, Queue
+from multiprocessing import Process, Queue, Value
+from multiprocessing.connection import wait
 
 from . import node as _node
 from . import build_ast
@@ -33,28 +33,46 @@ from . import control_flow
 from . import data_flow
 from . import scope as _scope
 from . import display_graph
+from . import parser_pool
+from . import pdg_cache
+from . import pdg_store
 
 # Builds the JS code from the AST, or not, to check for possible bugs in the AST building process.
 CHECK_JSON = utility_df.CHECK_JSON
 
 
 def pickle_dump_process(dfg_nodes, store_pdg):
-    """ Call to pickle.dump """
-    pickle.dump(dfg_nodes, open(store_pdg, 'wb'))
+    """ Writes the PDG dfg_nodes in the file store_pdg, cf. pdg_store.dump_pdg. """
+    with open(store_pdg, 'wb') as pdg_file:
+        pdg_store.dump_pdg(dfg_nodes, pdg_file)
 
 
 def function_hoisting(node, entry):
     """ Hoists FunctionDeclaration at the beginning of a basic block = Function bloc. """
 
     # Will avoid problem if function first called and then defined
-    for child in node.children:
+    # Explicit stack of [node, entry, index of the next child], for deeply nested code. Iterates
+    # over the children by index, as a for loop would, as hoisting moves them
+    todo = [[node, entry, 0]]
+    steps = 0
+    while todo:
+        steps += 1
+        if steps % utility_df.CHECK_TIMEOUT_STEPS == 0:
+            utility_df.check_timeout()  # Raises Timeout.Timeout if the AST is taking too long
+        frame = todo[-1]
+        node, entry, i = frame
+        if i >= len(node.children):
+            todo.pop()
+            continue
+        frame[2] = i + 1
+        child = node.children[i]
         if child.name == 'FunctionDeclaration':
             child.adopt_child(step_daddy=entry)  # Sets new parent and deletes old one
-            function_hoisting(child, entry=child)  # New basic block = FunctionDeclaration = child
+            todo.append([child, child, 0])  # New basic block = FunctionDeclaration = child
         elif child.name == 'FunctionExpression':
-            function_hoisting(child, entry=child)  # New basic block = FunctionExpression = child
+            todo.append([child, child, 0])  # New basic block = FunctionExpression = child
         else:
-            function_hoisting(child, entry=entry)  # Current basic block = entry
+            todo.append([child, entry, 0])  # Current basic block = entry
 
 
 def traverse(node):
@@ -77,9 +95,55 @@ def get_data_flow_process(js_path, benchmarks, store_pdgs):
         raise e
 
 
+def get_cfg(input_file, esprima_json, benchmarks, beautiful_print, save_path_ast, save_path_cfg,
+            lean=True):
+    """
+        Produces the AST of input_file, enhanced with CF, cf. get_data_flow for the parameters.
+
+        -------
+        Returns:
+        - Node
+            CFG of the file.
+        - or None if Esprima could not parse it.
+    """
+
+    start = timeit.default_timer()
+    if utility_df.BINARY_AST and not beautiful_print:  # Nodes directly built from the binary AST
+        esprima_ast = build_ast.get_binary_ast(input_file, esprima_json, lean=lean)
+    else:
+        esprima_ast = build_ast.get_extended_ast(input_file, esprima_json, lean=lean)
+    if esprima_ast is None:
+        return None
+
+    benchmarks['got AST'] = timeit.default_timer() - start
+    start = utility_df.micro_benchmark('Successfully got Esprima AST in',
+                                       timeit.default_timer() - start)
+    if isinstance(esprima_ast, bytes):
+        ast_nodes = build_ast.binary_to_ast_nodes(esprima_ast, filename=input_file)
+    else:
+        ast = esprima_ast.get_ast()
+        if beautiful_print:
+            build_ast.beautiful_print_ast(ast, delete_leaf=[])
+        ast_nodes = build_ast.ast_to_ast_nodes(ast, ast_nodes=_node.Node('Program'))
+    function_hoisting(ast_nodes, ast_nodes)  # Hoists FunDecl at a basic block's beginning
+
+    benchmarks['AST'] = timeit.default_timer() - start
+    start = utility_df.micro_benchmark('Successfully produced the AST in',
+                                       timeit.default_timer() - start)
+    if save_path_ast is not False:
+        display_graph.draw_ast(ast_nodes, attributes=True, save_path=save_path_ast)
+
+    cfg_nodes = control_flow.control_flow(ast_nodes)
+    benchmarks['CFG'] = timeit.default_timer() - start
+    utility_df.micro_benchmark('Successfully produced the CFG in', timeit.default_timer() - start)
+    if save_path_cfg is not False:
+        display_graph.draw_cfg(cfg_nodes, attributes=True, save_path=save_path_cfg)
+    return cfg_nodes
+
+
 def get_data_flow(input_file, benchmarks, store_pdgs=None, check_var=False, beautiful_print=False,
                   save_path_ast=False, save_path_cfg=False, save_path_pdg=False,
-                  check_json=CHECK_JSON):
+                  check_json=CHECK_JSON, deadline=None):
     """
         Builds the PDG: enhances the AST with CF, DF, and pointer analysis for a given file.
 
@@ -102,6 +166,8 @@ def get_data_flow(input_file, benchmarks, store_pdgs=None, check_var=False, beau
             Whether to beautiful print the AST or not.
         - check_json: bool
             Builds the JS code from the AST, or not, to check for bugs in the AST building process.
+        - deadline: utility_df.Timeout/None
+            Deadline of the caller, which producing the PDG cannot go past.
 
         -------
         Returns:
@@ -117,36 +183,41 @@ def get_data_flow(input_file, benchmarks, store_pdgs=None, check_var=False, beau
         esprima_json = input_file.replace('.js', '.json')
     else:
         esprima_json = input_file + '.json'
-    extended_ast = build_ast.get_extended_ast(input_file, esprima_json)
 
     benchmarks['errors'] = []
+    cache_key = dfg_nodes = None
+    try:
+        # Tries to load the PDG from the cache, or to produce the CFG, within 10 minutes
+        with utility_df.Timeout(600, parent=deadline):
+            if utility_df.PDG_CACHE is not None and not (check_var or beautiful_print) \
+                    and not check_json and save_path_ast is False and save_path_cfg is False:
+                cache_key = pdg_cache.get_key(input_file)
+                if cache_key is not None:
+                    dfg_nodes = pdg_cache.load(cache_key, input_file, errors=benchmarks['errors'])
+            if dfg_nodes is None:
+                cfg_nodes = get_cfg(input_file, esprima_json, benchmarks, beautiful_print,
+                                    save_path_ast, save_path_cfg, lean=not check_json)
+    except utility_df.Timeout.Timeout:
+        logging.critical('Building the CFG timed out for %s', input_file)
+        benchmarks['errors'].append('cfg-timeout')
+        return _node.Node('Program')  # Empty PDG to avoid trying to get the children of None
+
+    if dfg_nodes is not None:  # Same source already analyzed, by any process
+        benchmarks['PDG cache'] = timeit.default_timer() - start
+        utility_df.micro_benchmark('Successfully loaded the PDG from the cache in',
+                                   timeit.default_timer() - start)
+        if save_path_pdg is not False:
+            display_graph.draw_pdg(dfg_nodes, attributes=True, save_path=save_path_pdg)
+        if store_pdgs is not None:
+            store_pdg(dfg_nodes, benchmarks, input_file, esprima_json, store_pdgs)
+        return dfg_nodes
 
-    if extended_ast is not None:
-        benchmarks['got AST'] = timeit.default_timer() - start
-        start = utility_df.micro_benchmark('Successfully got Esprima AST in',
-                                           timeit.default_timer() - start)
-        ast = extended_ast.get_ast()
-        if beautiful_print:
-            build_ast.beautiful_print_ast(ast, delete_leaf=[])
-        ast_nodes = build_ast.ast_to_ast_nodes(ast, ast_nodes=_node.Node('Program'))
-        function_hoisting(ast_nodes, ast_nodes)  # Hoists FunDecl at a basic block's beginning
-
-        benchmarks['AST'] = timeit.default_timer() - start
-        start = utility_df.micro_benchmark('Successfully produced the AST in',
-                                           timeit.default_timer() - start)
-        if save_path_ast is not False:
-            display_graph.draw_ast(ast_nodes, attributes=True, save_path=save_path_ast)
-
-        cfg_nodes = control_flow.control_flow(ast_nodes)
-        benchmarks['CFG'] = timeit.default_timer() - start
-        start = utility_df.micro_benchmark('Successfully produced the CFG in',
-                                           timeit.default_timer() - start)
-        if save_path_cfg is not False:
-            display_graph.draw_cfg(cfg_nodes, attributes=True, save_path=save_path_cfg)
-
+    if cfg_nodes is not None:
+        start = timeit.default_timer()
         unknown_var = []
         try:
-            with utility_df.Timeout(600):  # Tries to produce DF within 10 minutes
+            # Tries to produce DF within 10 minutes
+            with utility_df.Timeout(600, parent=deadline):
                 scopes = [_scope.Scope('Global')]
                 dfg_nodes, scopes = data_flow.df_scoping(cfg_nodes, scopes=scopes,
                                                          id_list=[], entry=1)
@@ -184,18 +255,26 @@ def get_data_flow(input_file, benchmarks, store_pdgs=None, check_var=False, beau
                         unknown_var.append(unknown)
             return unknown_var
 
+        if cache_key is not None:
+            pdg_cache.store(cache_key, dfg_nodes, errors=benchmarks['errors'])
         if store_pdgs is not None:
-            store_pdg = os.path.join(store_pdgs, os.path.basename(input_file.replace('.js', '')))
-            pickle_dump_process(dfg_nodes, store_pdg)
-            json_analysis = os.path.join(store_pdgs, os.path.basename(esprima_json))
-            with open(json_analysis, 'w') as json_data:
-                json.dump(benchmarks, json_data, indent=4, sort_keys=False, default=default,
-                          skipkeys=True)
+            store_pdg(dfg_nodes, benchmarks, input_file, esprima_json, store_pdgs)
         return dfg_nodes
     benchmarks['errors'].append('parsing-error')
     return _node.Node('ParsingError')  # Empty PDG to avoid trying to get the children of None
 
 
+def store_pdg(dfg_nodes, benchmarks, input_file, esprima_json, store_pdgs):
+    """ Stores the PDG of input_file and its micro benchmarks in the folder store_pdgs. """
+
+    store_pdg_path = os.path.join(store_pdgs, os.path.basename(input_file.replace('.js', '')))
+    pickle_dump_process(dfg_nodes, store_pdg_path)  # Loaded back by get_pdg.unpickle_pdg
+    json_analysis = os.path.join(store_pdgs, os.path.basename(esprima_json))
+    with open(json_analysis, 'w') as json_data:
+        json.dump(benchmarks, json_data, indent=4, sort_keys=False, default=default,
+                  skipkeys=True)
+
+
 def default(o):
     """ To avoid TypeError, conversion of problematic objects into str. """
 
@@ -212,28 +291,70 @@ def handle_one_pdg(root, js, store_pdgs):
         if not os.path.isfile(js_path):
             logging.error('The path %s does not exist', js_path)
             return False
-        # Some PDGs lead to Segfault, avoids killing the current process
-        p = Process(target=get_data_flow_process, args=(js_path, benchmarks, store_pdgs))
-        p.start()
-        p.join()
-        if p.exitcode != 0:
+        # In-process, as the AST and CFG are built without recursion. If a PDG still leads to a
+        # Segfault, run_workers replaces the worker
+        try:
+            get_data_flow_process(js_path, benchmarks, store_pdgs)
+        except Exception:
             logging.critical('Something wrong occurred with %s PDG generation', js_path)
             return False
     return True
 
 
-def worker(my_queue):
-    """ Worker """
+def worker(my_queue, current):
+    """ Worker, handling files from my_queue until there are none left. """
 
+    parser_pool.reset_parser_pool()  # Own Node.js parser processes, reused for all its files
     while True:
         try:
-            root, js, store_pdgs = my_queue.get(timeout=2)
+            task, root, js, store_pdgs = my_queue.get(timeout=2)
+            current.value = task  # For run_workers to know which file made the worker crash
             handle_one_pdg(root, js, store_pdgs)
+            current.value = -1
         except Exception as e:
             logging.exception(e)
             break
 
 
+def run_workers(tasks):
+    """
+        Stores the PDGs of the files from tasks with NUM_WORKERS long-lived worker processes.
+        A worker that dies, e.g., with a Segfault, is replaced and its file reported.
+
+        -------
+        Parameter:
+        - tasks: list
+            Contains [root, js, store_pdgs] for each file, cf. handle_one_pdg.
+    """
+
+    my_queue = Queue()
+    for task, (root, js, store_pdgs) in enumerate(tasks):
+        my_queue.put([task, root, js, store_pdgs])
+
+    workers = dict()  # Process sentinel -> Process, index of the task it handles
+
+    def start_worker():
+        current = Value('l', -1)
+        p = Process(target=worker, args=(my_queue, current))
+        p.start()
+        print("Starting process")
+        workers[p.sentinel] = (p, current)
+
+    for _ in range(utility_df.NUM_WORKERS):
+        start_worker()
+
+    while workers:
+        for sentinel in wait(list(workers)):
+            p, current = workers.pop(sentinel)
+            p.join()
+            if p.exitcode != 0:
+                if current.value >= 0:
+                    root, js, _ = tasks[current.value]
+                    logging.critical('Something wrong occurred with %s PDG generation',
+                                     os.path.join(root, js))
+                start_worker()  # Exits if there are no files left
+
+
 def store_pdg_folder(folder_js):
     """
         Stores the PDGs of the JS files from folder_js.
@@ -246,8 +367,7 @@ def store_pdg_folder(folder_js):
 
     start = timeit.default_timer()
 
-    my_queue = Queue()
-    workers = list()
+    tasks = list()
 
     if not os.path.exists(folder_js):
         logging.exception('The path %s does not exist', folder_js)
@@ -258,16 +378,9 @@ def store_pdg_folder(folder_js):
 
     for root, _, files in os.walk(folder_js):
         for js in files:
-            my_queue.put([root, js, store_pdgs])
+            tasks.append([root, js, store_pdgs])
 
-    for _ in range(utility_df.NUM_WORKERS):
-        p = Process(target=worker, args=(my_queue,))
-        p.start()
-        print("Starting process")
-        workers.append(p)
-
-    for w in workers:
-        w.join()
+    run_workers(tasks)
 
     utility_df.micro_benchmark('Total elapsed time:', timeit.default_timer() - start)
 
@@ -277,8 +390,7 @@ def store_extension_pdg_folder(extensions_path):
 
     start = timeit.default_timer()
 
-    my_queue = Queue()
-    workers = list()
+    tasks = list()
 
     for extension_folder in os.listdir(extensions_path):
         extension_path = os.path.join(extensions_path, extension_folder)
@@ -291,15 +403,8 @@ def store_extension_pdg_folder(extensions_path):
                 # if not os.path.isfile(os.path.join(extension_pdg_path,
                 #                                    os.path.basename(component).replace('.js',
                 #                                                                        ''))):
-                my_queue.put([extension_path, component, extension_pdg_path])
-
-    for _ in range(utility_df.NUM_WORKERS):
-        p = Process(target=worker, args=(my_queue,))
-        p.start()
-        print("Starting process")
-        workers.append(p)
+                tasks.append([extension_path, component, extension_pdg_path])
 
-    for w in workers:
-        w.join()
+    run_workers(tasks)
 
     utility_df.micro_benchmark('Total elapsed time:', timeit.default_timer() - start)
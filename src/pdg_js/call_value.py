@@ -0,0 +1,110 @@
+# Copyright (C) 2021 Aurore Fass
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+    Values of the calls, e.g., of a.b(1, x), kept as their callee path and argument values
+    instead of being concatenated into a str.
+"""
+
+import functools
+import sys
+
+PATH_CACHE_SIZE = 10000  # Max number of callee values whose path is kept
+ARG_TYPES = (str, int, float, bool, type(None))  # Argument values kept as they are
+
+
+@functools.lru_cache(maxsize=PATH_CACHE_SIZE)
+def get_path(value):
+    """
+        Path of a callee value.
+
+        -------
+        Parameter:
+        - value: str
+            Value of a callee, e.g., 'a.b'.
+
+        -------
+        Returns:
+        - tuple of str
+            Interned segments of value, e.g., ('a', 'b').
+    """
+
+    return tuple(sys.intern(segment) for segment in value.split('.'))
+
+
+class CallValue:
+    """
+        Value of a call, e.g., of a.b(1, x): the value of its callee, e.g., 'a.b', and the values
+        of its arguments, e.g., (1, 'x'). Its str, e.g., 'a.b(1, x)', is only rendered when needed,
+        e.g., for the reports, cf. __str__.
+    """
+
+    __slots__ = ('callee', 'args', '_path', '_len', '_str', '_key')
+
+    def __init__(self, callee, args):
+        if not isinstance(callee, (str, CallValue)):
+            raise TypeError('The callee value %s is not a str' % (callee,))
+        self.callee = callee  # str, or CallValue for a call of a call, e.g., a(1)(2)
+        # Mutable values, e.g., lists or Nodes, are rendered now, as they may change afterwards
+        self.args = tuple(arg if isinstance(arg, (ARG_TYPES, CallValue)) else str(arg)
+                          for arg in args)
+        self._path = None
+        self._len = None
+        self._str = None
+        self._key = None
+
+    def __reduce__(self):
+        return CallValue, (self.callee, self.args)
+
+    @property
+    def path(self):
+        """ Interned segments of the callee, e.g., ('a', 'b'), cf. get_path. """
+
+        if self._path is None:
+            self._path = get_path(str(self.callee))
+        return self._path
+
+    def key(self):
+        """ Hashable content of the call: the calls with the same key have the same str. """
+
+        if self._key is None:
+            callee = self.callee if isinstance(self.callee, str) else self.callee.key()
+            self._key = callee, tuple(arg.key() if isinstance(arg, CallValue)
+                                      else (type(arg), arg) for arg in self.args)
+        return self._key
+
+    def __str__(self):
+        if self._str is None:
+            self._str = str(self.callee) + '(' + ', '.join(str(arg) for arg in self.args) + ')'
+        return self._str
+
+    def __len__(self):
+        """ Length of the str of the call, without rendering it. """
+
+        if self._len is None:
+            if self._str is not None:
+                self._len = len(self._str)
+            else:
+                self._len = len(self.callee) + 2 + 2 * max(len(self.args) - 1, 0)\
+                            + sum(len(arg) if isinstance(arg, (str, CallValue)) else len(str(arg))
+                                  for arg in self.args)
+        return self._len
+
+    def __bool__(self):
+        return True  # As the str of a call is never empty
+
+    def __repr__(self):
+        return repr(str(self))  # As the str of the call, e.g., in the str of a list
@@ -22,6 +22,7 @@
 
 
 from . import node as _node
+from . import utility_df
 
 
 def link_expression(node, node_parent):
@@ -185,7 +186,13 @@ def control_flow(ast_nodes):
             With statement and control dependencies added.
     """
 
-    for child in ast_nodes.children:
+    todo = list(reversed(ast_nodes.children))  # Explicit stack, for deeply nested code
+    steps = 0
+    while todo:  # Preorder
+        steps += 1
+        if steps % utility_df.CHECK_TIMEOUT_STEPS == 0:
+            utility_df.check_timeout()  # Raises Timeout.Timeout if the CFG is taking too long
+        child = todo.pop()
         if child.name in _node.EPSILON or child.name in _node.UNSTRUCTURED:
             epsilon_statement_cf(child)
         elif child.name in _node.CONDITIONAL:
@@ -193,5 +200,5 @@ def control_flow(ast_nodes):
         else:
             for grandchild in child.children:
                 link_expression(node=grandchild, node_parent=child)
-        control_flow(child)
+        todo.extend(reversed(child.children))
     return ast_nodes
@@ -23,15 +23,15 @@
 
 
 import logging
-import copy
 
 from . import node as _node
 from . import js_reserved
 from . import scope as _scope
+from . import fun_summary
 from . import utility_df
 from .build_ast import save_json, get_code
 from .pointer_analysis import map_var2value, compute_update_expression, display_values
-from .js_operators import get_node_computed_value, get_node_value
+from .js_operators import get_node_computed_value, get_node_value, get_callee_path
 
 # To print the exceptions encountered while building the PDG, or not
 PDG_EXCEPT = utility_df.PDG_EXCEPT
@@ -39,6 +39,12 @@ PDG_EXCEPT = utility_df.PDG_EXCEPT
 LIMIT_RETRAVERSE = utility_df.LIMIT_RETRAVERSE
 # If iterating through a loop, then max times to avoid infinite loops
 LIMIT_LOOP = utility_df.LIMIT_LOOP
+# To compute the loops up to a fixpoint instead of unrolling them
+LOOP_FIXPOINT = utility_df.LOOP_FIXPOINT
+# To reuse the summary of a function instead of retraversing it with the same inputs
+FUN_SUMMARIES = utility_df.FUN_SUMMARIES
+# Max number of summaries per function
+LIMIT_SUMMARIES = utility_df.LIMIT_SUMMARIES
 
 """
 In the following,
@@ -60,9 +66,10 @@ If not stated otherwise, the defined functions return a list of Scope.
 def get_pos_identifier(identifier_node, scopes):
     """ Position of identifier_node in the corresponding scope. """
 
-    for scope_index, scope in reversed(list(enumerate(scopes))):
+    var_name = identifier_node.attributes['name']
+    for scope_index in range(len(scopes) - 1, -1, -1):
         # Search from local scopes to the global one, if no match found
-        var_index = scope.get_pos_identifier(identifier_node)
+        var_index = scopes[scope_index].get_pos_name(var_name)
         if var_index is not None:
             return var_index, scope_index  # Variable position, corresponding scope index
     return None, None
@@ -134,8 +141,7 @@ def set_data_dep(begin_data_dep, identifier_node, scopes, nearest_statement=None
             # a Promise or a callback; ensures that the function will be retraversed here
             logging.debug('Retraversing the function')
             # Traverse function again
-            function_def.set_retraverse()  # Sets retraverse property to True
-            function_scope(node=function_def, scopes=scopes, id_list=[])
+            retraverse_function(function_def, scopes)
             # Not sure if scopes properly handled...
 
 
@@ -156,8 +162,8 @@ def set_df(scope, var_index, identifier_node, scopes):
     if not isinstance(scope, _scope.Scope):
         logging.error('The parameter given should be typed Scope. Got %s', str(scope))
     else:
-        begin_df = get_nearest_statement(scope.var_list[var_index], scope.var_if2_list[var_index])
-        begin_id_df = scope.var_list[var_index]
+        begin_df = get_nearest_statement(scope.get_var(var_index), scope.get_var_if2(var_index))
+        begin_id_df = scope.get_var(var_index)
         if isinstance(begin_df, list):
             for i, _ in enumerate(begin_df):
                 set_data_dep(begin_data_dep=begin_df[i], identifier_node=identifier_node,
@@ -431,12 +437,10 @@ def hoisting(node, scopes):
     """ Checks if unknown variables are in fact function names which were hoisted. """
 
     for scope in scopes:
-        unknown_var_copy = copy.copy(scope.unknown_var)
-        for unknown in unknown_var_copy:
-            if node.attributes['name'] == unknown.attributes['name']:
-                logging.debug('Hoisting, %s was first used, then defined', node.attributes['name'])
-                node.set_data_dependency(extremity=unknown)
-                scope.remove_unknown_var(unknown)
+        for unknown in scope.get_unknown_var_name(node.attributes['name']):
+            logging.debug('Hoisting, %s was first used, then defined', node.attributes['name'])
+            node.set_data_dependency(extremity=unknown)
+            scope.remove_unknown_var(unknown)
 
 
 def function_scope(node, scopes, id_list):
@@ -521,6 +525,54 @@ def function_scope(node, scopes, id_list):
     return scopes
 
 
+def retraverse_function(function_def, scopes):
+    """
+        Traverses a function again, e.g., at a call site, unless it was already retraversed with
+        the same inputs: then, its summary is reused, cf. fun_summary.py.
+
+        -------
+        Parameters:
+        - function_def: Node
+            FunctionDeclaration or (Arrow)FunctionExpression.
+
+        -------
+        Returns:
+        - list of Scope
+    """
+
+    function_def.set_retraverse()  # Sets retraverse property to True
+    if not FUN_SUMMARIES:
+        return function_scope(node=function_def, scopes=scopes, id_list=[])
+
+    key = fun_summary.summary_key(function_def, scopes)
+    summary = function_def.fun_summaries.get(key)
+    if summary is not None:
+        logging.debug('Reusing the summary of the function')
+        side_effects, values = summary
+        fun_summary.replay_side_effects(scopes, side_effects)
+        for function, function_values in values:
+            fun_summary.set_values(function, function_values)
+            fun_summary.add_retraversed(function)
+        return scopes
+
+    state = fun_summary.scopes_state(scopes)
+    fun_summary.start_retraversal()
+    try:
+        scopes = function_scope(node=function_def, scopes=scopes, id_list=[])
+    finally:
+        retraversed = fun_summary.end_retraversal()
+    retraversed[function_def.id] = function_def
+    side_effects = fun_summary.get_side_effects(scopes, state)
+    if side_effects is not None:
+        if len(function_def.fun_summaries) >= LIMIT_SUMMARIES:
+            del function_def.fun_summaries[next(iter(function_def.fun_summaries))]  # Oldest one
+        function_def.fun_summaries[key] = side_effects, [
+            (function, fun_summary.get_values(function)) for function in retraversed.values()]
+    for function in retraversed.values():
+        fun_summary.add_retraversed(function)
+    return scopes
+
+
 def obj_expr_scope(node, scopes, id_list):
     """ ObjectExpression scope. """
 
@@ -618,27 +670,33 @@ def merge_var_boolean_cf(current_scope, scope_true, scope_false):
     """
 
     # Merges variables declared/modified in a true/false scope in the true scope
-    for node_false in scope_false.var_list:
-        if not any(node_false.attributes['name'] == node_true.attributes['name']
-                   for node_true in scope_true.var_list):
-            logging.debug('The variable %s was added to the list', node_false.attributes['name'])
+    if scope_true.duplicates or scope_false.duplicates:
+        positions_false = range(scope_false.nb_var)
+    else:  # The other variables are the same in both scopes, if copies of a same scope
+        positions_false = [position for position in scope_false.changed_positions(scope_true)
+                           if position < scope_false.nb_var]
+    for position_false in positions_false:
+        node_false = scope_false.get_var(position_false)
+        var_name = node_false.attributes['name']
+        if scope_true.get_pos_name(var_name) is None:
+            logging.debug('The variable %s was added to the list', var_name)
             scope_true.add_var(node_false)
 
-        for node_true in scope_true.var_list:
-            if node_false.attributes['name'] == node_true.attributes['name']\
-                    and node_false.id != node_true.id:  # The var was modified in >=1 branch
+        for position in tuple(scope_true.get_positions_name(var_name)):
+            node_true = scope_true.get_var(position)
+            if node_false.id != node_true.id:  # The var was modified in >=1 branch
                 var_index = scope_true.get_pos_identifier(node_true)
-                if any(node_true.id == node.id for node in current_scope.var_list):
+                if current_scope.has_var(node_true):
                     logging.debug('The variable %s has been modified in the branch False',
-                                  node_false.attributes['name'])
+                                  var_name)
                     scope_true.update_var(var_index, node_false)
-                elif any(node_false.id == node.id for node in current_scope.var_list):
+                elif current_scope.has_var(node_false):
                     logging.debug('The variable %s has been modified in the branch True',
-                                  node_true.attributes['name'])
+                                  var_name)
                     # Already handled, as we work on var_list_true
                 else:  # Both were modified, we refer to the nearest common statement
                     logging.debug('The variable %s has been modified in the branches True and '
-                                  'False', node_false.attributes['name'])
+                                  'False', var_name)
                     scope_true.update_var_if2(var_index, [node_true, node_false])
 
     return scope_true  # Merged variables declared in the True/False scope
@@ -680,8 +738,7 @@ def handle_several_branches(todo_true, todo_false, scopes, id_list, entry):
 
             # Adds variables previously declared in the True/False scope in the current scope
             for cond_node in cond_scope.var_list:
-                if not any(cond_node.attributes['name'] == current_node.attributes['name']
-                           for current_node in current_scope.var_list):
+                if current_scope.get_pos_identifier(cond_node) is None:
                     logging.debug('The variable %s was added to the current variables\' list',
                                   cond_node.attributes['name'])
                     current_scope.add_var(cond_node)
@@ -689,7 +746,7 @@ def handle_several_branches(todo_true, todo_false, scopes, id_list, entry):
             # Same for variables declared in both branches
             for cond_node_list in cond_scope.var_if2_list:
                 if isinstance(cond_node_list, list):
-                    current_scope.var_if2_list.extend(cond_node_list)
+                    current_scope.extend_var_if2(cond_node_list)
 
     # Finally scopes contains all variables defined in the true + false branches
     return scopes
@@ -872,8 +929,7 @@ def handle_call_expr(node, scopes, callee, fun_expr=False, tagged_template=False
             logging.debug('\t- %s = %s', param.name, param.value)
 
     # Traverse function again
-    function_def.set_retraverse()  # Sets retraverse property to True
-    scopes = function_scope(node=function_def, scopes=scopes, id_list=[])
+    scopes = retraverse_function(function_def, scopes)
 
     return_value = None
     if function_def.fun_return:
@@ -897,8 +953,8 @@ def handle_foreach(node):
     if len(node.children) > 1 and node.children[0].body in ('callee', 'tag'):
         # arr.forEach(callback);
         callee = node.children[0]
-        call_expr_value = get_node_computed_value(node)
-        if call_expr_value is not None and '.forEach(' in call_expr_value:
+        callee_path = get_callee_path(node)
+        if callee_path is not None and len(callee_path) > 1 and callee_path[-1] == 'forEach':
             identifiers = []  # To store identifiers on which forEach is called (e.g., arr)
             for child in callee.children:
                 search_identifiers(child, id_list=[], tab=identifiers)
@@ -917,8 +973,8 @@ def handle_push(node):
     if len(node.children) > 1 and node.children[0].body in ('callee', 'tag'):
         # arr.push(elt1, ..., eltN);
         callee = node.children[0]
-        call_expr_value = get_node_computed_value(node)
-        if call_expr_value is not None and '.push(' in call_expr_value:
+        callee_path = get_callee_path(node)
+        if callee_path is not None and len(callee_path) > 1 and callee_path[-1] == 'push':
             identifiers = []  # To store identifiers on which push is called (e.g., arr)
             for child in callee.children:
                 search_identifiers(child, id_list=[], tab=identifiers)
@@ -929,231 +985,337 @@ def handle_push(node):
                         arr.set_provenance_rec(element)  # arr object depends on elements
 
 
-def build_dfg_content(child, scopes, id_list, entry):
-    """ Data dependency for a given node whatever it is. """
+def variable_declaration_content(node, scopes, id_list, entry):
+    """ VariableDeclaration data dependencies. """
 
-    if child.name == 'VariableDeclaration':  # VariableDeclaration data dependencies
+    logging.debug('The node %s is a variable declaration', node.name)
 
-        logging.debug('The node %s is a variable declaration', child.name)
+    let_const = False
+    if node.attributes['kind'] != 'var' and scopes[-1].bloc:  # let or const in a bloc
+        let_const = True
+        let_const_scope_name = 'let_const' + str(node.parent.id)
+        if scopes[-1].name != let_const_scope_name:  # New block scope if not already defined
+            scopes.append(_scope.Scope(let_const_scope_name))
 
-        let_const = False
-        if child.attributes['kind'] != 'var' and scopes[-1].bloc:  # let or const in a bloc
-            let_const = True
-            let_const_scope_name = 'let_const' + str(child.parent.id)
-            if scopes[-1].name != let_const_scope_name:  # New block scope if not already defined
-                scopes.append(_scope.Scope(let_const_scope_name))
+    for grandchild in node.children:
+        scopes = var_declaration_df(grandchild, scopes=scopes, id_list=id_list, entry=entry,
+                                    let_const=let_const)
 
-        for grandchild in child.children:
-            scopes = var_declaration_df(grandchild, scopes=scopes, id_list=id_list, entry=entry,
-                                        let_const=let_const)
+    return scopes
 
-    ################################################################################################
 
-    elif child.name == 'AssignmentExpression':  # AssignmentExpression data dependencies
+def assignment_expr_content(node, scopes, id_list, entry):
+    """ AssignmentExpression data dependencies. """
 
-        logging.debug('The node %s is an assignment expression', child.name)
-        scopes = assignment_expr_df(child, scopes=scopes, id_list=id_list, entry=entry)
+    logging.debug('The node %s is an assignment expression', node.name)
+    return assignment_expr_df(node, scopes=scopes, id_list=id_list, entry=entry)
 
-    ################################################################################################
 
-    elif child.name in _node.CALL_EXPR:
+def call_expr_content(node, scopes, id_list, entry):
+    """ CallExpression, TaggedTemplateExpression and NewExpression data dependencies. """
 
-        scopes = df_scoping(child, scopes=scopes, id_list=id_list)[1]
-        callee = child.children[0]
+    scopes = df_scoping(node, scopes=scopes, id_list=id_list)[1]
+    callee = node.children[0]
 
-        tagged_template = bool(child.name == 'TaggedTemplateExpression')
+    tagged_template = bool(node.name == 'TaggedTemplateExpression')
 
-        if isinstance(callee, _node.FunctionExpression):  # Case CallExpr(FunExpr)
-            scopes = handle_call_expr(child, scopes=scopes, callee=callee,
-                                      tagged_template=tagged_template, fun_expr=True)
+    if isinstance(callee, _node.FunctionExpression):  # Case CallExpr(FunExpr)
+        scopes = handle_call_expr(node, scopes=scopes, callee=callee,
+                                  tagged_template=tagged_template, fun_expr=True)
 
-        elif isinstance(get_node_computed_value(callee, initial_node=child),
-                        _node.FunctionExpression):
-            # Case a = {}; a['b'] = function(){}; a['b'](); --> As a['b'] resolves to a FunExpr
-            scopes = handle_call_expr(child, scopes=scopes,
-                                      callee=get_node_computed_value(callee, initial_node=child),
-                                      tagged_template=tagged_template, fun_expr=True)
+    elif isinstance(get_node_computed_value(callee, initial_node=node),
+                    _node.FunctionExpression):
+        # Case a = {}; a['b'] = function(){}; a['b'](); --> As a['b'] resolves to a FunExpr
+        scopes = handle_call_expr(node, scopes=scopes,
+                                  callee=get_node_computed_value(callee, initial_node=node),
+                                  tagged_template=tagged_template, fun_expr=True)
 
-        else:
-            identifiers = search_identifiers(callee, id_list=[], tab=[])
-            for identifier in identifiers:
-                for data_dep in identifier.data_dep_parents:
-                    if data_dep.extremity.fun is not None:  # Calling a fun that was defined before
-                        callee = data_dep.extremity.fun
-                        scopes = handle_call_expr(child, scopes=scopes, callee=callee,
-                                                  tagged_template=tagged_template)
-                        break
+    else:
+        identifiers = search_identifiers(callee, id_list=[], tab=[])
+        for identifier in identifiers:
+            for data_dep in identifier.data_dep_parents:
+                if data_dep.extremity.fun is not None:  # Calling a fun that was defined before
+                    callee = data_dep.extremity.fun
+                    scopes = handle_call_expr(node, scopes=scopes, callee=callee,
+                                              tagged_template=tagged_template)
+                    break
 
-            handle_foreach(node=child)  # Sets provenance for forEach constructs
-            handle_push(node=child)  # Sets provenance for push constructs
+        handle_foreach(node=node)  # Sets provenance for forEach constructs
+        handle_push(node=node)  # Sets provenance for push constructs
 
-        display_values(var=child, keep_none=False, recompute=False)  # Display values
+    display_values(var=node, keep_none=False, recompute=False)  # Display values
 
-    ################################################################################################
+    return scopes
 
-    elif child.name == 'UpdateExpression':  # UpdateExpression data dependencies
 
-        logging.debug('The node %s is an update expression', child.name)
-        update_expr_df(child, scopes=scopes, id_list=id_list, entry=entry)
+def update_expr_content(node, scopes, id_list, entry):
+    """ UpdateExpression data dependencies. """
 
-    ################################################################################################
+    logging.debug('The node %s is an update expression', node.name)
+    update_expr_df(node, scopes=scopes, id_list=id_list, entry=entry)
 
-    elif child.name == 'FunctionDeclaration' or isinstance(child, _node.FunctionExpression):
-        # Functions data dependencies
+    return scopes
 
-        logging.debug('The node %s is a function', child.name)
-        scopes = function_scope(node=child, scopes=scopes, id_list=id_list)
-        # child.scopes = scopes  # Would not work because would lose current scoping info
 
-    ################################################################################################
+def function_content(node, scopes, id_list, entry):
+    """ Functions data dependencies. """
 
-    elif child.name == 'ReturnStatement':  # ReturnStatement added to the corresponding fun + DD
+    logging.debug('The node %s is a function', node.name)
+    scopes = function_scope(node=node, scopes=scopes, id_list=id_list)
+    # node.scopes = scopes  # Would not work because would lose current scoping info
 
-        logging.debug('The node %s is a return statement', child.name)
-        already_in_bloc = scopes[-1].bloc
-        scopes[-1].set_in_bloc(True)  # We are in a block statement, relevant for let/const
+    return scopes
 
-        for scope in scopes[::-1]:  # In reverse order to check the last scope first
-            if scope.name == 'Function':
-                fun = scope.function  # Looking for the (Arrow)FunctionExpression/Declaration node
-                if not isinstance(fun, _node.FunctionDeclaration) \
-                        and not isinstance(fun, _node.FunctionExpression):
-                    logging.error('Expected a Function, got a %s node', fun.name)
-                    break
 
-                fun.add_fun_return(child)  # Sets value of ReturnStatement
+def return_statement_content(node, scopes, id_list, entry):
+    """ ReturnStatement added to the corresponding function + data dependencies. """
 
+    logging.debug('The node %s is a return statement', node.name)
+    already_in_bloc = scopes[-1].bloc
+    scopes[-1].set_in_bloc(True)  # We are in a block statement, relevant for let/const
+
+    for scope in scopes[::-1]:  # In reverse order to check the last scope first
+        if scope.name == 'Function':
+            fun = scope.function  # Looking for the (Arrow)FunctionExpression/Declaration node
+            if not isinstance(fun, _node.FunctionDeclaration) \
+                    and not isinstance(fun, _node.FunctionExpression):
+                logging.error('Expected a Function, got a %s node', fun.name)
                 break
 
-        scopes = df_scoping(child, scopes=scopes, id_list=id_list)[1]
-        go_out_bloc(scopes, already_in_bloc)  # We are not in the block statement anymore
+            fun.add_fun_return(node)  # Sets value of ReturnStatement
+
+            break
 
-    ################################################################################################
+    scopes = df_scoping(node, scopes=scopes, id_list=id_list)[1]
+    go_out_bloc(scopes, already_in_bloc)  # We are not in the block statement anymore
 
-    elif child.name == 'ForStatement':  # ForStatement: init, test, update, body (Statement)
+    return scopes
 
-        logging.debug('The node %s is a for statement', child.name)
-        already_in_bloc = scopes[-1].bloc
-        scopes[-1].set_in_bloc(True)  # We are in a block statement, relevant for let/const
 
-        if len(child.children) in (3, 4):
-            scopes = data_flow(child.children[0], scopes, id_list, entry)  # init
-            scopes = data_flow(child.children[1], scopes, id_list, entry)  # test
-            identifiers = []
-            search_identifiers(child.children[0], [], identifiers)
+def get_loop_defs(scopes, entry_scopes):
+    """
+        Definitions of the variables which changed since the entry of a loop.
+
+        -------
+        Parameters:
+        - entry_scopes: list of Scope
+            Copies of the scopes at the entry of the loop.
+
+        -------
+        Returns:
+        - set
+            (scope index, variable position, Identifier node id) tuples.
+    """
+
+    loop_defs = set()
+    for scope_index, (scope, entry_scope) in enumerate(zip(scopes, entry_scopes)):
+        positions = scope.variables.changed_keys(entry_scope.variables)
+        positions.update(scope.variables_if2.changed_keys(entry_scope.variables_if2))
+        for position in positions:
+            var = scope.get_var(position)
+            if var is not None:
+                loop_defs.add((scope_index, position, var.id))
+            var_if2 = scope.get_var_if2(position)
+            if isinstance(var_if2, list):
+                loop_defs.update((scope_index, position, el.id) for el in var_if2)
+    return loop_defs
+
+
+def loop_fixpoint(node, scopes, iteration, test=None):
+    """
+        Iterates over a loop until the definitions reaching its head do not change anymore.
+        The definitions which reached the head are stored in the loop node, so that a nested
+        loop handled again is only iterated over if new definitions reach it. The values are
+        not part of the fixpoint: they are those of the last iteration. As the definitions which
+        reached the head can only grow, and there are finitely many, the iterations terminate.
+
+        -------
+        Parameters:
+        - node: Node
+            Loop statement.
+        - iteration: function
+            Handles one iteration of the loop, from scopes to scopes.
+        - test: Node or None
+            Test of the loop, to stop iterating if it is statically false.
+
+        -------
+        Returns:
+        - list of Scope
+    """
+
+    if node.loop_defs is None:
+        node.loop_defs = set()
+    entry_scopes = [scope.copy_scope() for scope in scopes]
+    while True:
+        scopes = iteration(scopes)  # At least one iteration, as when unrolling the loop
+        loop_defs = get_loop_defs(scopes, entry_scopes)
+        if loop_defs <= node.loop_defs:
+            break  # Fixpoint
+        node.loop_defs.update(loop_defs)
+        if test is not None:
+            test_value = get_node_computed_value(test, initial_node=node)
+            if test_value is not None and not test_value:
+                break  # Statically false, the loop is exited
+        logging.debug('New definitions reached the loop %s', node.name)
+
+    return scopes
+
+
+def for_statement_content(node, scopes, id_list, entry):
+    """ ForStatement data dependencies: init, test, update, body (Statement). """
+
+    logging.debug('The node %s is a for statement', node.name)
+    already_in_bloc = scopes[-1].bloc
+    scopes[-1].set_in_bloc(True)  # We are in a block statement, relevant for let/const
+
+    if len(node.children) in (3, 4):
+        scopes = data_flow(node.children[0], scopes, id_list, entry)  # init
+        scopes = data_flow(node.children[1], scopes, id_list, entry)  # test
+        identifiers = []
+        search_identifiers(node.children[0], [], identifiers)
+
+        def iteration(scopes):
+            if len(node.children) == 4:
+                scopes = data_flow(node.children[3], scopes, id_list, entry)  # body
+            scopes = data_flow(node.children[2], scopes, id_list, entry)  # update / body
+            for identifier in identifiers:
+                if len(identifier.data_dep_children) >= 3:
+                    identifier.data_dep_children[0].extremity.set_value(
+                        identifier.data_dep_children[2].extremity)  # updates test value
+            return scopes
+
+        if LOOP_FIXPOINT:
+            scopes = loop_fixpoint(node, scopes, iteration, test=node.children[1])
+        else:
             loop = 0
-            test = get_node_computed_value(child.children[1], initial_node=child)
+            test = get_node_computed_value(node.children[1], initial_node=node)
             if test is not True:  # Could be None, or perhaps str, int whatever
                 test = True  # So that go at least one time in the loop
-            while get_node_computed_value(child.children[1], initial_node=child) or test:
+            while get_node_computed_value(node.children[1], initial_node=node) or test:
                 # while test do:
                 test = False
                 loop += 1
                 if loop <= LIMIT_LOOP:  # To avoid infinite loops
-                    if len(child.children) == 4:
-                        scopes = data_flow(child.children[3], scopes, id_list, entry)  # body
-                    scopes = data_flow(child.children[2], scopes, id_list, entry)  # update / body
-                    for identifier in identifiers:
-                        if len(identifier.data_dep_children) >= 3:
-                            identifier.data_dep_children[0].extremity.set_value(
-                                identifier.data_dep_children[2].extremity)  # updates test value
+                    scopes = iteration(scopes)
                 else:
                     break  # To go out of the while!
-            let_const_scope(child, scopes)  # Limit scope when going out of the block
+        let_const_scope(node, scopes)  # Limit scope when going out of the block
 
-        else:
-            logging.warning('Expected a ForStatement with 3 or 4 children, got only %s',
-                            len(child.children))
-            scopes = statement_scope(node=child, scopes=scopes, id_list=id_list, entry=entry)
+    else:
+        logging.warning('Expected a ForStatement with 3 or 4 children, got only %s',
+                        len(node.children))
+        scopes = statement_scope(node=node, scopes=scopes, id_list=id_list, entry=entry)
+
+    go_out_bloc(scopes, already_in_bloc)  # We are not in the block statement anymore
 
-        go_out_bloc(scopes, already_in_bloc)  # We are not in the block statement anymore
+    return scopes
 
-    ################################################################################################
 
-    elif child.name in ('ForOfStatement', 'ForInStatement'):  # ForOf/InStatement: left, right, body
+def for_of_in_statement_content(node, scopes, id_list, entry):
+    """ ForOf/InStatement data dependencies: left, right, body. """
+
+    logging.debug('The node %s is a for statement', node.name)
+    already_in_bloc = scopes[-1].bloc
+    scopes[-1].set_in_bloc(True)  # We are in a block statement, relevant for let/const
+
+    if len(node.children) == 3:
+        scopes = data_flow(node.children[0], scopes, id_list, entry)  # left = var
+        scopes = data_flow(node.children[1], scopes, id_list, entry)  # right = array
+        identifiers = []
+        search_identifiers(node.children[0], [], identifiers)
+        # Reference to the ArrayExpr
+        obj_value = get_node_computed_value(node.children[1], initial_node=node)
+        if len(identifiers) > 1:
+            logging.warning('Got %s variables declared in a %s', len(identifiers), node.name)
+        for identifier in identifiers:
+            if isinstance(obj_value, _node.Node):  # Otherwise cannot iterate over Array
+                for obj_value_el in obj_value.children:  # Iterate over the ArrayExpr elements
+                    if obj_value_el.name == 'Property':
+                        prop_value = get_node_computed_value(obj_value_el.children[0],
+                                                             initial_node=node)  # kvalue
+                    else:
+                        prop_value = get_node_computed_value(obj_value_el,
+                                                             initial_node=node)  # k value
+                    identifier.set_value(prop_value)
+                    # Thanks to DD from identifier, will iterate over k value
+                    scopes = data_flow(node.children[2], scopes, id_list, entry)  # body
 
-        logging.debug('The node %s is a for statement', child.name)
-        already_in_bloc = scopes[-1].bloc
-        scopes[-1].set_in_bloc(True)  # We are in a block statement, relevant for let/const
+        if not identifiers or identifiers and\
+                (not isinstance(obj_value, _node.Node) or not obj_value.children):
+            # So that body still handled
+            scopes = data_flow(node.children[2], scopes, id_list, entry)  # body
 
-        if len(child.children) == 3:
-            scopes = data_flow(child.children[0], scopes, id_list, entry)  # left = var
-            scopes = data_flow(child.children[1], scopes, id_list, entry)  # right = array
-            identifiers = []
-            search_identifiers(child.children[0], [], identifiers)
-            # Reference to the ArrayExpr
-            obj_value = get_node_computed_value(child.children[1], initial_node=child)
-            if len(identifiers) > 1:
-                logging.warning('Got %s variables declared in a %s', len(identifiers), child.name)
-            for identifier in identifiers:
-                if isinstance(obj_value, _node.Node):  # Otherwise cannot iterate over Array
-                    for obj_value_el in obj_value.children:  # Iterate over the ArrayExpr elements
-                        if obj_value_el.name == 'Property':
-                            prop_value = get_node_computed_value(obj_value_el.children[0],
-                                                                 initial_node=child)  # kvalue
-                        else:
-                            prop_value = get_node_computed_value(obj_value_el,
-                                                                 initial_node=child)  # k value
-                        identifier.set_value(prop_value)
-                        # Thanks to DD from identifier, will iterate over k value
-                        scopes = data_flow(child.children[2], scopes, id_list, entry)  # body
-
-            if not identifiers or identifiers and\
-                    (not isinstance(obj_value, _node.Node) or not obj_value.children):
-                # So that body still handled
-                scopes = data_flow(child.children[2], scopes, id_list, entry)  # body
-
-            let_const_scope(child, scopes)  # Limit scope when going out of the block
+        let_const_scope(node, scopes)  # Limit scope when going out of the block
 
-        else:
-            logging.warning('Expected a ForStatement with 3 children, got only %s',
-                            len(child.children))
-            scopes = statement_scope(node=child, scopes=scopes, id_list=id_list, entry=entry)
+    else:
+        logging.warning('Expected a ForStatement with 3 children, got only %s',
+                        len(node.children))
+        scopes = statement_scope(node=node, scopes=scopes, id_list=id_list, entry=entry)
 
-        go_out_bloc(scopes, already_in_bloc)  # We are not in the block statement anymore
+    go_out_bloc(scopes, already_in_bloc)  # We are not in the block statement anymore
 
-    ################################################################################################
+    return scopes
 
-    elif isinstance(child, _node.Statement) or child.name == 'ConditionalExpression':
-        # Statement (statement, epsilon, boolean) data dep and ConditionalExpr = same as IfStatement
 
-        logging.debug('The node %s is a statement', child.name)
-        already_in_bloc = scopes[-1].bloc
-        scopes[-1].set_in_bloc(True)  # We are in a block statement, relevant for let/const
+def statement_content(node, scopes, id_list, entry):
+    """ Statement (statement, epsilon, boolean) and ConditionalExpression data
+    dependencies, same as IfStatement. """
 
-        scopes = statement_scope(node=child, scopes=scopes, id_list=id_list, entry=entry)
-        go_out_bloc(scopes, already_in_bloc)  # We are not in the block statement anymore
+    logging.debug('The node %s is a statement', node.name)
+    already_in_bloc = scopes[-1].bloc
+    scopes[-1].set_in_bloc(True)  # We are in a block statement, relevant for let/const
 
-    ################################################################################################
+    if LOOP_FIXPOINT and node.name in ('WhileStatement', 'DoWhileStatement'):
+        # One iteration: test and body, as a branch
+        scopes = loop_fixpoint(node, scopes, lambda scopes: statement_scope(
+            node=node, scopes=scopes, id_list=id_list, entry=entry))
+    else:
+        scopes = statement_scope(node=node, scopes=scopes, id_list=id_list, entry=entry)
+    go_out_bloc(scopes, already_in_bloc)  # We are not in the block statement anymore
 
-    elif child.name == 'ObjectExpression':  # Only consider the object name, no properties
+    return scopes
 
-        logging.debug('The node %s is an object expression', child.name)
-        scopes = obj_expr_scope(child, scopes=scopes, id_list=id_list)
 
-    ################################################################################################
+def object_expr_content(node, scopes, id_list, entry):
+    """ ObjectExpression data dependencies, only considering the object name, no
+    properties. """
 
-    elif child.name == 'ObjectPattern':  # Only consider the object name, not the key or properties
+    logging.debug('The node %s is an object expression', node.name)
+    return obj_expr_scope(node, scopes=scopes, id_list=id_list)
 
-        logging.debug('The node %s is an object pattern', child.name)
-        scopes = obj_pattern_scope(child, scopes=scopes, id_list=id_list)
 
-    ################################################################################################
+def object_pattern_content(node, scopes, id_list, entry):
+    """ ObjectPattern data dependencies, only considering the object name, not the
+    key or properties. """
 
-    elif child.name == 'Identifier':  # Identifier data dependencies
+    logging.debug('The node %s is an object pattern', node.name)
+    return obj_pattern_scope(node, scopes=scopes, id_list=id_list)
 
-        if child.id not in id_list:
-            logging.debug('The variable %s has not been handled yet', child.attributes['name'])
-            identifier_update(child, scopes=scopes, id_list=id_list, entry=entry)
-        else:
-            logging.debug('The variable %s has already been handled', child.attributes['name'])
 
-    ################################################################################################
+def identifier_content(node, scopes, id_list, entry):
+    """ Identifier data dependencies. """
 
+    if node.id not in id_list:
+        logging.debug('The variable %s has not been handled yet', node.attributes['name'])
+        identifier_update(node, scopes=scopes, id_list=id_list, entry=entry)
     else:
-        scopes = df_scoping(child, scopes=scopes, id_list=id_list)[1]
+        logging.debug('The variable %s has already been handled', node.attributes['name'])
 
-    ################################################################################################
+    return scopes
+
+
+def children_content(node, scopes, id_list, entry):
+    """ Data dependencies of the children of a node without specific handling. """
+
+    return df_scoping(node, scopes=scopes, id_list=id_list)[1]
+
+
+def build_dfg_content(child, scopes, id_list, entry):
+    """ Data dependency for a given node whatever it is. """
+
+    utility_df.check_timeout()  # Raises Timeout.Timeout if the PDG is taking too long
+    content = DFG_CONTENT.get(child.name, children_content)
+    scopes = content(child, scopes=scopes, id_list=id_list, entry=entry)
 
     # for scope in scopes:
         # display_temp('> ' + scope.name, [scope])
@@ -1163,6 +1325,29 @@ def build_dfg_content(child, scopes, id_list, entry):
     return scopes
 
 
+# Data dependency handler of each node type, cf. build_dfg_content.
+# The Statement nodes, i.e., from _node.STATEMENTS, without a specific handler use statement_content
+DFG_CONTENT = dict.fromkeys(_node.STATEMENTS, statement_content)
+DFG_CONTENT.update({
+    'VariableDeclaration': variable_declaration_content,
+    'AssignmentExpression': assignment_expr_content,
+    'CallExpression': call_expr_content,
+    'TaggedTemplateExpression': call_expr_content,
+    'NewExpression': call_expr_content,
+    'UpdateExpression': update_expr_content,
+    'FunctionDeclaration': function_content,
+    'FunctionExpression': function_content,
+    'ArrowFunctionExpression': function_content,
+    'ReturnStatement': return_statement_content,
+    'ForStatement': for_statement_content,
+    'ForOfStatement': for_of_in_statement_content,
+    'ForInStatement': for_of_in_statement_content,
+    'ObjectExpression': object_expr_content,
+    'ObjectPattern': object_pattern_content,
+    'Identifier': identifier_content,
+})
+
+
 def data_flow(child, scopes, id_list, entry):
     """ Cf build_dfg_content. Added try/catch to see code snippets leading to problems and
     performing the analysis to the end. """
@@ -0,0 +1,261 @@
+# Copyright (C) 2021 Aurore Fass
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+    Function summaries, to avoid retraversing a function at a call site when it would not change
+    anything.
+"""
+
+# A function is retraversed at each call site (cf. handle_call_expr and set_data_dep), so that
+# its parameters take the values of the arguments. The retraversal draws the parameter-to-return
+# and parameter-to-side-effect flows, and the provenance, into the PDG itself, i.e., in the nodes
+# of the function. Retraversing the function again with the same inputs draws the same flows, so
+# that the summary of the function for these inputs only has to store what the retraversal
+# overwrites: the values of the nodes of the function and of the functions it called, and its
+# side effects on the scopes, e.g., a global variable defined again. They are set back when the
+# summary is reused.
+# The inputs of a retraversal are the values of the parameters and the variables in the scopes
+# that the function, or the functions it references, may read. Their abstract values form the
+# key of the summary.
+
+from . import node as _node
+from .call_value import CallValue
+
+LIMIT_KEY_DEPTH = 20  # Values nested deeper have no abstract value: the summary is not reused
+
+# Functions retraversed during the retraversals in progress, by function id, innermost last
+RETRAVERSED = []
+
+
+class NoKey:
+    """ Abstract value of a value that cannot be compared, equal to no other one. """
+
+    __slots__ = ()
+
+
+def value_key(value, depth=0):
+    """
+        Abstract value of value, i.e., a hashable representation, equal for equal values.
+
+        -------
+        Parameters:
+        - value: str, int, float, bool, list, dict, Node or None
+            Value of a node.
+        - depth: int
+            Nesting depth of value.
+
+        -------
+        Returns:
+        - tuple
+    """
+
+    if depth > LIMIT_KEY_DEPTH:
+        return NoKey()
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return type(value), value  # True and 1 are different values
+    if isinstance(value, list):
+        return list, tuple(value_key(el, depth + 1) for el in value)
+    if isinstance(value, dict):
+        return dict, tuple((value_key(key, depth + 1), value_key(el, depth + 1))
+                           for key, el in value.items())
+    if isinstance(value, _node.Node):
+        return _node.Node, value.id
+    if isinstance(value, CallValue):
+        return CallValue, value.key()
+    return NoKey()
+
+
+def get_fun_content(function):
+    """
+        Content of function, computed once.
+
+        -------
+        Returns:
+        - frozenset
+            Names of the Identifier nodes in function.
+        - tuple
+            Nodes of function which have a value.
+    """
+
+    if function.fun_content is None:
+        names = set()
+        value_nodes = []
+        todo = list(function.children)
+        while todo:
+            node = todo.pop()
+            if node.name == 'Identifier' and 'name' in node.attributes:
+                names.add(node.attributes['name'])
+            if isinstance(node, _node.Value):
+                value_nodes.append(node)
+            todo.extend(node.children)
+        function.fun_content = frozenset(names), tuple(value_nodes)
+    return function.fun_content
+
+
+def start_retraversal():
+    """ Starts recording the functions retraversed, cf. end_retraversal. """
+
+    RETRAVERSED.append(dict())
+
+
+def end_retraversal():
+    """ Functions retraversed since the matching start_retraversal. """
+
+    return RETRAVERSED.pop()
+
+
+def add_retraversed(function):
+    """ Records that function was retraversed, or that its summary was reused. """
+
+    if RETRAVERSED:
+        RETRAVERSED[-1][function.id] = function
+
+
+def get_values(function):
+    """ Values of the nodes of function, as the retraversal left them. """
+
+    return [(node.value, node.update_value, getattr(node, 'code', None))
+            for node in get_fun_content(function)[1]]
+
+
+def set_values(function, values):
+    """ Sets the values of the nodes of function back to values, cf. get_values. """
+
+    _node.new_epoch()
+    for node, (value, update_value, code) in zip(get_fun_content(function)[1], values):
+        node.value = value
+        node.update_value = update_value
+        if isinstance(node, _node.Identifier):
+            node.code = code
+
+
+def is_traversed(scopes):
+    """ Indicates if function_scope would traverse a function, cf. LIMIT_RETRAVERSE. """
+
+    functions = set()
+    for scope in scopes:
+        if scope.function is not None:
+            if scope.function.id in functions:
+                return False
+            functions.add(scope.function.id)
+    return True
+
+
+def summary_key(function, scopes):
+    """
+        Key of the summary of function at a call site.
+
+        -------
+        Parameters:
+        - function: Node
+            FunctionDeclaration or (Arrow)FunctionExpression.
+        - scopes: list of Scope
+            Scopes at the call site.
+
+        -------
+        Returns:
+        - tuple
+    """
+
+    key = [len(scopes), is_traversed(scopes)]
+    for param in function.fun_params:
+        key.append(value_key(param.value) if isinstance(param, _node.Value) else NoKey())
+
+    # Variables which the function, or the functions it references, may read
+    visited = {function.id}
+    todo = [function]
+    while todo:
+        for var_name in sorted(get_fun_content(todo.pop())[0]):
+            key.append(var_name)
+            for scope_index in range(len(scopes) - 1, -1, -1):
+                var_index = scopes[scope_index].get_pos_name(var_name)
+                if var_index is not None:
+                    var = scopes[scope_index].get_var(var_index)
+                    var_if2 = scopes[scope_index].get_var_if2(var_index)
+                    key.append((scope_index, var_index, var.id, value_key(var.value),
+                                value_key(var_if2)))
+                    if var.fun is not None and var.fun.id not in visited:
+                        visited.add(var.fun.id)
+                        todo.append(var.fun)
+                    break
+    return tuple(key)
+
+
+def scopes_state(scopes):
+    """ State of the scopes, to get the side effects of a retraversal on them. """
+
+    return [scope.copy_scope() for scope in scopes]
+
+
+def get_side_effects(scopes, state):
+    """
+        Side effects of a retraversal on the scopes, e.g., a global variable defined again.
+
+        -------
+        Parameters:
+        - scopes: list of Scope
+            Scopes after the retraversal. They may be new Scope objects, e.g., after a condition,
+            but they share the content of the stored ones, so that only their modifications are
+            compared.
+        - state: list of Scope
+            Scopes before the retraversal, cf. scopes_state.
+
+        -------
+        Returns:
+        - list
+            (scope index, variable name or None if added, Identifier node, var_if2) tuples;
+        - or None if the side effects cannot be replayed.
+    """
+
+    if len(scopes) != len(state):
+        return None
+    side_effects = []
+    for scope_index, (scope, stored_scope) in enumerate(zip(scopes, state)):
+        if scope.nb_var - stored_scope.nb_var != scope.nb_var_if2 - stored_scope.nb_var_if2\
+                or scope.nb_var < stored_scope.nb_var or scope.duplicates != stored_scope.duplicates\
+                or scope.unknown_names.changed_keys(stored_scope.unknown_names):
+            return None
+        changed = scope.variables.changed_keys(stored_scope.variables)
+        changed.update(scope.variables_if2.changed_keys(stored_scope.variables_if2))
+        for var_index in sorted(changed):
+            var = scope.get_var(var_index)
+            var_if2 = scope.get_var_if2(var_index)
+            if var_if2 is not None:
+                var_if2 = list(var_if2)  # Still modified in place, cf. Scope.add_var_if2
+            if var_index >= stored_scope.nb_var:  # Added variable
+                side_effects.append((scope_index, None, var, var_if2))
+            elif var != stored_scope.get_var(var_index)\
+                    or var_if2 != stored_scope.get_var_if2(var_index):  # Updated variable
+                var_name = var.attributes['name']
+                if stored_scope.get_pos_name(var_name) != var_index:
+                    return None
+                side_effects.append((scope_index, var_name, var, var_if2))
+    return side_effects
+
+
+def replay_side_effects(scopes, side_effects):
+    """ Applies the side effects of a previous retraversal to the scopes. """
+
+    for scope_index, var_name, var, var_if2 in side_effects:
+        scope = scopes[scope_index]
+        if var_name is None:
+            scope.add_var(var)
+            var_index = scope.nb_var - 1
+        else:
+            var_index = scope.get_pos_name(var_name)
+            scope.update_var(var_index, var)
+        if var_if2 is not None:
+            scope.update_var_if2(var_index, list(var_if2))
@@ -21,6 +21,8 @@
 import logging
 
 from . import node as _node
+from . import utility_df
+from .call_value import CallValue
 
 """
 In the following,
@@ -47,45 +49,10 @@ def get_node_value(node, initial_node=None, recdepth=0, recvisited=None):
 
     logging.debug('Getting the value from %s', node.name)
 
-    if node.name == 'UnaryExpression':
-        return compute_unary_expression(node, initial_node=initial_node,
-                                        recdepth=recdepth + 1, recvisited=recvisited)
-    if node.name in ('BinaryExpression', 'LogicalExpression'):
-        return compute_binary_expression(node, initial_node=initial_node,
-                                         recdepth=recdepth + 1, recvisited=recvisited)
-    if node.name == 'ArrayExpression':
-        return node
-    if node.name in ('ObjectExpression', 'ObjectPattern'):
-        return node
-    if node.name == 'MemberExpression':
-        return compute_member_expression(node, initial_node=initial_node,
-                                         recdepth=recdepth + 1, recvisited=recvisited)
-    if node.name == 'ThisExpression':
-        return 'this'
-    if isinstance(node, _node.FunctionExpression):
-        return compute_function_expression(node)
-    if node.name == 'CallExpression' and isinstance(node.children[0], _node.FunctionExpression):
-        return node.children[0].fun_name  # Function called; mapping to the function name if any
-    if node.name in _node.CALL_EXPR:
-        return compute_call_expression(node, initial_node=initial_node,
-                                       recdepth=recdepth + 1, recvisited=recvisited)
-    if node.name == 'ReturnStatement' or node.name == 'BlockStatement':
-        if node.children:
-            return get_node_computed_value(node.children[0], initial_node=initial_node,
-                                           recdepth=recdepth + 1, recvisited=recvisited)
-        return None
-    if node.name == 'TemplateLiteral':
-        return compute_template_literal(node, initial_node=initial_node,
-                                        recdepth=recdepth + 1, recvisited=recvisited)
-    if node.name == 'ConditionalExpression':
-        return compute_conditional_expression(node, initial_node=initial_node,
-                                              recdepth=recdepth + 1, recvisited=recvisited)
-    if node.name == 'AssignmentExpression':
-        return compute_assignment_expression(node, initial_node=initial_node,
-                                             recdepth=recdepth + 1, recvisited=recvisited)
-    if node.name == 'UpdateExpression':
-        return get_node_computed_value(node.children[0], initial_node=initial_node,
-                                       recdepth=recdepth + 1, recvisited=recvisited)
+    compute_value = NODE_VALUES.get(node.name)
+    if compute_value is not None:
+        return compute_value(node, initial_node=initial_node,
+                             recdepth=recdepth + 1, recvisited=recvisited)
 
     for child in node.children:
         get_node_computed_value(child, initial_node=initial_node,
@@ -100,6 +67,25 @@ def get_node_value(node, initial_node=None, recdepth=0, recvisited=None):
 def get_node_computed_value(node, initial_node=None, keep_none=False, recdepth=0, recvisited=None):
     """ Computes the value of node, depending on its type. """
 
+    if initial_node is None and recvisited is None:
+        # Top-level query without provenance to set: the value computed in the current epoch of
+        # the PDG, if any, is still valid, cf. _node.EPOCH
+        computed_value = getattr(node, 'computed_value', None)
+        if computed_value is not None and computed_value[0] == _node.EPOCH\
+                and computed_value[1] == keep_none:
+            return computed_value[2]
+        value = compute_node_value(node, keep_none=keep_none, recdepth=recdepth)
+        node.computed_value = (_node.EPOCH, keep_none, value)
+        return value
+
+    return compute_node_value(node, initial_node=initial_node, keep_none=keep_none,
+                              recdepth=recdepth, recvisited=recvisited)
+
+
+def compute_node_value(node, initial_node=None, keep_none=False, recdepth=0, recvisited=None):
+    """ Computes the value of node, cf. get_node_computed_value. """
+
+    utility_df.check_timeout()  # Raises Timeout.Timeout if the analysis is taking too long
     if recvisited is None:
         recvisited = set()
 
@@ -144,7 +130,7 @@ def get_node_computed_value(node, initial_node=None, keep_none=False, recdepth=0
 
     if isinstance(node, _node.Value) and node.name not in _node.CALL_EXPR:
         # Do not store value for CallExpr as could have changed and should be recomputed
-        node.set_value(value)  # Stores the value so as not to compute it again
+        node.set_value(value, modified=False)  # Stores the value so as not to compute it again
 
     return value
 
@@ -172,6 +158,11 @@ def compute_operators(operator, node_a, node_b, initial_node=None, recdepth=0, r
                                         recdepth=recdepth + 1, recvisited=recvisited)
     else:  # Specific to compute_binary_expression
         b = node_b  # node_b may not be a Node but already a computed result
+    operands = a, b  # Operands of && and ||, which return one of them
+    if isinstance(a, CallValue):  # The other operators are evaluated on the str of the call
+        a = str(a)
+    if isinstance(b, CallValue):
+        b = str(b)
 
     if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):
         if operator in ('+=', '+') and (isinstance(a, str) or isinstance(b, str)):
@@ -220,9 +211,9 @@ def compute_operators(operator, node_a, node_b, initial_node=None, recdepth=0, r
         if operator == '<':
             return operator_smaller(a, b)
         if operator == '&&':
-            return operator_and(a, b)
+            return operator_and(*operands)
         if operator == '||':
-            return operator_or(a, b)
+            return operator_or(*operands)
         if operator in ('&', '>>', '>>>', '<<', '^', '|', '&=', '>>=', '>>>=', '<<=', '^=', '|=',
                         'in', 'instanceof'):
             logging.warning('Currently not handling the operator %s', operator)
@@ -243,6 +234,8 @@ def compute_unary_expression(node, initial_node, recdepth=0, recvisited=None):
                                             recdepth=recdepth + 1, recvisited=recvisited)
     if compute_unary is None:
         return None
+    if isinstance(compute_unary, CallValue):
+        compute_unary = str(compute_unary)
     if isinstance(compute_unary, bool):
         return not compute_unary
     if isinstance(compute_unary, (int, float)):
@@ -278,6 +271,8 @@ def compute_member_expression(node, initial_node, compute=True, recdepth=0, recv
                                         recdepth=recdepth + 1, recvisited=recvisited)
     if obj.name == 'ThisExpression' or obj_value in _node.GLOBAL_VAR:
         return prop_value
+    if isinstance(prop_value, CallValue):  # obj[a()]: the property is the str of the call
+        prop_value = str(prop_value)
 
     if not isinstance(obj_value, _node.Node):
         # Specific case if we changed an Array/Object type
@@ -378,7 +373,7 @@ def get_property_value(node, initial_node, recdepth=0, recvisited=None):
     return None, False
 
 
-def compute_function_expression(node):
+def compute_function_expression(node, initial_node=None, recdepth=0, recvisited=None):
     """ Computes a (Arrow)FunctionExpression node. """
 
     fun_name = node.fun_name
@@ -394,47 +389,63 @@ def compute_call_expression(node, initial_node, recdepth=0, recvisited=None):
         initial_node.set_provenance(node)
 
     callee = node.children[0]
-    params = '('
+    # Computes the value of the arguments: a.b...(arg1, arg2...)
+    args = [get_node_computed_value(arg, initial_node=initial_node, recdepth=recdepth + 1,
+                                    recvisited=recvisited) for arg in node.children[1:]]
 
-    for arg in range(1, len(node.children)):
-        # Computes the value of the arguments: a.b...(arg1, arg2...)
-        params += str(get_node_computed_value(node.children[arg], initial_node=initial_node,
-                                              recdepth=recdepth + 1, recvisited=recvisited))
-        if arg < len(node.children) - 1:
-            params += ', '
+    if callee.name == 'LogicalExpression':  # a || b, if a not False a otherwise b
+        if get_node_computed_value(callee.children[0], initial_node=initial_node,
+                                   recdepth=recdepth + 1, recvisited=recvisited) is False:
+            return get_node_computed_value(callee.children[1], initial_node=initial_node,
+                                           recdepth=recdepth + 1, recvisited=recvisited)
+        return get_node_computed_value(callee.children[0], initial_node=initial_node,
+                                       recdepth=recdepth + 1, recvisited=recvisited)
+
+    callee_value = compute_callee(callee, initial_node=initial_node, recdepth=recdepth,
+                                  recvisited=recvisited)
+    if callee_value is None:
+        return None
+    return CallValue(callee_value, args)
 
-    params += ')'
+
+def compute_callee(callee, initial_node, recdepth=0, recvisited=None):
+    """ Value of the callee of a CallExpression, e.g., 'a.b' for a.b(...), or None. """
 
     if isinstance(callee, _node.Identifier):
         return str(get_node_computed_value(callee, initial_node=initial_node,
-                                           recdepth=recdepth + 1, recvisited=recvisited)) + params
+                                           recdepth=recdepth + 1, recvisited=recvisited))
 
     if callee.name == 'MemberExpression':
-        value = display_member_expression_value(callee, '', initial_node=initial_node)
-        value = value[0:-1] + params
-        return value
-        # return compute_member_expression(callee) + params  # To test if problems here
+        return display_member_expression_value(callee, '', initial_node=initial_node)[0:-1]
+        # return compute_member_expression(callee)  # To test if problems here
 
     if callee.name in _node.CALL_EXPR:
-        if get_node_computed_value(callee, initial_node=initial_node, recdepth=recdepth + 1,
-                                   recvisited=recvisited) is None or params is None:
-            return None
-        return get_node_computed_value(callee, initial_node=initial_node,
-                                       recdepth=recdepth + 1, recvisited=recvisited) + params
-
-    if callee.name == 'LogicalExpression':  # a || b, if a not False a otherwise b
-        if get_node_computed_value(callee.children[0], initial_node=initial_node,
-                                   recdepth=recdepth + 1, recvisited=recvisited) is False:
-            return get_node_computed_value(callee.children[1], initial_node=initial_node,
-                                           recdepth=recdepth + 1, recvisited=recvisited)
-        return get_node_computed_value(callee.children[0], initial_node=initial_node,
-                                       recdepth=recdepth + 1, recvisited=recvisited)
+        return get_node_computed_value(callee, initial_node=initial_node, recdepth=recdepth + 1,
+                                       recvisited=recvisited)
 
     logging.error('Got a CallExpression on %s with attributes %s and id %s',
                   callee.name, callee.attributes, callee.id)
     return None
 
 
+def get_callee_path(node):
+    """
+        Path of the function called by a CallExpression, TaggedTemplateExpression or
+        NewExpression node, cf. CallValue.path. The value of the whole call is computed (once per
+        epoch), as computing the arguments also sets their provenance.
+
+        -------
+        Returns:
+        - tuple of str
+        - or None if the call has no CallValue, e.g., callee without value.
+    """
+
+    call_value = get_node_computed_value(node)
+    if not isinstance(call_value, CallValue):
+        return None
+    return call_value.path
+
+
 def compute_template_literal(node, initial_node, recdepth=0, recvisited=None):
     """ Gets the value of TemplateLiteral. """
 
@@ -531,6 +542,36 @@ def compute_assignment_expression(node, initial_node, recdepth=0, recvisited=Non
                                    recdepth=recdepth + 1, recvisited=recvisited)
 
 
+def node_itself(node, initial_node, recdepth=0, recvisited=None):
+    """ The value of an ArrayExpression, ObjectExpression or ObjectPattern is the Node. """
+
+    return node
+
+
+def compute_this_expression(node, initial_node, recdepth=0, recvisited=None):
+    """ Value of a ThisExpression. """
+
+    return 'this'
+
+
+def compute_call_expression_value(node, initial_node, recdepth=0, recvisited=None):
+    """ Value of a CallExpression, TaggedTemplateExpression or NewExpression. """
+
+    if node.name == 'CallExpression' and isinstance(node.children[0], _node.FunctionExpression):
+        return node.children[0].fun_name  # Function called; mapping to the function name if any
+    return compute_call_expression(node, initial_node=initial_node,
+                                   recdepth=recdepth, recvisited=recvisited)
+
+
+def compute_first_child(node, initial_node, recdepth=0, recvisited=None):
+    """ Value of a ReturnStatement, BlockStatement or UpdateExpression: of its first child. """
+
+    if node.children:
+        return get_node_computed_value(node.children[0], initial_node=initial_node,
+                                       recdepth=recdepth, recvisited=recvisited)
+    return None
+
+
 def operator_plus(a, b):
     """ Evaluates a + b. """
     if isinstance(a, str) or isinstance(b, str):
@@ -619,3 +660,27 @@ def operator_and(a, b):
 def operator_or(a, b):
     """ Evaluates a or b. """
     return a or b
+
+
+# Function computing the value of a Node, depending on its type, cf. get_node_value
+NODE_VALUES = {
+    'UnaryExpression': compute_unary_expression,
+    'BinaryExpression': compute_binary_expression,
+    'LogicalExpression': compute_binary_expression,
+    'ArrayExpression': node_itself,
+    'ObjectExpression': node_itself,
+    'ObjectPattern': node_itself,
+    'MemberExpression': compute_member_expression,
+    'ThisExpression': compute_this_expression,
+    'FunctionExpression': compute_function_expression,
+    'ArrowFunctionExpression': compute_function_expression,
+    'CallExpression': compute_call_expression_value,
+    'TaggedTemplateExpression': compute_call_expression_value,
+    'NewExpression': compute_call_expression_value,
+    'ReturnStatement': compute_first_child,
+    'BlockStatement': compute_first_child,
+    'TemplateLiteral': compute_template_literal,
+    'ConditionalExpression': compute_conditional_expression,
+    'AssignmentExpression': compute_assignment_expression,
+    'UpdateExpression': compute_first_child,
+}
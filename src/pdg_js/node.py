@@ -37,54 +37,105 @@ import logging
 import random
 
 from . import utility_df
+from .call_value import CallValue
+from .node_set import NodeSet
+
+# Node types as frozensets: constant time membership tests, done for each Node visited
+EXPRESSIONS = frozenset(['AssignmentExpression', 'ArrayExpression', 'ArrowFunctionExpression',
+                         'AwaitExpression', 'BinaryExpression', 'CallExpression',
+                         'ClassExpression', 'ConditionalExpression', 'FunctionExpression',
+                         'LogicalExpression', 'MemberExpression', 'NewExpression',
+                         'ObjectExpression', 'SequenceExpression', 'TaggedTemplateExpression',
+                         'ThisExpression', 'UnaryExpression', 'UpdateExpression',
+                         'YieldExpression'])
+
+EPSILON = frozenset(['BlockStatement', 'DebuggerStatement', 'EmptyStatement',
+                     'ExpressionStatement', 'LabeledStatement', 'ReturnStatement',
+                     'ThrowStatement', 'WithStatement', 'CatchClause', 'VariableDeclaration',
+                     'FunctionDeclaration', 'ClassDeclaration'])
+
+CONDITIONAL = frozenset(['DoWhileStatement', 'ForStatement', 'ForOfStatement', 'ForInStatement',
+                         'IfStatement', 'SwitchCase', 'SwitchStatement', 'TryStatement',
+                         'WhileStatement', 'ConditionalExpression'])
+
+UNSTRUCTURED = frozenset(['BreakStatement', 'ContinueStatement'])
+
+STATEMENTS = EPSILON | CONDITIONAL | UNSTRUCTURED
+CALL_EXPR = frozenset(['CallExpression', 'TaggedTemplateExpression', 'NewExpression'])
+VALUE_EXPR = frozenset(['Literal', 'ArrayExpression', 'ObjectExpression',
+                        'ObjectPattern']) | CALL_EXPR
+COMMENTS = frozenset(['Line', 'Block'])
 
-EXPRESSIONS = ['AssignmentExpression', 'ArrayExpression', 'ArrowFunctionExpression',
-               'AwaitExpression', 'BinaryExpression', 'CallExpression', 'ClassExpression',
-               'ConditionalExpression', 'FunctionExpression', 'LogicalExpression',
-               'MemberExpression', 'NewExpression', 'ObjectExpression', 'SequenceExpression',
-               'TaggedTemplateExpression', 'ThisExpression', 'UnaryExpression', 'UpdateExpression',
-               'YieldExpression']
+GLOBAL_VAR = ['window', 'this', 'self', 'top', 'global', 'that']
 
-EPSILON = ['BlockStatement', 'DebuggerStatement', 'EmptyStatement',
-           'ExpressionStatement', 'LabeledStatement', 'ReturnStatement',
-           'ThrowStatement', 'WithStatement', 'CatchClause', 'VariableDeclaration',
-           'FunctionDeclaration', 'ClassDeclaration']
+LIMIT_SIZE = utility_df.LIMIT_SIZE  # To avoid list values with over 1,000 characters
 
-CONDITIONAL = ['DoWhileStatement', 'ForStatement', 'ForOfStatement', 'ForInStatement',
-               'IfStatement', 'SwitchCase', 'SwitchStatement', 'TryStatement',
-               'WhileStatement', 'ConditionalExpression']
+NO_PROVENANCE = ()  # Shared empty provenance, cf. Value
 
-UNSTRUCTURED = ['BreakStatement', 'ContinueStatement']
+# Modification epoch: incremented whenever a value, a DD or a function of the PDG changes, so that
+# the values computed before are not reused, cf. js_operators.get_node_computed_value
+EPOCH = 0
 
-STATEMENTS = EPSILON + CONDITIONAL + UNSTRUCTURED
-CALL_EXPR = ['CallExpression', 'TaggedTemplateExpression', 'NewExpression']
-VALUE_EXPR = ['Literal', 'ArrayExpression', 'ObjectExpression', 'ObjectPattern'] + CALL_EXPR
-COMMENTS = ['Line', 'Block']
 
-GLOBAL_VAR = ['window', 'this', 'self', 'top', 'global', 'that']
+def new_epoch():
+    """ Starts a new modification epoch, as the PDG changed. """
 
-LIMIT_SIZE = utility_df.LIMIT_SIZE  # To avoid list values with over 1,000 characters
+    global EPOCH
+    EPOCH += 1
+
+
+def set_state(instance, state):
+    """ Unpickling, also of the PDGs pickled before the classes had __slots__ (state in a dict). """
+
+    if isinstance(state, tuple):  # (__dict__, __slots__) states
+        state = {**(state[0] or {}), **(state[1] or {})}
+    state.pop('computed_value', None)  # From the epochs of another process
+    state.pop('set_index', None)  # Index of another process or of the copied Node, cf. NodeSet
+    for relation in ('provenance_children', 'provenance_parents'):  # Pickled as lists and sets
+        if relation + '_list' in state:
+            state[relation] = state.pop(relation + '_list') or ()
+        state.pop(relation + '_seen', None)
+    if 'seen_provenance_set' in state:
+        state['seen_provenance'] = state.pop('seen_provenance_set') or ()
+    for attribute, value in state.items():
+        setattr(instance, attribute, value)
 
 
 class Dependence:
     """ For control, data, comment, and statement dependencies. """
 
+    __slots__ = ('type', 'extremity', 'nearest_statement', 'label')
+
     def __init__(self, dependency_type, extremity, label, nearest_statement=None):
         self.type = dependency_type
         self.extremity = extremity
         self.nearest_statement = nearest_statement
         self.label = label
 
+    def __setstate__(self, state):
+        set_state(self, state)
+
 
 class Node:
     """ Defines a Node that is used in the AST. """
 
-    id = random.randint(0, 2*32)  # To limit id collision between 2 ASTs from separate processes
+    # No __dict__ per Node, which is most of the memory used on large scripts.
+    # Slots only set when needed (hasattr is False otherwise): flow_children, flow_parents
+    # (message flows), fun_param_children, fun_param_parents (parameter flows),
+    # onconnectexternal and call_sites (on the root), computed_value (epoch, keep_none, value) of
+    # the last get_node_computed_value, and set_index (cf. NodeSet)
+    __slots__ = ('name', 'id', 'filename', 'attributes', 'body', 'body_list', 'parent',
+                 'children', 'statement_dep_parents', 'statement_dep_children', 'flow_children',
+                 'flow_parents', 'fun_param_children', 'fun_param_parents', 'onconnectexternal',
+                 'computed_value', 'call_sites', 'set_index', '__weakref__')
+
+    # To limit id collision between 2 ASTs from separate processes
+    next_id = random.randint(0, 2*32)
 
     def __init__(self, name, parent=None):
         self.name = name
-        self.id = Node.id
-        Node.id += 1
+        self.id = Node.next_id
+        Node.next_id += 1
         self.filename = ''
         self.attributes = {}
         self.body = None
@@ -156,6 +207,9 @@ class Node:
         except KeyError:
             return None
 
+    def __setstate__(self, state):
+        set_state(self, state)
+
     def get_file(self):
         parent = self
         while True:
@@ -199,7 +253,7 @@ def shorten_value_list(value_list, value_list_shortened, counter=0):
             counter = shorten_value_list(el, value_list_shortened[-1], counter)
             if counter >= LIMIT_SIZE:
                 return counter
-        elif isinstance(el, str):
+        elif isinstance(el, (str, CallValue)):
             counter += len(el)
             if counter < LIMIT_SIZE:
                 value_list_shortened.append(el)
@@ -234,7 +288,7 @@ def shorten_value_dict(value_dict, value_dict_shortened, counter=0, visited=None
             counter = shorten_value_dict(v, value_dict_shortened[k], counter, visited)
             if counter >= LIMIT_SIZE:
                 return counter
-        elif isinstance(v, str):
+        elif isinstance(v, (str, CallValue)):
             counter += len(v)
             if counter < LIMIT_SIZE:
                 value_dict_shortened[k] = v
@@ -248,16 +302,67 @@ def shorten_value_dict(value_dict, value_dict_shortened, counter=0, visited=None
 class Value:
     """ To store the value of a specific node. """
 
+    # Mixin: the slots are declared by the Node subclasses, cf. VALUE_SLOTS.
+    # The provenance is stored in NodeSets, only allocated when a first element is added. Until
+    # then, provenance_* are shared empty containers. Otherwise, they are the NodeSets themselves
+    __slots__ = ()
+
     def __init__(self):
         self.value = None
         self.update_value = True
-        self.provenance_children = []
-        self.provenance_parents = []
-        self.provenance_children_set = set()
-        self.provenance_parents_set = set()
-        self.seen_provenance = set()
-
-    def set_value(self, value):
+        self.provenance_children_nodes = None
+        self.provenance_parents_nodes = None
+        self.seen_provenance_nodes = None
+
+    @property
+    def provenance_children(self):
+        return self.provenance_children_nodes or NO_PROVENANCE
+
+    @provenance_children.setter
+    def provenance_children(self, provenance_children):
+        self.provenance_children_nodes = NodeSet(provenance_children) or None
+
+    @property
+    def provenance_parents(self):
+        return self.provenance_parents_nodes or NO_PROVENANCE
+
+    @provenance_parents.setter
+    def provenance_parents(self, provenance_parents):
+        self.provenance_parents_nodes = NodeSet(provenance_parents) or None
+
+    @property
+    def seen_provenance(self):
+        return self.seen_provenance_nodes or NO_PROVENANCE
+
+    @seen_provenance.setter
+    def seen_provenance(self, seen_provenance):
+        self.seen_provenance_nodes = NodeSet(node for node in seen_provenance
+                                             if isinstance(node, Node)) or None
+
+    def add_provenance_child(self, child):
+        if self.provenance_children_nodes is None:
+            self.provenance_children_nodes = NodeSet()
+        self.provenance_children_nodes.add(child)
+
+    def add_provenance_parent(self, parent):
+        if self.provenance_parents_nodes is None:
+            self.provenance_parents_nodes = NodeSet()
+        self.provenance_parents_nodes.add(parent)
+
+    def add_provenance_children(self, children):
+        if self.provenance_children_nodes is None:
+            self.provenance_children_nodes = NodeSet()
+        self.provenance_children_nodes.update(children)
+
+    def add_provenance_parents(self, parents):
+        if self.provenance_parents_nodes is None:
+            self.provenance_parents_nodes = NodeSet()
+        self.provenance_parents_nodes.update(parents)
+
+    def set_value(self, value, modified=True):
+        # modified is False when storing the value computed from the current PDG
+        if modified:
+            new_epoch()
         if isinstance(value, list):  # To shorten value if over LIMIT_SIZE characters
             value_shortened = []
             counter = shorten_value_list(value, value_shortened)
@@ -270,8 +375,8 @@ class Value:
             if counter >= LIMIT_SIZE:
                 value = value_shortened
                 logging.warning('Shortened the value of %s %s', self.name, self.attributes)
-        elif isinstance(value, str):  # To shorten value if over LIMIT_SIZE characters
-            value = value[:LIMIT_SIZE]
+        elif isinstance(value, (str, CallValue)) and len(value) > LIMIT_SIZE:  # To shorten value
+            value = str(value)[:LIMIT_SIZE]  # A plain str if value was a CallValue
         self.value = value
 
     def set_update_value(self, update_value):
@@ -279,59 +384,37 @@ class Value:
 
     def set_provenance_dd(self, extremity):  # Set Node provenance, set_data_dependency case
         # self is the origin of the DD while extremity is the destination of the DD
-        if extremity.provenance_children:
-            for child in extremity.provenance_children:
-                if child not in self.provenance_children_set:
-                    self.provenance_children_set.add(child)
-                    self.provenance_children.append(child)
+        if extremity.provenance_children_nodes:
+            self.add_provenance_children(extremity.provenance_children_nodes)
         else:
-            if extremity not in self.provenance_children_set:
-                self.provenance_children_set.add(extremity)
-                self.provenance_children.append(extremity)
-        if self.provenance_parents:
-            for parent in self.provenance_parents:
-                if parent not in extremity.provenance_parents_set:
-                    extremity.provenance_parents_set.add(parent)
-                    extremity.provenance_parents.append(parent)
+            self.add_provenance_child(extremity)
+        if self.provenance_parents_nodes:
+            extremity.add_provenance_parents(self.provenance_parents_nodes)
         else:
-            if self not in extremity.provenance_parents_set:
-                extremity.provenance_parents_set.add(self)
-                extremity.provenance_parents.append(self)
+            extremity.add_provenance_parent(self)
 
     def set_provenance(self, extremity):  # Set Node provenance, computed value case
         """
         a.b = c
         """
-        if extremity in self.seen_provenance:
-            pass
-        self.seen_provenance.add(extremity)
         # extremity was leveraged to compute the value of self
         if not isinstance(extremity, Node):  # extremity is None:
-            if self not in self.provenance_parents_set:
-                self.provenance_parents_set.add(self)
-                self.provenance_parents.append(self)
-        elif isinstance(extremity, Value):
-            if extremity.provenance_parents:
-                for parent in extremity.provenance_parents:
-                    if parent not in self.provenance_parents_set:
-                        self.provenance_parents_set.add(parent)
-                        self.provenance_parents.append(parent)
+            self.add_provenance_parent(self)
+            return
+        if self.seen_provenance_nodes is None:
+            self.seen_provenance_nodes = NodeSet()
+        self.seen_provenance_nodes.add(extremity)
+        if isinstance(extremity, Value):
+            if extremity.provenance_parents_nodes:
+                self.add_provenance_parents(extremity.provenance_parents_nodes)
             else:
-                if extremity not in self.provenance_parents_set:
-                    self.provenance_parents_set.add(extremity)
-                    self.provenance_parents.append(extremity)
-            if self.provenance_children:
-                for child in self.provenance_children:
-                    if child not in extremity.provenance_children_set:
-                        extremity.provenance_children_set.add(child)
-                        extremity.provenance_children.append(child)
+                self.add_provenance_parent(extremity)
+            if self.provenance_children_nodes:
+                extremity.add_provenance_children(self.provenance_children_nodes)
             else:
-                if self not in extremity.provenance_children_set:
-                    extremity.provenance_children_set.add(self)
-                    extremity.provenance_children.append(self)
-        elif isinstance(extremity, Node):  # Otherwise very restrictive
-            self.provenance_parents_set.add(extremity)
-            self.provenance_parents.append(extremity)
+                extremity.add_provenance_child(self)
+        else:  # Otherwise very restrictive
+            self.add_provenance_parent(extremity)
             for extremity_child in extremity.children:  # Not necessarily useful
                 self.set_provenance(extremity_child)
 
@@ -341,9 +424,15 @@ class Value:
             self.set_provenance_rec(child)
 
 
+VALUE_SLOTS = ('value', 'update_value', 'provenance_children_nodes', 'provenance_parents_nodes',
+               'seen_provenance_nodes')
+
+
 class Identifier(Node, Value):
     """ Identifier Nodes. DD is on Identifier nodes. """
 
+    __slots__ = VALUE_SLOTS + ('code', 'fun', 'data_dep_parents', 'data_dep_children')
+
     def __init__(self, name, parent):
         Node.__init__(self, name, parent)
         Value.__init__(self)
@@ -356,10 +445,12 @@ class Identifier(Node, Value):
         self.code = code
 
     def set_fun(self, fun):  # The Identifier node refers to a function ('s name)
+        new_epoch()
         self.fun = fun
 
     def set_data_dependency(self, extremity, nearest_statement=None):
         if extremity not in [el.extremity for el in self.data_dep_children]:  # Avoids duplicates
+            new_epoch()
             self.data_dep_children.append(Dependence('data dependency', extremity, 'data',
                                                      nearest_statement))
             extremity.data_dep_parents.append(Dependence('data dependency', self, 'data',
@@ -370,6 +461,8 @@ class Identifier(Node, Value):
 class ValueExpr(Node, Value):
     """ Nodes from VALUE_EXPR which therefore have a value that should be stored. """
 
+    __slots__ = VALUE_SLOTS
+
     def __init__(self, name, parent):
         Node.__init__(self, name, parent)
         Value.__init__(self)
@@ -378,10 +471,13 @@ class ValueExpr(Node, Value):
 class Statement(Node):
     """ Statement Nodes, see STATEMENTS. """
 
+    __slots__ = ('control_dep_parents', 'control_dep_children', 'loop_defs')
+
     def __init__(self, name, parent):
         Node.__init__(self, name, parent)
         self.control_dep_parents = []
         self.control_dep_children = []
+        self.loop_defs = None  # Definitions which reached the head of the loop, cf. loop_fixpoint
 
     def set_control_dependency(self, extremity, label):
         self.control_dep_children.append(Dependence('control dependency', extremity, label))
@@ -404,6 +500,8 @@ class Statement(Node):
 class ReturnStatement(Statement, Value):
     """ ReturnStatement Node. It is a Statement that also has the attributes of a Value. """
 
+    __slots__ = VALUE_SLOTS
+
     def __init__(self, name, parent):
         Statement.__init__(self, name, parent)
         Value.__init__(self)
@@ -412,23 +510,29 @@ class ReturnStatement(Statement, Value):
 class Function:
     """ To store function related information. """
 
+    __slots__ = ()  # Mixin: the slots are declared by the Node subclasses, cf. FUNCTION_SLOTS
+
     def __init__(self):
         self.fun_name = None
         self.fun_params = []
         self.fun_return = []
         self.retraverse = False  # Indicates if we are traversing a given node again
         self.called = False
+        self.fun_summaries = {}  # Summaries of the retraversals, by key, cf. fun_summary.py
+        self.fun_content = None  # Names and nodes with a value in the function, cf. fun_summary.py
 
     def set_fun_name(self, fun_name):
         self.fun_name = fun_name
         fun_name.set_fun(self)  # Identifier fun_name has a handler to the function declaration self
 
     def add_fun_param(self, fun_param):
+        new_epoch()
         self.fun_params.append(fun_param)
 
     def add_fun_return(self, fun_return):
         # if fun_return.id not in [el.id for el in self.fun_return]:  # Avoids duplicates
         # Duplicates are okay, because we only consider the last return value from the list
+        new_epoch()
         return_id_list = [el.id for el in self.fun_return]
         if not return_id_list:
             self.fun_return.append(fun_return)
@@ -442,9 +546,15 @@ class Function:
         self.called = True
 
 
+FUNCTION_SLOTS = ('fun_name', 'fun_params', 'fun_return', 'retraverse', 'called',
+                  'fun_summaries', 'fun_content')
+
+
 class FunctionDeclaration(Statement, Function):
     """ FunctionDeclaration Node. It is a Statement that also has the attributes of a Function. """
 
+    __slots__ = FUNCTION_SLOTS
+
     def __init__(self, name, parent):
         Statement.__init__(self, name, parent)
         Function.__init__(self)
@@ -453,6 +563,8 @@ class FunctionDeclaration(Statement, Function):
 class FunctionExpression(Node, Function):
     """ FunctionExpression and ArrowFunctionExpression Nodes. Have the attributes of a Function. """
 
+    __slots__ = FUNCTION_SLOTS + ('fun_intern_name',)
+
     def __init__(self, name, parent):
         Node.__init__(self, name, parent)
         Function.__init__(self)
@@ -0,0 +1,144 @@
+# Copyright (C) 2021 Aurore Fass
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+    Sets of Nodes as bitsets over dense Node indexes, e.g., for the provenance.
+"""
+
+# The Nodes get an index the first time they are added to a NodeSet, from a counter of the process.
+# A NodeSet is an int whose bit i - base is set if the Node with index i is in the set, so that
+# its size depends on the range of the indexes in the set, not on the number of Nodes created
+# before by the process. The Nodes are found back from their indexes in a weak registry, which
+# does not keep alive the Nodes of the PDGs no longer used.
+
+import itertools
+import weakref
+
+NODES = weakref.WeakValueDictionary()  # Index -> Node
+INDEXES = itertools.count()
+
+
+def get_index(node):
+    """ Index of node, given the first time it is needed. """
+
+    index = getattr(node, 'set_index', None)
+    if index is None:
+        index = next(INDEXES)
+        node.set_index = index
+        NODES[index] = node
+    return index
+
+
+def reserve(nb_indexes):
+    """ Reserves nb_indexes consecutive indexes, e.g., for the Nodes of a loaded PDG, returns the
+    first one. """
+
+    global INDEXES
+    first = next(INDEXES)
+    INDEXES = itertools.count(first + nb_indexes)
+    return first
+
+
+def set_index(node, index):
+    """ Gives the reserved index to node. """
+
+    node.set_index = index
+    NODES[index] = node
+
+
+class NodeSet:
+    """ Set of Nodes, iterated over in the order of their indexes. """
+
+    __slots__ = ('base', 'bits')
+
+    def __init__(self, nodes=()):
+        self.base = 0  # Index of bit 0
+        self.bits = 0
+        for node in nodes:
+            self.add(node)
+
+    def __reduce__(self):
+        return NodeSet, (list(self),)
+
+    def __len__(self):
+        return bin(self.bits).count('1')  # Not int.bit_count, Python 3.10+
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def __contains__(self, node):
+        index = getattr(node, 'set_index', None)
+        if index is None or index < self.base:
+            return False
+        return (self.bits >> (index - self.base)) & 1 == 1
+
+    def __iter__(self):
+        base = self.base
+        bits = format(self.bits, 'b')[::-1]  # Bit i at position i
+        position = bits.find('1')
+        while position >= 0:
+            node = NODES.get(base + position)
+            if node is not None:  # Otherwise no longer used
+                yield node
+            position = bits.find('1', position + 1)
+
+    def align(self, base):
+        """ Moves bit 0 down to index base, if it is lower than the current one. """
+
+        if base < self.base:
+            if self.bits:
+                self.bits <<= self.base - base
+            self.base = base
+
+    def add(self, node):
+        """ Adds node, returns True if it was not already in the set. """
+
+        index = get_index(node)
+        if not self.bits:
+            self.base = index
+        else:
+            self.align(index)
+        bit = 1 << (index - self.base)
+        if self.bits & bit:
+            return False
+        self.bits |= bit
+        return True
+
+    def update(self, other):
+        """ Adds the Nodes of the NodeSet other, with one union. """
+
+        if other.bits:
+            if not self.bits:
+                self.base = other.base
+                self.bits = other.bits
+            elif other.base >= self.base:
+                self.bits |= other.bits << (other.base - self.base)
+            else:
+                self.bits = (self.bits << (self.base - other.base)) | other.bits
+                self.base = other.base
+
+    def difference(self, other):
+        """ NodeSet of the Nodes of self which are not in the NodeSet other. """
+
+        result = NodeSet()
+        result.base = self.base
+        result.bits = self.bits
+        if other.bits and self.bits:
+            if other.base >= self.base:
+                result.bits &= ~(other.bits << (other.base - self.base))
+            else:
+                result.bits &= ~(other.bits >> (self.base - other.base))
+        return result
@@ -19,6 +19,7 @@
 
 module.exports = {
     js2ast: js2ast,
+    serve: serve,
 };
 
 
@@ -26,6 +27,32 @@ var esprima = require("esprima");
 var es = require("escodegen");
 var fs = require("fs");
 var process = require("process");
+var readline = require("readline");
+var binary_ast = require("./binary_ast");
+
+
+/**
+ * Esprima parsing, with tokens and attached comments unless lean.
+ *
+ * @param text
+ * @param lean
+ * @returns {*}
+ */
+function parse(text, lean) {
+    var ast = esprima.parseModule(text, {
+        range: true,
+        loc: true,
+        tokens: !lean,
+        tolerant: true,
+        comment: !lean
+    });
+
+    if (!lean) {
+        // Attaching comments is a separate step for Escodegen
+        ast = es.attachComments(ast, ast.comments, ast.tokens);
+    }
+    return ast;
+}
 
 
 /**
@@ -33,27 +60,22 @@ var process = require("process");
  *
  * @param js
  * @param json_path
+ * @param lean if true, neither tokens nor comments are produced (they are only needed to
+ * generate the code back with Escodegen)
+ * @param binary if true, the AST is stored in the binary format of binary_ast.js, not in JSON
  * @returns {*}
  */
-function js2ast(js, json_path) {
+function js2ast(js, json_path, lean, binary) {
     var text = fs.readFileSync(js).toString('utf-8');
     try {
-        var ast = esprima.parseModule(text, {
-            range: true,
-            loc: true,
-            tokens: true,
-            tolerant: true,
-            comment: true
-        });
+        var ast = parse(text, lean);
     } catch(e) {
         console.error(js, e);
         process.exit(1);
     }
 
-    // Attaching comments is a separate step for Escodegen
-    ast = es.attachComments(ast, ast.comments, ast.tokens);
-
-    fs.writeFile(json_path, JSON.stringify(ast), function (err) {
+    var content = binary ? binary_ast.encode(ast) : JSON.stringify(ast);
+    fs.writeFile(json_path, content, function (err) {
         if (err) {
             console.error(err);
         }
@@ -62,4 +84,55 @@ function js2ast(js, json_path) {
     return ast;
 }
 
-js2ast(process.argv[2], process.argv[3]);
+
+/**
+ * Long-lived parser: answers the parsing requests received on stdin, one JSON object per line
+ * ({id, input, output, lean, binary}), by writing the AST of input in output and a JSON status
+ * line on stdout ({id, ok, rss}). Without output, the binary AST directly follows the status
+ * line on stdout ({id, ok, rss, size}). Avoids paying the Node.js startup and the Esprima module
+ * loading per file.
+ */
+function serve() {
+    var rl = readline.createInterface({input: process.stdin, terminal: false});
+
+    rl.on('line', function (line) {
+        if (!line.trim()) {
+            return;
+        }
+        var request = JSON.parse(line);
+        var answer = {id: request.id, ok: true};
+        var payload = null;
+        try {
+            var text = fs.readFileSync(request.input).toString('utf-8');
+            var ast = parse(text, request.lean);
+            payload = request.binary ? binary_ast.encode(ast) : JSON.stringify(ast);
+            if (request.output) {
+                fs.writeFileSync(request.output, payload);
+                payload = null;
+            } else {
+                payload = Buffer.from(payload);
+                answer.size = payload.length;
+            }
+        } catch(e) {
+            answer.ok = false;
+            answer.error = String(e);
+            payload = null;
+        }
+        answer.rss = process.memoryUsage().rss;
+        process.stdout.write(JSON.stringify(answer) + '\n');
+        if (payload !== null) {
+            process.stdout.write(payload);
+        }
+    });
+
+    rl.on('close', function () {
+        process.exit(0);
+    });
+}
+
+if (process.argv[2] === '--daemon') {
+    serve();
+} else {
+    js2ast(process.argv[2], process.argv[3], process.argv.indexOf('--lean') !== -1,
+        process.argv.indexOf('--binary') !== -1);
+}
@@ -0,0 +1,263 @@
+# Copyright (C) 2021 Aurore Fass
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+    Long-lived Node.js parser processes (parser.js --daemon), to avoid starting Node.js and
+    loading Esprima again for each file to parse.
+"""
+
+import os
+import json
+import time
+import queue
+import select
+import atexit
+import logging
+import subprocess
+import threading
+
+from . import utility_df
+
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__)))
+
+
+class ParserCrash(Exception):
+    """ The parser process died or stopped answering while handling a request. """
+
+
+class ParserDaemon:
+    """ One Node.js process answering parsing requests over its stdin/stdout. """
+
+    def __init__(self, max_rss=utility_df.PARSER_MAX_RSS, timeout=utility_df.PARSER_TIMEOUT):
+        self.max_rss = max_rss
+        self.timeout = timeout
+        self.process = None
+        self.buffer = b''
+        self.request_nb = 0
+
+    def start(self):
+        """ Starts the Node.js process. """
+        self.process = subprocess.Popen(['node', os.path.join(SRC_PATH, 'parser.js'), '--daemon'],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.buffer = b''
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        """ Stops the Node.js process (closing stdin is enough, killing if it does not exit). """
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+            self.process.stdout.close()
+            self.process = None
+
+    def detach(self):
+        """ Forgets the process without stopping it, e.g., when it was inherited through fork. """
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.stdout.close()
+            self.process = None
+
+    def restart(self):
+        """ Replaces the current Node.js process with a fresh one. """
+        if self.process is not None:
+            self.process.kill()
+            self.detach()
+        self.start()
+
+    def read_line(self, deadline):
+        """ Reads one line from the process stdout, raises ParserCrash on EOF or timeout. """
+        fd = self.process.stdout.fileno()
+        while b'\n' not in self.buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ParserCrash('no answer in time')
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if ready:
+                data = os.read(fd, 65536)
+                if not data:
+                    raise ParserCrash('parser process exited with %s' % self.process.poll())
+                self.buffer += data
+        line, self.buffer = self.buffer.split(b'\n', 1)
+        return line
+
+    def read_bytes(self, size, deadline):
+        """ Reads size bytes from the process stdout, raises ParserCrash on EOF or timeout. """
+        fd = self.process.stdout.fileno()
+        chunks = [self.buffer]
+        received = len(self.buffer)
+        while received < size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ParserCrash('no answer in time')
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if ready:
+                data = os.read(fd, max(65536, size - received))
+                if not data:
+                    raise ParserCrash('parser process exited with %s' % self.process.poll())
+                chunks.append(data)
+                received += len(data)
+        data = b''.join(chunks)
+        self.buffer = data[size:]
+        return data[:size]
+
+    def parse(self, input_file, output=None, lean=False, binary=False):
+        """
+            Asks the Node.js process for the Esprima AST of input_file.
+
+            -------
+            Parameters:
+            - input_file: str
+                Path of the file to produce an AST from.
+            - output: str
+                Path of the file to store the AST in, or None to receive it through the pipe.
+            - lean: bool
+                Whether to skip the tokens and comments production.
+            - binary: bool
+                Whether to use the binary format from binary_ast.js instead of JSON.
+
+            -------
+            Returns:
+            - bytes
+                The AST if output is None, otherwise b''.
+            - None if Esprima could not parse input_file.
+            - raises ParserCrash if the process died or timed out (it is then restarted lazily).
+            - raises utility_df.Timeout.Timeout if the current deadline of the thread is over
+            before the answer (the process is then restarted lazily too).
+        """
+
+        if not self.is_alive():
+            self.restart()
+        self.request_nb += 1
+        # The pid avoids mixing up answers if the process was used by a forked child
+        request_id = '%d-%d' % (os.getpid(), self.request_nb)
+        request = json.dumps({'id': request_id, 'input': input_file, 'output': output,
+                              'lean': lean, 'binary': binary})
+        timeout = self.timeout
+        remaining = utility_df.remaining_time()
+        if remaining is not None and remaining < timeout:  # Not past the deadline of the caller
+            timeout = remaining
+        deadline = time.monotonic() + timeout
+        try:
+            self.process.stdin.write(request.encode('utf-8') + b'\n')
+            self.process.stdin.flush()
+            while True:
+                answer = json.loads(self.read_line(deadline))
+                payload = self.read_bytes(answer['size'], deadline) if 'size' in answer else b''
+                if answer['id'] == request_id:
+                    break  # Otherwise, stale answer to an interrupted request
+        except (OSError, ValueError, ParserCrash) as e:
+            self.process.kill()
+            self.detach()
+            utility_df.check_timeout()  # Not a crash, not to retry
+            raise ParserCrash(str(e))
+
+        if answer.get('rss', 0) > self.max_rss:  # Esprima/V8 memory not given back, fresh start
+            logging.info('Restarting the parser process, %s bytes used', answer['rss'])
+            self.stop()
+        if not answer['ok']:
+            logging.critical('Esprima parsing error for %s: %s', input_file, answer.get('error'))
+            return None
+        return payload
+
+
+class ParserPool:
+    """ Thread-safe pool of ParserDaemon, started lazily. """
+
+    def __init__(self, size=utility_df.PARSER_POOL_SIZE):
+        self.owner = os.getpid()
+        self.daemons = [ParserDaemon() for _ in range(size)]
+        self.available = queue.Queue()
+        for daemon in self.daemons:
+            self.available.put(daemon)
+
+    def parse(self, input_file, output=None, lean=False, binary=False):
+        """
+            Produces the Esprima AST of input_file using an available parser process, cf.
+            ParserDaemon.parse. A crashed process is restarted and the request tried once more.
+
+            -------
+            Returns:
+            - bytes
+                The AST if output is None, otherwise b''.
+            - None if an error occurred.
+        """
+
+        daemon = self.available.get()
+        try:
+            for attempt in range(2):
+                try:
+                    return daemon.parse(input_file, output, lean, binary)
+                except ParserCrash as e:
+                    logging.critical('The parser process crashed on %s (attempt %d): %s',
+                                     input_file, attempt + 1, e)
+            return None
+        finally:
+            self.available.put(daemon)
+
+    def close(self):
+        """ Stops the processes started by the current process, forgets the inherited ones. """
+        for daemon in self.daemons:
+            if self.owner == os.getpid():
+                daemon.stop()
+            else:
+                daemon.detach()
+
+
+POOL = None
+POOL_LOCK = threading.Lock()
+
+
+def get_parser_pool():
+    """
+        Returns the parser pool of the current process.
+        A pool inherited through fork is reused, e.g., by a child its parent waits for: the
+        answers are tagged with the requesting pid.
+    """
+
+    global POOL
+    with POOL_LOCK:
+        if POOL is None:
+            POOL = ParserPool()
+        return POOL
+
+
+def reset_parser_pool():
+    """ To call at the start of a worker process so that it does not share its parent's pool. """
+
+    global POOL
+    with POOL_LOCK:
+        if POOL is not None and POOL.owner != os.getpid():
+            POOL.close()
+        POOL = None
+
+
+def close_parser_pool():
+    """ Stops the parser processes of the current process. """
+
+    global POOL
+    with POOL_LOCK:
+        if POOL is not None:
+            POOL.close()
+        POOL = None
+
+
+atexit.register(close_parser_pool)
@@ -0,0 +1,286 @@
+# Copyright (C) 2021 Aurore Fass
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+    Content-addressed on-disk cache of PDGs, shared by concurrent processes.
+    Key: sha256 of the JS source, of the pdg_js code, and of the analysis limits and modes.
+"""
+
+import os
+import glob
+import time
+import fcntl
+import hashlib
+import logging
+import tempfile
+import functools
+
+from . import node as _node
+from . import pdg_store
+from . import utility_df
+
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__)))
+SUFFIX = '.pdg'
+LOCK_FILE = 'evict.lock'
+SIZE_FILE = 'size'  # Running size of the cache and time of the last scan, not to scan at each store
+LOW_WATERMARK = 0.9  # Evicts down to 90% of the maximal size, not to evict at each store
+STALE_TMP = 3600  # Temporary files of crashed writers removed after 1 hour
+SCAN_INTERVAL = 3600  # Scans the cache at least every hour, e.g., for PDGs removed by hand
+
+
+@functools.lru_cache(maxsize=None)
+def analysis_version():
+    """ Hash of the pdg_js code, so that a change in the analysis invalidates the cache. """
+
+    digest = hashlib.sha256()
+    for code_file in sorted(glob.glob(os.path.join(SRC_PATH, '*.py'))
+                            + glob.glob(os.path.join(SRC_PATH, '*.js'))):
+        digest.update(os.path.basename(code_file).encode('utf-8'))
+        with open(code_file, 'rb') as code:
+            digest.update(code.read())
+    return digest.hexdigest()
+
+
+def get_key(input_file):
+    """
+        Computes the cache key of the PDG of input_file.
+
+        -------
+        Parameter:
+        - input_file: str
+            Path of the JS file.
+
+        -------
+        Returns:
+        - str
+            Hexadecimal sha256 of the source, analysis version and limits.
+        - or None if input_file could not be read.
+    """
+
+    try:
+        with open(input_file, 'rb') as js_file:
+            source = js_file.read()
+    except OSError:
+        return None
+    digest = hashlib.sha256(source)
+    digest.update(('|%s|%s|%s|%s|%s|%s|%s' % (analysis_version(), utility_df.LIMIT_SIZE,
+                                               utility_df.LIMIT_LOOP, utility_df.LIMIT_RETRAVERSE,
+                                               utility_df.LOOP_FIXPOINT, utility_df.FUN_SUMMARIES,
+                                               utility_df.LIMIT_SUMMARIES))
+                  .encode('utf-8'))
+    return digest.hexdigest()
+
+
+def get_path(key, cache_dir):
+    """ Path of the PDG with the given key, in a subfolder to avoid huge folders. """
+
+    return os.path.join(cache_dir, key[:2], key + SUFFIX)
+
+
+def relocate(pdg, input_file):
+    """
+        Gives fresh ids to the Nodes of a cached PDG, to avoid collisions with the PDGs already
+        loaded, and replaces the path of the file the PDG was built from with input_file.
+    """
+
+    pdg.set_attribute('filename', input_file)
+    todo = [pdg]
+    while todo:
+        node = todo.pop()
+        node.id = _node.Node.next_id
+        _node.Node.next_id += 1
+        if node.filename:
+            node.filename = input_file
+        todo.extend(reversed(node.children))
+
+
+def load(key, input_file, cache_dir=utility_df.PDG_CACHE, errors=None):
+    """
+        Gets a PDG from the cache.
+
+        -------
+        Parameters:
+        - key: str
+            Output of get_key.
+        - input_file: str
+            Path of the JS file the PDG is for.
+        - cache_dir: str
+            Path of the cache folder.
+        - errors: list/None
+            To record a PDG which could not be loaded, e.g., benchmarks['errors'].
+
+        -------
+        Returns:
+        - Node
+            PDG of input_file.
+        - or None if not in the cache.
+    """
+
+    pdg_path = get_path(key, cache_dir)
+    try:
+        with open(pdg_path, 'rb') as pdg_file:
+            pdg = pdg_store.load_pdg(pdg_file)
+    except FileNotFoundError:
+        return None
+    except utility_df.Timeout.Timeout as e:
+        raise e
+    except Exception as e:  # Corrupted entry, e.g., written with another Python version
+        logging.critical('The cached PDG %s could not be loaded: %s', pdg_path, e)
+        if errors is not None:
+            errors.append('pdg-cache-load-error')
+        try:
+            os.remove(pdg_path)
+        except OSError:
+            pass
+        return None
+
+    try:
+        os.utime(pdg_path)  # Recently used
+    except OSError:  # Evicted in the meantime
+        pass
+    relocate(pdg, input_file)
+    return pdg
+
+
+def store(key, pdg, cache_dir=utility_df.PDG_CACHE, max_size=utility_df.PDG_CACHE_MAX_SIZE,
+          errors=None):
+    """
+        Stores a PDG in the cache, then evicts the least recently used PDGs if the cache is too
+        big. Written into a temporary file renamed afterwards, so that concurrent readers only
+        see complete PDGs.
+
+        -------
+        Parameters:
+        - key: str
+            Output of get_key.
+        - pdg: Node
+            PDG to store.
+        - cache_dir: str
+            Path of the cache folder.
+        - max_size: int
+            Maximal size of the cache, in bytes.
+        - errors: list/None
+            To record a PDG which could not be stored, e.g., benchmarks['errors'].
+    """
+
+    pdg_path = get_path(key, cache_dir)
+    tmp_path = None
+    size = 0
+    try:
+        os.makedirs(os.path.dirname(pdg_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(pdg_path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as pdg_file:
+            pdg_store.dump_pdg(pdg, pdg_file)
+            size = pdg_file.tell()
+        os.replace(tmp_path, pdg_path)  # Atomic, the last writer wins with the same content
+        tmp_path = None
+    except utility_df.Timeout.Timeout as e:
+        raise e
+    except Exception as e:  # E.g., no space left or Node outside of the PDG, the analysis goes on
+        logging.critical('Could not store the PDG %s in the cache: %s', pdg_path, e)
+        if errors is not None:
+            errors.append('pdg-cache-store-error')
+    finally:
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    state = update_size(cache_dir, size)
+    if state is None or state[0] > max_size or time.time() - state[1] > SCAN_INTERVAL:
+        evict(cache_dir, max_size)
+
+
+def update_size(cache_dir, added_size, scan_time=None):
+    """
+        Adds added_size to the running size of the cache, or sets the size to added_size after a
+        scan at scan_time.
+
+        -------
+        Returns:
+        - tuple
+            (Size of the cache, time of the last scan).
+        - or None if the size is unknown, e.g., before the first scan.
+    """
+
+    try:
+        with open(os.path.join(cache_dir, SIZE_FILE), 'a+') as size_file:
+            fcntl.flock(size_file, fcntl.LOCK_EX)  # Short, no need to skip it as for evict
+            size_file.seek(0)
+            if scan_time is not None:
+                state = added_size, scan_time
+            else:
+                try:
+                    total_size, last_scan = size_file.read().split()
+                except ValueError:  # Not scanned yet
+                    return None
+                state = int(total_size) + added_size, float(last_scan)
+            size_file.seek(0)
+            size_file.truncate()
+            size_file.write('%d %f' % state)
+            return state
+    except (OSError, ValueError):
+        return None
+
+
+def evict(cache_dir=utility_df.PDG_CACHE, max_size=utility_df.PDG_CACHE_MAX_SIZE):
+    """
+        Removes the least recently used PDGs until the cache is below LOW_WATERMARK * max_size.
+        Only one process evicts at a time, the others do not wait for it. Called by store only when
+        the running size (cf. update_size) is over max_size, unknown, or not rescanned for
+        SCAN_INTERVAL.
+    """
+
+    try:
+        lock = open(os.path.join(cache_dir, LOCK_FILE), 'a')
+    except OSError:
+        return
+    with lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:  # Another process is evicting
+            return
+
+        entries = []
+        total_size = 0
+        now = time.time()
+        for entry_path in glob.glob(os.path.join(cache_dir, '*', '*')):
+            try:
+                stat = os.stat(entry_path)
+            except OSError:  # Removed in the meantime
+                continue
+            if entry_path.endswith(SUFFIX):
+                entries.append((stat.st_mtime, stat.st_size, entry_path))
+                total_size += stat.st_size
+            elif entry_path.endswith('.tmp') and now - stat.st_mtime > STALE_TMP:
+                try:
+                    os.remove(entry_path)
+                except OSError:
+                    pass
+
+        if total_size > max_size:
+            entries.sort()
+            for _, size, entry_path in entries:
+                if total_size <= LOW_WATERMARK * max_size:
+                    break
+                try:
+                    os.remove(entry_path)  # Processes currently reading it still can
+                except OSError:
+                    pass
+                total_size -= size
+
+        update_size(cache_dir, total_size, scan_time=now)
@@ -0,0 +1,603 @@
+# Copyright (C) 2021 Aurore Fass
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+    Array-backed (struct-of-arrays) representation of a PDG: the nodes are integer indexes in
+    preorder, with type-code arrays, CSR-style child and edge arrays, and side tables for the
+    attributes and values. Converted back into Node objects for the analyses (to_pdg).
+    Stored on disk in a flat versioned binary format (dumps and loads).
+"""
+
+import io
+import os
+import sys
+import zlib
+import array
+import pickle
+import struct
+import timeit
+
+from . import node as _node
+from . import node_set
+from . import utility_df
+
+# Node classes, by code
+CLASSES = (_node.Node, _node.Identifier, _node.ValueExpr, _node.Statement,
+           _node.ReturnStatement, _node.FunctionDeclaration, _node.FunctionExpression)
+CLASS_CODES = {node_class: code for code, node_class in enumerate(CLASSES)}
+
+# Lists of Dependence, always there for the classes having them
+DEPENDENCES = ('statement_dep_parents', 'statement_dep_children', 'data_dep_parents',
+               'data_dep_children', 'control_dep_parents', 'control_dep_children')
+# Lists of Nodes, possibly not there (hasattr is False)
+NODE_LISTS = ('fun_param_children', 'fun_param_parents', 'flow_children', 'flow_parents',
+              'fun_params', 'fun_return')
+# NodeSets, in the slot <relation>_nodes, cf. Value
+NODE_SETS = ('provenance_children', 'provenance_parents', 'seen_provenance')
+# References to a Node or None
+NODE_REFS = ('fun', 'fun_name', 'fun_intern_name')
+# Other attributes, in a side table pickled with the Nodes replaced by their indexes
+OBJECTS = ('value', 'update_value', 'code', 'retraverse', 'called', 'onconnectexternal')
+
+NONE = -1  # Index of a missing Node
+ABSENT = -2  # Attribute not set
+
+# Binary format: HEADER, then the (possibly zlib-compressed) sections, each one being its number
+# of items followed by its little-endian items. To increment when the sections change.
+VERSION = 1
+MAGIC = b'DXPG'
+HEADER = struct.Struct('<4sII')  # Magic, version, flags
+COUNT = struct.Struct('<Q')  # Number of items of a section
+COMPRESSED = 1  # Flag
+
+
+class Table:
+    """ Interning of hashable objects, e.g., node names, into integer codes. """
+
+    def __init__(self):
+        self.objects = []
+        self.codes = {}
+
+    def code(self, obj, key=None):
+        if key is None:
+            key = (type(obj), obj)  # True and 1 are different labels
+        if key not in self.codes:
+            self.codes[key] = len(self.objects)
+            self.objects.append(obj)
+        return self.codes[key]
+
+
+class Csr:
+    """ Compressed sparse rows: the elements of node i are elements[offsets[i]:offsets[i+1]]. """
+
+    def __init__(self):
+        self.offsets = array.array('i', [0])
+        self.elements = array.array('i')
+        self.present = bytearray()  # 0 if the attribute is not set on the node
+
+    def add_row(self, elements, present=True):
+        self.elements.extend(elements)
+        self.offsets.append(len(self.elements))
+        self.present.append(present)
+
+    def row(self, i):
+        return self.elements[self.offsets[i]:self.offsets[i + 1]]
+
+    def arrays(self):
+        return self.offsets, self.elements, self.present
+
+
+class Bitsets:
+    """ Rows of node indexes as bitsets: the indexes of node i are bases[i] + the positions of the
+    bits set in the little-endian bits[offsets[i]:offsets[i+1]]. """
+
+    def __init__(self):
+        self.bases = array.array('i')
+        self.offsets = array.array('i', [0])
+        self.bits = bytearray()
+        self.present = bytearray()  # 0 if the attribute is not set on the node
+
+    def add_row(self, elements, present=True):
+        elements = list(elements)
+        base = min(elements, default=0)
+        bitmap = bytearray(((max(elements) - base) >> 3) + 1 if elements else 0)
+        for element in elements:
+            element -= base
+            bitmap[element >> 3] |= 1 << (element & 7)
+        self.bases.append(base)
+        self.bits.extend(bitmap)
+        self.offsets.append(len(self.bits))
+        self.present.append(present)
+
+    def row_bits(self, i):
+        """ Returns (base, bits) of node i, bits being an int. """
+        return self.bases[i], int.from_bytes(self.bits[self.offsets[i]:self.offsets[i + 1]],
+                                             'little')
+
+    def row(self, i):
+        base, bits = self.row_bits(i)
+        return [base + position for position, bit in enumerate(reversed(format(bits, 'b')))
+                if bit == '1']
+
+    def arrays(self):
+        return self.bases, self.offsets, self.bits, self.present
+
+
+class PdgStore:
+    """ PDG in struct-of-arrays form, cf. from_pdg and to_pdg. """
+
+    def __init__(self):
+        self.names = Table()  # Node names, e.g., 'Identifier'
+        self.strings = Table()  # Bodies and filenames
+        self.dependence_kinds = Table()  # (type, label) of Dependence
+        self.classes = array.array('b')
+        self.types = array.array('i')  # Code of the node name
+        self.ids = array.array('q')
+        self.parents = array.array('i')
+        self.ends = array.array('i')  # The descendants of node i are range(i + 1, ends[i])
+        self.bodies = array.array('i')
+        self.body_lists = bytearray()
+        self.filenames = array.array('i')
+        self.children = Csr()
+        self.dependences = {relation: (Csr(), array.array('i'), array.array('i'))
+                            for relation in DEPENDENCES}  # Extremities, kinds, nearest statements
+        self.node_lists = {relation: Csr() for relation in NODE_LISTS}
+        self.node_sets = {relation: Bitsets() for relation in NODE_SETS}
+        self.node_refs = {relation: array.array('i') for relation in NODE_REFS}
+        self.attributes = []
+        self.objects = b''  # Pickled list of {attribute: value} per node
+
+    def __len__(self):
+        return len(self.types)
+
+    @staticmethod
+    def from_pdg(pdg):
+        """
+            Builds the PdgStore of a PDG.
+
+            -------
+            Parameter:
+            - pdg: Node
+                Root of the PDG, e.g., output of get_data_flow.
+
+            -------
+            Returns:
+            - PdgStore
+            - raises ValueError if the PDG references Nodes not in its tree.
+        """
+
+        store = PdgStore()
+        nodes = []
+        todo = [pdg]
+        while todo:  # Preorder
+            node = todo.pop()
+            nodes.append(node)
+            todo.extend(reversed(node.children))
+        indexes = {id(node): i for i, node in enumerate(nodes)}
+
+        def index(node):
+            if node is None:
+                return NONE
+            try:
+                return indexes[id(node)]
+            except KeyError:
+                raise ValueError('%s %s is not in the PDG' % (node.name, node.id))
+
+        objects = []
+        for node in nodes:
+            store.classes.append(CLASS_CODES[type(node)])
+            store.types.append(store.names.code(node.name))
+            store.ids.append(node.id)
+            store.parents.append(index(node.parent) if node is not pdg else NONE)
+            store.bodies.append(store.strings.code(node.body))
+            store.body_lists.append(bool(node.body_list))
+            store.filenames.append(store.strings.code(node.filename))
+            store.children.add_row(index(child) for child in node.children)
+            store.attributes.append(node.attributes)
+
+            for relation, (csr, kinds, nearest) in store.dependences.items():
+                dependences = getattr(node, relation, ())
+                csr.add_row((index(dep.extremity) for dep in dependences),
+                            hasattr(node, relation))
+                for dep in dependences:
+                    kinds.append(store.dependence_kinds.code(
+                        (dep.type, dep.label), key=(dep.type, type(dep.label), dep.label)))
+                    nearest.append(index(dep.nearest_statement))
+            for relations in (store.node_lists, store.node_sets):
+                for relation, rows in relations.items():
+                    present = hasattr(node, relation)
+                    rows.add_row((index(el) for el in getattr(node, relation)) if present else (),
+                                 present)
+            for relation, refs in store.node_refs.items():
+                refs.append(index(getattr(node, relation)) if hasattr(node, relation) else ABSENT)
+            objects.append({attribute: getattr(node, attribute) for attribute in OBJECTS
+                            if hasattr(node, attribute)})
+
+        store.ends = array.array('i', range(1, len(nodes) + 1))
+        for i in range(len(nodes) - 1, -1, -1):
+            last_children = store.children.row(i)[-1:]
+            if last_children:
+                store.ends[i] = store.ends[last_children[0]]
+
+        buffer = io.BytesIO()
+        pickler = pickle.Pickler(buffer, protocol=pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = lambda obj: index(obj) if isinstance(obj, _node.Node) else None
+        pickler.dump(objects)
+        store.objects = buffer.getvalue()
+        return store
+
+    def to_pdg(self):
+        """ Rebuilds the Node objects from the arrays, returns the root of the PDG. """
+
+        nodes = [CLASSES[class_code].__new__(CLASSES[class_code]) for class_code in self.classes]
+
+        def node_at(i):
+            return nodes[i] if i != NONE else None
+
+        names = [sys.intern(name) for name in self.names.objects]  # As the parsed names
+        strings = self.strings.objects
+        for i, node in enumerate(nodes):
+            node.name = names[self.types[i]]
+            node.id = self.ids[i]
+            node.filename = strings[self.filenames[i]]
+            node.attributes = self.attributes[i]
+            node.body = strings[self.bodies[i]]
+            node.body_list = bool(self.body_lists[i])
+            node.parent = node_at(self.parents[i])
+            node.children = [nodes[child] for child in self.children.row(i)]
+            if isinstance(node, _node.Statement):  # Not stored, as after __init__
+                node.loop_defs = None
+            if isinstance(node, _node.Function):
+                node.fun_summaries = {}
+                node.fun_content = None
+
+        utility_df.check_timeout()  # Between the passes, each linear in the nodes
+        for relation, (csr, kinds, nearest) in self.dependences.items():
+            dependence_kinds = self.dependence_kinds.objects
+            for i, node in enumerate(nodes):
+                if not csr.present[i]:
+                    continue
+                dependences = []
+                for position in range(csr.offsets[i], csr.offsets[i + 1]):
+                    dependence_type, label = dependence_kinds[kinds[position]]
+                    dependences.append(_node.Dependence(dependence_type,
+                                                        nodes[csr.elements[position]], label,
+                                                        node_at(nearest[position])))
+                setattr(node, relation, dependences)
+
+        utility_df.check_timeout()
+        for relation, csr in self.node_lists.items():
+            for i, node in enumerate(nodes):
+                if csr.present[i]:
+                    setattr(node, relation, [nodes[el] for el in csr.row(i)])
+
+        utility_df.check_timeout()
+        for relation, refs in self.node_refs.items():
+            for i, node in enumerate(nodes):
+                if refs[i] != ABSENT:
+                    setattr(node, relation, node_at(refs[i]))
+
+        utility_df.check_timeout()
+        self.set_node_sets(nodes)
+
+        unpickler = pickle.Unpickler(io.BytesIO(self.objects))
+        unpickler.persistent_load = lambda i: nodes[i]
+        for node, node_objects in zip(nodes, unpickler.load()):
+            for attribute, value in node_objects.items():
+                setattr(node, attribute, value)
+
+        return nodes[0] if nodes else None
+
+    def set_node_sets(self, nodes):
+        """ Sets the NodeSets of the Nodes, with one int per NodeSet: the Nodes in NodeSets get
+        consecutive indexes in preorder, so that the bitsets keep their bits. """
+
+        node_sets = getattr(self, 'node_sets', {})  # Stored as lists in older PdgStores
+        first = node_set.reserve(len(nodes))
+        used = 0  # Bitset of the Nodes in NodeSets
+        for relation, bitsets in node_sets.items():
+            slot = relation + '_nodes'
+            for i, node in enumerate(nodes):
+                if bitsets.present[i]:
+                    base, bits = bitsets.row_bits(i)
+                    nodes_set = None
+                    if bits:
+                        nodes_set = node_set.NodeSet()
+                        nodes_set.base = first + base
+                        nodes_set.bits = bits
+                        used |= bits << base
+                    setattr(node, slot, nodes_set)
+        used = format(used, 'b')[::-1]  # Bit i at position i
+        i = used.find('1')
+        while i >= 0:
+            node_set.set_index(nodes[i], first + i)
+            i = used.find('1', i + 1)
+
+    def arrays(self):
+        """ Arrays of the PdgStore, in the order of the binary format. """
+
+        arrays = [self.classes, self.types, self.ids, self.parents, self.ends, self.bodies,
+                  self.body_lists, self.filenames]
+        arrays.extend(self.children.arrays())
+        for relation in DEPENDENCES:
+            csr, kinds, nearest = self.dependences[relation]
+            arrays.extend(csr.arrays() + (kinds, nearest))
+        for relation in NODE_LISTS:
+            arrays.extend(self.node_lists[relation].arrays())
+        for relation in NODE_SETS:
+            arrays.extend(self.node_sets[relation].arrays())
+        for relation in NODE_REFS:
+            arrays.append(self.node_refs[relation])
+        return arrays
+
+    def descendants(self, i):
+        """ Indexes of the descendants of node i. """
+        return range(i + 1, self.ends[i])
+
+    def nodes_named(self, name):
+        """ Indexes of the nodes with the given name, e.g., 'CallExpression'. """
+        code = self.names.codes.get((str, name))
+        return [i for i, type_code in enumerate(self.types) if type_code == code]
+
+    def edges(self, relation):
+        """ Yields the (origin, extremity) indexes of a relation, e.g., 'data_dep_children'. """
+        if relation in self.node_sets:
+            bitsets = self.node_sets[relation]
+            for i in range(len(self)):
+                for element in bitsets.row(i):
+                    yield i, element
+            return
+        if relation in self.dependences:
+            csr = self.dependences[relation][0]
+        else:
+            csr = self.node_lists[relation]
+        offsets = csr.offsets
+        elements = csr.elements
+        for i in range(len(self)):
+            for position in range(offsets[i], offsets[i + 1]):
+                yield i, elements[position]
+
+
+def write_section(parts, items):
+    """ Appends the number of items and the little-endian items to parts. """
+
+    parts.append(COUNT.pack(len(items)))
+    if sys.byteorder == 'big' and isinstance(items, array.array):
+        items = array.array(items.typecode, items)
+        items.byteswap()
+    parts.append(items)
+
+
+def read_section(items, view, offset):
+    """ Replaces the content of the array or bytearray items with the section at view[offset:],
+    returns the offset of the next section. """
+
+    nb_items, = COUNT.unpack_from(view, offset)
+    offset += COUNT.size
+    if isinstance(items, bytearray):
+        items[:] = view[offset:offset + nb_items]
+        return offset + nb_items
+    del items[:]
+    end = offset + nb_items * items.itemsize
+    items.frombytes(view[offset:end])
+    if sys.byteorder == 'big':
+        items.byteswap()
+    return end
+
+
+def write_strings(parts, table):
+    """ Appends an interned string table: lengths in bytes, None flags, and UTF-8 bytes. """
+
+    encoded = [string.encode('utf-8', 'surrogatepass') if string is not None else b''
+               for string in table.objects]
+    write_section(parts, array.array('i', (len(string) for string in encoded)))
+    write_section(parts, bytearray(string is None for string in table.objects))
+    write_section(parts, b''.join(encoded))
+
+
+def read_strings(table, view, offset, intern=False):
+    """ Fills table with the string table at view[offset:], returns the offset after it. """
+
+    lengths = array.array('i')
+    nones = bytearray()
+    string_bytes = bytearray()
+    offset = read_section(lengths, view, offset)
+    offset = read_section(nones, view, offset)
+    offset = read_section(string_bytes, view, offset)
+    start = 0
+    for length, none in zip(lengths, nones):
+        string = None
+        if not none:
+            string = string_bytes[start:start + length].decode('utf-8', 'surrogatepass')
+            if intern:  # As the parsed names
+                string = sys.intern(string)
+        table.code(string)
+        start += length
+    return offset
+
+
+def dumps(store, compression=utility_df.PDG_STORE_COMPRESSION):
+    """
+        Serializes a PdgStore into the binary format: the arrays, the interned string tables,
+        and the side tables of plain objects (pickled, with the Nodes as their indexes).
+
+        -------
+        Parameters:
+        - store: PdgStore
+            PDG to serialize.
+        - compression: int
+            zlib compression level of the sections, 0 not to compress them.
+
+        -------
+        Returns:
+        - bytes
+    """
+
+    parts = []
+    for items in store.arrays():
+        write_section(parts, items)
+    write_strings(parts, store.names)
+    write_strings(parts, store.strings)
+    write_section(parts, pickle.dumps((store.dependence_kinds.objects, store.attributes),
+                                      protocol=pickle.HIGHEST_PROTOCOL))
+    write_section(parts, store.objects)
+    payload = b''.join(parts)
+    flags = 0
+    if compression:
+        payload = zlib.compress(payload, compression)
+        flags |= COMPRESSED
+    return HEADER.pack(MAGIC, VERSION, flags) + payload
+
+
+def loads(data):
+    """
+        Deserializes a PdgStore from the binary format.
+
+        -------
+        Parameter:
+        - data: bytes
+            Output of dumps.
+
+        -------
+        Returns:
+        - PdgStore
+        - raises ValueError if data is not in the binary format of this version.
+    """
+
+    magic, version, flags = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a PdgStore of version %d' % VERSION)
+    view = memoryview(data)[HEADER.size:]
+    if flags & COMPRESSED:
+        view = memoryview(zlib.decompress(view))
+
+    store = PdgStore()
+    offset = 0
+    for items in store.arrays():
+        offset = read_section(items, view, offset)
+    offset = read_strings(store.names, view, offset, intern=True)
+    offset = read_strings(store.strings, view, offset)
+    side_tables = bytearray()
+    offset = read_section(side_tables, view, offset)
+    dependence_kinds, store.attributes = pickle.loads(side_tables)
+    for kind in dependence_kinds:
+        store.dependence_kinds.code(kind, key=(kind[0], type(kind[1]), kind[1]))
+    objects = bytearray()
+    read_section(objects, view, offset)
+    store.objects = bytes(objects)
+    return store
+
+
+def dump_pdg(pdg, pdg_file):
+    """ Writes a PDG into the binary file pdg_file, as a PdgStore if utility_df.PDG_STORE. """
+
+    if utility_df.PDG_STORE:
+        pdg_file.write(dumps(PdgStore.from_pdg(pdg)))
+    else:
+        pickle.dump(pdg, pdg_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_pdg(pdg_file):
+    """ Reads a PDG written by dump_pdg, or pickled before the binary format, from the binary
+    file pdg_file. Returns the root Node of the PDG. """
+
+    data = pdg_file.read()
+    if data[:len(MAGIC)] == MAGIC:
+        return loads(data).to_pdg()
+    pdg = pickle.loads(data)  # As Nodes or PdgStore
+    if isinstance(pdg, PdgStore):
+        pdg = pdg.to_pdg()
+    return pdg
+
+
+def traverse_pdg(pdg):
+    """ Full traversal of a PDG of Node objects: AST, data, control and statement dependencies. """
+
+    nb_edges = 0
+    todo = [pdg]
+    while todo:
+        node = todo.pop()
+        for relation in DEPENDENCES:
+            for dependence in getattr(node, relation, ()):
+                if dependence.extremity is not None:
+                    nb_edges += 1
+        todo.extend(node.children)
+    return nb_edges
+
+
+def traverse_store(store):
+    """ Same traversal as traverse_pdg, on a PdgStore: visits each node, in preorder as the
+    arrays, and each of its dependencies, following the CSR offsets. """
+
+    nb_edges = 0
+    csrs = [store.dependences[relation][0] for relation in DEPENDENCES]
+    for i in range(len(store)):
+        for csr in csrs:
+            elements = csr.elements
+            for position in range(csr.offsets[i], csr.offsets[i + 1]):
+                if elements[position] != NONE:
+                    nb_edges += 1
+    return nb_edges
+
+
+def benchmark_store(files):
+    """
+        Compares the Node and PdgStore representations of the PDGs of files: time of a full
+        traversal, size and time of storing (pickle or binary format), and time to load the PDG
+        back as Node objects.
+
+        -------
+        Parameter:
+        - files: list
+            Paths of the JS files to benchmark.
+    """
+
+    from .build_pdg import get_data_flow
+
+    sys.setrecursionlimit(100000)  # Pickling Nodes is recursive
+    print('%-20s %8s %9s %12s %12s %11s %10s' % ('file', 'format', 'nodes', 'traverse (s)',
+                                                 'size (kB)', 'dump (s)', 'load (s)'))
+    for input_file in files:
+        pdg = get_data_flow(input_file, benchmarks=dict())
+        if pdg is None or not pdg.children:
+            continue
+
+        start = timeit.default_timer()
+        traverse_pdg(pdg)
+        traverse_time = timeit.default_timer() - start
+        start = timeit.default_timer()
+        data = pickle.dumps(pdg, protocol=pickle.HIGHEST_PROTOCOL)
+        dump_time = timeit.default_timer() - start
+        start = timeit.default_timer()
+        pickle.loads(data)
+        load_time = timeit.default_timer() - start
+        store = PdgStore.from_pdg(pdg)
+        print('%-20s %8s %9d %12.4f %12.0f %11.3f %10.3f'
+              % (os.path.basename(input_file), 'Node', len(store), traverse_time, len(data) / 1e3,
+                 dump_time, load_time))
+
+        start = timeit.default_timer()
+        traverse_store(store)
+        traverse_time = timeit.default_timer() - start
+        start = timeit.default_timer()
+        data = dumps(PdgStore.from_pdg(pdg))
+        dump_time = timeit.default_timer() - start
+        start = timeit.default_timer()
+        loads(data).to_pdg()
+        load_time = timeit.default_timer() - start
+        print('%-20s %8s %9d %12.4f %12.0f %11.3f %10.3f'
+              % ('', 'PdgStore', len(store), traverse_time, len(data) / 1e3, dump_time,
+                 load_time))
@@ -21,6 +21,7 @@
 import logging
 
 from . import js_operators
+from .call_value import CallValue
 from .value_filters import get_node_computed_value, display_values
 from . import node as _node
 
@@ -256,6 +257,9 @@ def define_obj_properties(member_expression_node, value, initial_node):
     properties = properties[1:]
     properties_value = [get_node_computed_value(prop,
                                                 initial_node=initial_node) for prop in properties]
+    # The properties a() are stored as the str of the call
+    properties_value = [str(prop) if isinstance(prop, CallValue) else prop
+                        for prop in properties_value]
 
     # Good for debugging to see dict content, but cannot be used as loses link to variables
     # if isinstance(value, _node.Node):
@@ -264,8 +268,8 @@ def define_obj_properties(member_expression_node, value, initial_node):
 
     if isinstance(obj_init, dict):  # the obj already have properties
         all_prop = obj_init  # initialize obj with its existing properties
-    elif isinstance(obj_init, str):  # the obj was previously defined with value obj_init
-        all_prop = {obj_init: {}}  # store its previous value as a property to keep it
+    elif isinstance(obj_init, (str, CallValue)):  # the obj was previously defined with obj_init
+        all_prop = {str(obj_init): {}}  # store its previous value as a property to keep it
     else:
         all_prop = {}  # initialize with empty dict
     previous_prop = all_prop
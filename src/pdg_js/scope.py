@@ -20,86 +20,272 @@
 
 import copy
 
+MISSING = object()  # Absent key in a LayeredMap layer
+
+
+class LayeredMap:
+    """
+        Persistent map: snapshot is O(1) amortized and the snapshots share their content.
+        The entries are in layers of dicts: the own layer of the map, then layers frozen by
+        snapshot, which are shared and never modified anymore. A frozen layer is merged with the
+        ones below it that are not bigger, as in a binary counter, so that there are O(log(n))
+        layers to look up.
+    """
+
+    __slots__ = ('layer', 'frozen')
+
+    def __init__(self, frozen=None):
+        self.layer = dict()
+        self.frozen = frozen  # Frozen layers, as a linked list (dict, next frozen layers)
+
+    def get(self, key, default=None):
+        value = self.layer.get(key, MISSING)
+        frozen = self.frozen
+        while value is MISSING and frozen is not None:
+            layer, frozen = frozen
+            value = layer.get(key, MISSING)
+        return default if value is MISSING else value
+
+    def __setitem__(self, key, value):
+        self.layer[key] = value
+
+    def snapshot(self):
+        """ Returns a map with the same content, which can be modified independently. """
+
+        if self.layer:
+            layer = self.layer
+            frozen = self.frozen
+            while frozen is not None and len(frozen[0]) <= len(layer):
+                merged = dict(frozen[0])
+                merged.update(layer)
+                layer = merged
+                frozen = frozen[1]
+            self.frozen = (layer, frozen)
+            self.layer = dict()
+        return LayeredMap(self.frozen)
+
+    def to_dict(self):
+        """ Content of the map, in O(n). """
+
+        layers = [self.layer]
+        frozen = self.frozen
+        while frozen is not None:
+            layers.append(frozen[0])
+            frozen = frozen[1]
+        content = dict()
+        for layer in reversed(layers):
+            content.update(layer)
+        return content
+
+    def changed_keys(self, other):
+        """ Keys which may have a different value in self and other, i.e., those set since their
+        last common snapshot. """
+
+        shared = set()
+        frozen = other.frozen
+        while frozen is not None:
+            shared.add(id(frozen))
+            frozen = frozen[1]
+
+        keys = set(self.layer)
+        frozen = self.frozen
+        while frozen is not None and id(frozen) not in shared:
+            keys.update(frozen[0])
+            frozen = frozen[1]
+        common = frozen  # Frozen layers of both maps
+
+        keys.update(other.layer)
+        frozen = other.frozen
+        while frozen is not common:
+            keys.update(frozen[0])
+            frozen = frozen[1]
+        return keys
+
 
 class Scope:
     """ To apply JS scoping rules. """
 
+    # The variables are in LayeredMaps, so that copying the global scope for each branch of a
+    # condition does not copy all its variables
+
     def __init__(self, name=''):
         self.name = name
-        self.var_list = []
-        self.var_if2_list = []  # Specific to if constructs with 2 possible variables at the end
-        self.unknown_var = set()  # Unknown variable in a given scope
+        self.variables = LayeredMap()  # Position -> Identifier Node, cf. var_list
+        self.nb_var = 0
+        self.variables_if2 = LayeredMap()  # Position -> value, cf. var_if2_list
+        self.nb_var_if2 = 0
+        self.var_positions = LayeredMap()  # Variable name -> tuple of its positions
+        self.duplicates = False  # Whether a variable name has several positions
+        self.unknown_names = LayeredMap()  # Name -> LayeredMap of the unknown variables, by id
         self.function = None
         self.bloc = False  # Indicates if we are in a block statement
-        self.need_to_recompute_var_list = True
-        self.id_name_list = set()
+
+    @property
+    def var_list(self):
+        """ Variables of the scope, in O(n). """
+
+        variables = self.variables.to_dict()
+        return [variables[index] for index in range(self.nb_var)]
+
+    @property
+    def var_if2_list(self):
+        """ Specific to if constructs with 2 possible variables at the end, in O(n). """
+
+        variables_if2 = self.variables_if2.to_dict()
+        return [variables_if2[index] for index in range(self.nb_var_if2)]
+
+    @property
+    def unknown_var(self):
+        """ Unknown variables in a given scope, in O(n). """
+
+        unknown_var = set()
+        for unknowns in self.unknown_names.to_dict().values():
+            unknown_var.update(unknown for unknown in unknowns.to_dict().values()
+                               if unknown is not None)
+        return unknown_var
 
     def set_name(self, name):
         self.name = name
 
     def set_var_list(self, var_list):
-        self.var_list = var_list
-        self.need_to_recompute_var_list = True
+        self.variables = LayeredMap()
+        self.nb_var = 0
+        self.var_positions = LayeredMap()
+        self.duplicates = False
+        for identifier_node in var_list:
+            self.add_var_position(identifier_node)
 
     def set_var_if2_list(self, var_if2_list):
-        self.var_if2_list = var_if2_list
+        self.variables_if2 = LayeredMap()
+        self.nb_var_if2 = 0
+        self.extend_var_if2(var_if2_list)
 
     def set_unknown_var(self, unknown_var):
-        self.unknown_var = unknown_var
+        self.unknown_names = LayeredMap()
+        for unknown in unknown_var:
+            self.add_unknown_var(unknown)
 
     def set_function(self, function):
         self.function = function
 
+    def add_var_position(self, identifier_node):
+        var_name = identifier_node.attributes['name']
+        positions = self.var_positions.get(var_name, ())
+        if positions:
+            self.duplicates = True
+        self.var_positions[var_name] = positions + (self.nb_var,)
+        self.variables[self.nb_var] = identifier_node
+        self.nb_var += 1
+
     def add_var(self, identifier_node):
-        self.var_list.append(identifier_node)
-        self.need_to_recompute_var_list = True
-        self.var_if2_list.append(None)
+        self.add_var_position(identifier_node)
+        self.extend_var_if2([None])
+
+    def get_unknowns(self, var_name, modify=False):
+        unknowns = self.unknown_names.layer.get(var_name)
+        if unknowns is None:
+            unknowns = self.unknown_names.get(var_name)
+            if not modify:
+                return unknowns
+            # Shared with a copy of the scope
+            unknowns = LayeredMap() if unknowns is None else unknowns.snapshot()
+            self.unknown_names[var_name] = unknowns
+        return unknowns
 
     def add_unknown_var(self, unknown):
-        self.unknown_var.add(unknown)  # Set avoids duplicates
+        self.get_unknowns(unknown.attributes['name'], modify=True)[unknown.id] = unknown
 
     def remove_unknown_var(self, unknown):
-        self.unknown_var.remove(unknown)
+        unknowns = self.get_unknowns(unknown.attributes['name'], modify=True)
+        if unknowns.get(unknown.id) is None:
+            raise KeyError(unknown)
+        unknowns[unknown.id] = None
+
+    def get_unknown_var_name(self, var_name):
+        unknowns = self.get_unknowns(var_name)
+        if unknowns is None:
+            return []
+        return [unknown for unknown in unknowns.to_dict().values() if unknown is not None]
 
     def update_var(self, index, identifier_node):
-        self.var_list[index] = identifier_node
-        self.need_to_recompute_var_list = True
-        self.var_if2_list[index] = None
+        old_name = self.variables.get(index).attributes['name']
+        new_name = identifier_node.attributes['name']
+        if old_name != new_name:  # Should not happen, as index is the position of new_name
+            self.var_positions[old_name] = tuple(position for position
+                                                 in self.var_positions.get(old_name)
+                                                 if position != index)
+            self.var_positions[new_name] = tuple(sorted(self.var_positions.get(new_name, ())
+                                                        + (index,)))
+            self.duplicates = True  # No more linear merge, for safety
+        self.variables[index] = identifier_node
+        self.variables_if2[index] = None
 
     def update_var_if2(self, index, identifier_node_list):
-        self.var_if2_list[index] = identifier_node_list
+        self.variables_if2[index] = identifier_node_list
 
     def add_var_if2(self, index, identifier_node):
-        if not isinstance(self.var_if2_list[index], list):
-            self.var_if2_list[index] = []
-        self.var_if2_list[index].append(identifier_node)
+        var_if2 = self.variables_if2.get(index)
+        if not isinstance(var_if2, list):
+            var_if2 = []
+            self.variables_if2[index] = var_if2
+        var_if2.append(identifier_node)
+
+    def extend_var_if2(self, var_if2_list):
+        for var_if2 in var_if2_list:
+            self.variables_if2[self.nb_var_if2] = var_if2
+            self.nb_var_if2 += 1
+
+    def get_var(self, index):
+        return self.variables.get(index)
+
+    def get_var_if2(self, index):
+        return self.variables_if2.get(index)
+
+    def has_var(self, identifier_node):
+        return any(self.variables.get(position).id == identifier_node.id for position
+                   in self.get_positions_name(identifier_node.attributes['name']))
+
+    def changed_positions(self, scope):
+        """ Positions of the variables which may differ between self and scope, e.g., the
+        variables modified in a branch, when both scopes are copies of a same scope. """
+
+        return sorted(self.variables.changed_keys(scope.variables))
 
     def is_equal(self, var_list2):
-        if self.var_list == var_list2.var_list and self.var_if2_list == var_list2.var_if2_list:
-            return True
-        return False
+        if self.nb_var != var_list2.nb_var or self.nb_var_if2 != var_list2.nb_var_if2:
+            return False
+        for index in self.variables.changed_keys(var_list2.variables):
+            if self.variables.get(index) != var_list2.variables.get(index):
+                return False
+        for index in self.variables_if2.changed_keys(var_list2.variables_if2):
+            if self.variables_if2.get(index) != var_list2.variables_if2.get(index):
+                return False
+        return True
 
     def copy_scope(self):
         scope = Scope()
         scope.set_name(copy.copy(self.name))
-        scope.set_var_list(copy.copy(self.var_list))
-        scope.set_var_if2_list(copy.copy(self.var_if2_list))
-        scope.set_unknown_var(copy.copy(self.unknown_var))
+        scope.variables = self.variables.snapshot()
+        scope.nb_var = self.nb_var
+        scope.variables_if2 = self.variables_if2.snapshot()
+        scope.nb_var_if2 = self.nb_var_if2
+        scope.var_positions = self.var_positions.snapshot()
+        scope.duplicates = self.duplicates
+        scope.unknown_names = self.unknown_names.snapshot()
         scope.set_function(copy.copy(self.function))
         return scope
 
-    def get_pos_identifier(self, identifier_node):
-        tmp_list = None
-        if self.need_to_recompute_var_list:
-            tmp_list = [elt.attributes['name'] for elt in self.var_list]
-            self.id_name_list = set(tmp_list)
-            self.need_to_recompute_var_list = False
-        var_name = identifier_node.attributes['name']
-        if var_name in self.id_name_list:
-            if tmp_list is None:
-                tmp_list = [elt.attributes['name'] for elt in self.var_list]
-            return tmp_list.index(var_name)  # Position of identifier_node in var_list
+    def get_pos_name(self, var_name):
+        positions = self.var_positions.get(var_name)
+        if positions:
+            return positions[0]  # First position of a variable named var_name in var_list
         return None  # None if it is not in the list
 
+    def get_positions_name(self, var_name):
+        return self.var_positions.get(var_name, ())  # All positions, e.g., duplicated parameters
+
+    def get_pos_identifier(self, identifier_node):
+        return self.get_pos_name(identifier_node.attributes['name'])
+
     def set_in_bloc(self, bloc):
         self.bloc = bloc
@@ -18,14 +18,14 @@
     Utility file, stores shared information.
 """
 
+import os
 import sys
 import resource
 import timeit
 import logging
-import signal
-import traceback
+import threading
 
-sys.setrecursionlimit(100000)
+sys.setrecursionlimit(100000)  # The data flow and the values are still computed recursively
 
 
 TEST = False
@@ -50,6 +50,22 @@ else:  # To run with multiprocessing
 
     NUM_WORKERS = 1  # CHANGE THIS ONE
 
+PARSER_DAEMON = True  # To reuse long-lived Node.js parser processes instead of one per file
+PARSER_POOL_SIZE = 1  # Number of Node.js parser processes per Python process
+PARSER_MAX_RSS = 2 * 10**9  # Restarts a Node.js parser process once it uses over 2GB
+PARSER_TIMEOUT = 600  # Restarts a Node.js parser process not answering within 10 minutes
+BINARY_AST = True  # To get the Esprima AST in the binary format of binary_ast.js, not in JSON
+# Folder of the content-addressed PDG cache shared by all processes, or None to disable it
+PDG_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'doublex', 'pdg')
+PDG_CACHE_MAX_SIZE = 10 * 10**9  # Evicts the least recently used PDGs over 10GB
+# To iterate over the loops until the definitions reaching their head do not change anymore,
+# instead of unrolling them up to LIMIT_LOOP times
+LOOP_FIXPOINT = False
+FUN_SUMMARIES = True  # To not retraverse a function called again with the same inputs
+LIMIT_SUMMARIES = 20  # Max number of summaries per function, i.e., of inputs stored
+PDG_STORE = True  # To store the PDGs in the binary format of pdg_store.py, not pickled as Nodes
+PDG_STORE_COMPRESSION = 1  # zlib level of the stored PDGs, 0 not to compress them
+
 
 class UpperThresholdFilter(logging.Filter):
     """
@@ -80,26 +96,67 @@ def micro_benchmark(message, elapsed_time):
 
 
 class Timeout:
-    """ Timeout class using ALARM signal. """
+    """ Deadline of a computation, e.g., 10 minutes to build a PDG, checked cooperatively by
+    check_timeout in the loops of the PDG construction and of the analyses. Contrary to an ALARM
+    signal, it works in any thread and it can be nested: entered as a context manager, it is the
+    current deadline of its thread until it exits, but not after its enclosing deadlines. """
 
     class Timeout(Exception):
         """ Timeout class throwing an exception. """
 
-    def __init__(self, sec):
-        self.sec = sec
+    def __init__(self, sec, parent=None):
+        # The budget starts now, e.g., for a deadline given to a function called later
+        self.deadline = timeit.default_timer() + sec
+        self.parent = parent  # Enclosing Timeout/None, e.g., of the caller
+        self.previous = None
 
     def __enter__(self):
-        signal.signal(signal.SIGALRM, self.raise_timeout)
-        signal.alarm(self.sec)
+        self.previous = CURRENT_TIMEOUT.timeout
+        for enclosing in (self.parent, self.previous):
+            if enclosing is not None:
+                self.deadline = min(self.deadline, enclosing.deadline)
+        CURRENT_TIMEOUT.timeout = self
+        return self
 
     def __exit__(self, *args):
-        signal.alarm(0)  # disable alarm
+        CURRENT_TIMEOUT.timeout = self.previous
+
+    def remaining(self):
+        """ Seconds left before the deadline. """
+        return self.deadline - timeit.default_timer()
+
+    def check(self):
+        """ Raises Timeout.Timeout if the deadline is over. """
+        if timeit.default_timer() > self.deadline:
+            raise Timeout.Timeout()
+
+
+class CurrentTimeout(threading.local):
+    """ Innermost Timeout entered by each thread. """
+    timeout = None
+
+
+CURRENT_TIMEOUT = CurrentTimeout()
 
-    def raise_timeout(self, *args):
-        traceback.print_stack(limit=100)
+
+def check_timeout():
+    """ Raises Timeout.Timeout if the current deadline of the thread is over, if any. """
+
+    timeout = CURRENT_TIMEOUT.timeout
+    if timeout is not None and timeit.default_timer() > timeout.deadline:
         raise Timeout.Timeout()
 
 
+CHECK_TIMEOUT_STEPS = 1024  # Iterations of the AST and CFG loops between two check_timeout
+
+
+def remaining_time():
+    """ Seconds left before the current deadline of the thread, or None if there is none. """
+
+    timeout = CURRENT_TIMEOUT.timeout
+    return None if timeout is None else max(timeout.remaining(), 0)
+
+
 def limit_memory(maxsize):
     """ Limiting the memory usage to maxsize (in bytes), soft limit. """
 
@@ -18,6 +18,7 @@
 
 import logging
 from . import node as _node
+from .call_value import CallValue
 from .js_operators import get_node_computed_value, get_node_value
 from . import utility_df
 
@@ -52,11 +53,11 @@ def display_values(var, keep_none=True, check_insecure=True, recompute=False):
         variable = get_node_value(var)
         print('\t' + variable + ' = ' + str(value))  # Prints variable = value
 
-    elif var.name in _node.CALL_EXPR + ['ReturnStatement']:
+    elif var.name in _node.CALL_EXPR or var.name == 'ReturnStatement':
         print('\t' + var.name + ' = ' + str(value))  # Prints variable = value)
 
     if isinstance(value, _node.Node):
         print('\t' + value.name, value.attributes, value.id)
 
-    elif isinstance(value, str) and check_insecure:
-        is_insecure_there(value)  # Checks for usage of insecure APIs
+    elif isinstance(value, (str, CallValue)) and check_insecure:
+        is_insecure_there(str(value))  # Checks for usage of insecure APIs
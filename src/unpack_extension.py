@@ -28,6 +28,8 @@ from urllib.parse import urljoin
 from zipfile import ZipFile
 from bs4 import BeautifulSoup
 
+import library_fingerprints
+
 
 def read_from_zip(zf, filename):
     """ Returns the bytes of the file filename in the archive zf. """
@@ -73,14 +75,10 @@ def pack_and_beautify(extension_zip, scripts):
     """ Appends and beautifies the content of scripts. """
 
     all_content = ""
+    summarized = set()  # Libraries already summarized in this component
 
     for script in scripts:
-        if "jquery" in script.lower() or \
-                not script.endswith(".js") or \
-                script.startswith("https://") \
-                or script.startswith("https://") or \
-                "jq.min.js" in script.lower() or \
-                "jq.js" in script.lower():
+        if not script.endswith(".js") or script.startswith("https://"):
             continue
 
         content = read_from_zip(extension_zip, script)
@@ -88,6 +86,19 @@ def pack_and_beautify(extension_zip, scripts):
             pass
         else:
             continue
+        library = library_fingerprints.match_library(content)
+        if library is not None:  # Known library, whatever its name, not analyzed
+            logging.info('%s is %s %s', script, library['library'], library['version'])
+            if library['library'] not in summarized:
+                summarized.add(library['library'])
+                all_content += "// Known library: %s (%s %s), summary\n" \
+                               % (script, library['library'], library['version'])
+                all_content += library_fingerprints.get_summary(library['library']) + "\n"
+            continue
+        if "jquery" in script.lower() or \
+                "jq.min.js" in script.lower() or \
+                "jq.js" in script.lower():  # Unknown build of jQuery, not analyzed
+            continue
         all_content += "// New file: %s\n" % script
         content = content.replace(b"use strict", b"")
         content = content.replace(b"...", b"")
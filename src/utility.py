@@ -19,7 +19,6 @@
 """
 
 import logging
-import signal
 
 
 TEST = False
@@ -44,23 +43,3 @@ def print_info(my_info):
         print(my_info)
     else:
         logging.info(my_info)
-
-
-class Timeout:
-    """ Timeout class using ALARM signal. Debug for provenance. """
-
-    class Timeout(Exception):
-        """ Timeout class throwing an exception. """
-
-    def __init__(self, sec):
-        self.sec = sec
-
-    def __enter__(self):
-        signal.signal(signal.SIGALRM, self.raise_timeout)
-        signal.alarm(self.sec)
-
-    def __exit__(self, *args):
-        signal.alarm(0)  # disable alarm
-
-    def raise_timeout(self, *args):
-        raise Timeout.Timeout()
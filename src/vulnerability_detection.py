@@ -26,10 +26,13 @@ import json
 import re
 
 import pdg_js.node as _node
+from pdg_js.node_set import NodeSet
+from pdg_js.call_value import CallValue, get_path
 import pdg_js.utility_df as utility_df
 
 import check_permissions
 from get_pdg import get_node_computed_value_e
+from call_sites import get_call_sites
 from extension_communication import build_extension_pdg
 import danger_analysis
 import wa_communication
@@ -64,70 +67,120 @@ In the following, if not stated otherwise:
 """
 
 
-def check_prov_danger(danger_node, to_check_node):
-    """ Checks if danger_node is coming from to_check_node.
-    If it is, returns True, value-from-where-it-comes-from. Otherwise: False, None. """
-
-    found, where = analyze_danger(danger_node, to_check_node)  # Direct check
-    if found:
-        return True, where
-
-    if isinstance(danger_node, _node.Value):
-        for danger_provenance in danger_node.provenance_parents:  # Otherwise, check provenance
-            found, where = analyze_danger(danger_provenance, to_check_node)
-            if found:
-                return True, where
-
-    for child in danger_node.children:
-        # Recursion on children and not provenance as provenance already stores the origin
-        found, where = check_prov_danger(child, to_check_node)
-        if found:
-            return True, where
-
-    return False, None
-
-
-def analyze_danger(danger_node, to_check_node):
-    """ Checks if danger_node is directly coming from to_check_node and returns its value."""
-
-    if isinstance(to_check_node, _node.Node):
-        if danger_node == to_check_node:  # Comparison at the node level
-            danger_node_value = get_node_computed_value_e(danger_node)
-            danger_node_value_str = str(danger_node_value)
-            return True, danger_node_value_str
-
-    return False, None
-
-
-def look_for_vulnerabilities(node, whoami, sinks, dangers):
-    """ Analysis of a PDG to detect dangerous sinks, stored in dangers. """
-
-    for child in node.children:
-        if child.name in ('CallExpression', 'TaggedTemplateExpression'):
-            if len(child.children) > 0 and child.children[0].body in ('callee', 'tag'):
-                callee = child.children[0]
-                call_expr_value = get_node_computed_value_e(callee)
-                call_expr_value_all = get_node_computed_value_e(child)
-                child.set_value(call_expr_value_all)
-                if isinstance(call_expr_value, str):  # No need to check if it is not a str
-                    flagged_sink, sink = danger_analysis.check_dangerous_sinks(child,
-                                                                               call_expr_value,
-                                                                               sinks)
-                    if flagged_sink:  # Dangerous sink used
-                        danger_analysis.add_danger(where=dangers, api_name=sink, api_node=child,
-                                                   api_value=call_expr_value_all,
-                                                   params=child.children[1:])
-
-                elif isinstance(call_expr_value_all, str):  # Special case for asynchronous XHR
-                    # {'XMLHttpRequest()': {}, 'onreadystatechange': <node.FunctionExpr}.open(...)
-                    flagged_xhr, sink = danger_analysis.check_async_xhr(child, call_expr_value_all,
-                                                                        sinks)
-                    if flagged_xhr:  # Dangerous sink used
-                        danger_analysis.add_danger(where=dangers, api_name=sink, api_node=child,
-                                                   api_value=call_expr_value_all,
-                                                   params=child.children[1:])
-
-        look_for_vulnerabilities(child, whoami=whoami, sinks=sinks, dangers=dangers)
+class ProvenanceIndex:
+    """ Nodes that the nodes checked for vulnerabilities may come from, computed once per node
+    after the CS and BP are linked, so that checking a danger against each message received from
+    or sent to the WA does not traverse it again. """
+
+    def __init__(self):
+        self.origins = dict()  # Node -> set of the Nodes it may come from
+        self.provenance = dict()  # Node -> NodeSet of its transitive provenance parents
+
+    def get_provenance_parents(self, node):
+        """
+            Provenance parents of node, completed the first time they are needed.
+
+            The provenance may miss some nodes a node depends on, e.g., when the BP sends a
+            message to the CS, as we only add provenance when computing a value for the first
+            time. For A -> B -> C, C should depend on A too: A, or its provenance parents if any,
+            is added to the provenance parents of C, until they are all visited.
+
+            -------
+            Parameter:
+            - node: Value
+                Node whose provenance parents we want.
+
+            -------
+            Returns:
+            - NodeSet
+                Provenance parents of node, including the missing ones.
+        """
+
+        parents = self.provenance.get(node)
+        if parents is None:
+            parents = NodeSet()
+            if node.provenance_parents:
+                parents.update(node.provenance_parents)
+            visited = NodeSet()
+            while True:  # Until the provenance parents added below are visited too
+                utility_df.check_timeout()
+                to_visit = parents.difference(visited)
+                if not to_visit:
+                    break
+                visited.update(to_visit)
+                for prov in to_visit:  # B
+                    if isinstance(prov, _node.Value):
+                        for prov_parent in prov.provenance_parents:  # A
+                            if prov_parent not in parents:  # if A not in C provenance
+                                logging.debug('Whoops, %s is depending on %s',
+                                              node.attributes, prov_parent.attributes)
+                                add_provenance_parent(parents, prov_parent)
+            self.provenance[node] = parents
+        return parents
+
+    def get_origins(self, danger_node):
+        """ Nodes danger_node may come from: itself, its provenance parents, and those of its
+        descendants (not of its provenance parents, as provenance already stores the origin). """
+
+        origins = self.origins.get(danger_node)
+        if origins is None:
+            origins = set()
+            todo = [danger_node]
+            while todo:
+                node = todo.pop()
+                origins.add(node)
+                if isinstance(node, _node.Value):
+                    origins.update(self.get_provenance_parents(node))
+                todo.extend(node.children)
+            self.origins[danger_node] = origins
+        return origins
+
+    def check_prov_danger(self, danger_node, to_check_node):
+        """ Checks if danger_node is coming from to_check_node.
+        If it is, returns True, value-from-where-it-comes-from. Otherwise: False, None. """
+
+        if isinstance(to_check_node, _node.Node) and to_check_node in self.get_origins(danger_node):
+            danger_node_value = get_node_computed_value_e(to_check_node)
+            return True, str(danger_node_value)
+        return False, None
+
+
+def add_provenance_parent(parents, extremity):
+    """ Adds to the NodeSet parents the provenance parents that Value.set_provenance(extremity)
+    would add. """
+
+    if isinstance(extremity, _node.Value):
+        if extremity.provenance_parents:
+            parents.update(extremity.provenance_parents)
+        else:
+            parents.add(extremity)
+    else:  # Otherwise very restrictive
+        parents.add(extremity)
+        for extremity_child in extremity.children:
+            add_provenance_parent(parents, extremity_child)
+
+
+def look_for_vulnerabilities(pdg, whoami, sinks, dangers):
+    """ Analysis of a PDG to detect the dangerous sinks of the SinkMatcher sinks, stored in the
+    corresponding lists of the Danger dangers. """
+
+    for call_site in get_call_sites(pdg).callee_calls():
+        child = call_site.node
+        call_expr_value = call_site.callee_value()
+        call_expr_value_all = get_node_computed_value_e(child)
+        child.set_value(call_expr_value_all, modified=False)
+        found = dict()
+        if isinstance(call_expr_value, str):  # No need to check if it is not a str
+            found = danger_analysis.check_dangerous_sinks(child, get_path(call_expr_value), sinks)
+        elif isinstance(call_expr_value, CallValue):
+            pass  # a(...)(...) is not a sink, as none ends with a call
+        elif isinstance(call_expr_value_all, CallValue):  # Special case for asynchronous XHR
+            # {'XMLHttpRequest()': {}, 'onreadystatechange': <node.FunctionExpr}.open(...)
+            found = danger_analysis.check_async_xhr(child, call_expr_value_all, sinks)
+        for which, sink in found.items():  # Dangerous sink used
+            danger_analysis.add_danger(where=getattr(dangers, which), api_name=sink,
+                                       api_node=child, api_value=call_expr_value_all,
+                                       params=child.children[1:])
 
 
 def fill_vulnerability_dict(my_dict, wa, wa_node, where):
@@ -139,7 +192,7 @@ def fill_vulnerability_dict(my_dict, wa, wa_node, where):
     my_dict['where'] = where  # Context, value of the node leading to the vulnerability
 
 
-def check_data_exfiltration(danger_id_dict, with_wa, sensitive_api):
+def check_data_exfiltration(danger_id_dict, with_wa, sensitive_api, prov_index):
     """ Checks if the combination dangerous sink + sensitive API is then sent to the web app. """
 
     # If we are here, it means that a sensitive API flew into a dangerous sink.
@@ -150,9 +203,7 @@ def check_data_exfiltration(danger_id_dict, with_wa, sensitive_api):
     to_wa_id = 0
     for sent_to_wa in with_wa.sent_list:
         sent_to_wa_value = get_node_computed_value_e(sent_to_wa)
-        vulnerable, where = check_prov_danger(sent_to_wa, sensitive_api)
-        # sensitive_api_value = get_node_computed_value_e(sensitive_api)
-        # vulnerable2, where2 = check_prov_danger(sent_to_wa, sensitive_api_value)
+        vulnerable, where = prov_index.check_prov_danger(sent_to_wa, sensitive_api)
         if vulnerable:
             to_wa_id += 1
             stri = '_' + str(to_wa_id)
@@ -173,7 +224,7 @@ def search_callback_params(node):
     return []
 
 
-def check_pure_exfiltration(danger_id_dict, with_wa, danger):
+def check_pure_exfiltration(danger_id_dict, with_wa, danger, prov_index):
     """ Checks if the dangerous sink callback is sent to the web app. """
 
     # If we are here, it means that we have a dangerous sink from BP_SINKS_2_WA_CB. We would like to
@@ -186,7 +237,7 @@ def check_pure_exfiltration(danger_id_dict, with_wa, danger):
         for param in params:
             vuln = False
             if isinstance(sent_to_wa, _node.Value) \
-                    and id(param) in [id(prov) for prov in sent_to_wa.provenance_parents]:
+                    and param in prov_index.get_provenance_parents(sent_to_wa):
                 vuln = True
 
             if vuln:
@@ -197,7 +248,7 @@ def check_pure_exfiltration(danger_id_dict, with_wa, danger):
                                         where=get_node_computed_value_e(param))
 
 
-def analyze_all_dangers(dangers_list, dangers_dict, with_wa, what):
+def analyze_all_dangers(dangers_list, dangers_dict, with_wa, what, prov_index):
     """ Analysis of all the dangerous APIs to check their provenance and possibly destination. """
     # what may be:
     # d: for the direct dangers, i: for the indirect dangers, or e: for the pure exfiltration
@@ -207,6 +258,7 @@ def analyze_all_dangers(dangers_list, dangers_dict, with_wa, what):
         danger_id += 1
         logging.debug('Analyzing the dangerous API %s', danger.api_name)
         dangers_id_dict = dangers_dict['danger' + str(danger_id)] = dict()
+        dangers_id_dict['incomplete'] = True  # Until danger is analyzed, e.g., if timeout
         dangers_id_dict['danger'] = danger.api_name  # Dangerous sink
         dangers_id_dict['value'] = danger.api_value  # Corresponding value
         if isinstance(danger.api_params, list):
@@ -229,7 +281,8 @@ def analyze_all_dangers(dangers_list, dangers_dict, with_wa, what):
                 from_wa_id = 0
                 for received_from_wa in with_wa.received_list:
                     received_from_wa_value = get_node_computed_value_e(received_from_wa)
-                    vulnerable, where = check_prov_danger(danger_param, received_from_wa)
+                    vulnerable, where = prov_index.check_prov_danger(danger_param,
+                                                                     received_from_wa)
                     if vulnerable:
                         from_wa_id += 1
                         stri = '_' + str(from_wa_id)
@@ -241,19 +294,44 @@ def analyze_all_dangers(dangers_list, dangers_dict, with_wa, what):
                             # danger depending on data received); data sent back not depending on
                             # danger directly but on returned value, which we do not have access to
                             check_data_exfiltration(danger_id_dict=received, with_wa=with_wa,
-                                                    sensitive_api=received_from_wa)
+                                                    sensitive_api=received_from_wa,
+                                                    prov_index=prov_index)
                             if any(['to_wa' in k for k in received]):
                                 dangers_id_dict['dataflow'] = True  # Vulnerable
                         else:
                             dangers_id_dict['dataflow'] = True  # Vulnerable
 
         else:  # Exfiltration APIs
-            check_pure_exfiltration(danger_id_dict=dangers_id_dict, with_wa=with_wa, danger=danger)
+            check_pure_exfiltration(danger_id_dict=dangers_id_dict, with_wa=with_wa, danger=danger,
+                                    prov_index=prov_index)
             if any(['to_wa' in k for k in dangers_id_dict]):
                 dangers_id_dict['dataflow'] = True  # Vulnerable
 
+        del dangers_id_dict['incomplete']
+
+
+def add_incomplete_dangers(res_dict, extension):
+    """ After a timeout, adds to res_dict the dangers collected in extension but not analyzed,
+    marked incomplete like the one being analyzed, next to the dangers and flows confirmed. """
+
+    for whoami, extension_part in (('cs', extension.cs), ('bp', extension.bp)):
+        dangers = extension_part.dangers
+        whoami_dict = res_dict.setdefault(whoami, dict())
+        for dangers_list, what in ((dangers.direct, 'direct_dangers'),
+                                   (dangers.indirect, 'indirect_dangers'),
+                                   (dangers.exfiltration, 'exfiltration_dangers')):
+            dangers_dict = whoami_dict.setdefault(what, dict())
+            for danger_id, danger in enumerate(dangers_list, 1):
+                if 'danger' + str(danger_id) in dangers_dict:  # Analyzed or being analyzed
+                    continue
+                # Without the values of the sink parameters, which could take long to compute
+                dangers_dict['danger' + str(danger_id)] = {
+                    'incomplete': True, 'danger': danger.api_name, 'value': danger.api_value,
+                    'line': danger.api_node.get_line(), 'filename': danger.api_node.get_file(),
+                    'dataflow': False}
 
-def analyze_vulnerabilities(whoami, res_dict, dangers, with_wa, benchmarks):
+
+def analyze_vulnerabilities(whoami, res_dict, dangers, with_wa, prov_index, benchmarks):
     """ Analyzes a suspicious extension (= with dangerous sinks) to check if it is vulnerable. """
 
     start = timeit.default_timer()
@@ -263,11 +341,11 @@ def analyze_vulnerabilities(whoami, res_dict, dangers, with_wa, benchmarks):
     exfiltration_dict = res_dict[whoami]['exfiltration_dangers'] = dict()
 
     analyze_all_dangers(dangers_list=dangers.direct, dangers_dict=direct_danger_dict,
-                        with_wa=with_wa, what='d')
+                        with_wa=with_wa, what='d', prov_index=prov_index)
     analyze_all_dangers(dangers_list=dangers.indirect, dangers_dict=indirect_danger_dict,
-                        with_wa=with_wa, what='i')
+                        with_wa=with_wa, what='i', prov_index=prov_index)
     analyze_all_dangers(dangers_list=dangers.exfiltration, dangers_dict=exfiltration_dict,
-                        with_wa=with_wa, what='e')
+                        with_wa=with_wa, what='e', prov_index=prov_index)
 
     benchmarks[whoami + ': got vulnerabilities'] = timeit.default_timer() - start
     utility_df.micro_benchmark('Successfully analyzed and collected the vulnerabilities in the '
@@ -283,16 +361,12 @@ def analyze_extension_part(pdg, whoami, with_wa, extension_part, benchmarks, chr
 
     start = timeit.default_timer()
     dangers = extension_part.dangers
-    sinks = extension_part.sinks  # Sinks that should be looked for
+    sinks = extension_part.sink_matcher  # Sinks that should be looked for
 
-    # Fills dangers.direct = directly executable sinks
-    look_for_vulnerabilities(pdg, whoami=whoami, sinks=sinks.direct, dangers=dangers.direct)
-    # Fills dangers.indirect = sinks whose output after execution should be sent back to the web app
-    look_for_vulnerabilities(pdg, whoami=whoami, sinks=sinks.indirect, dangers=dangers.indirect)
-    # Fills sinks.exfiltration = sinks whose output should be sent back to the web app
-    if sinks.exfiltration is not None:
-        look_for_vulnerabilities(pdg, whoami=whoami, sinks=sinks.exfiltration,
-                                 dangers=dangers.exfiltration)
+    # Fills, in one traversal, dangers.direct = directly executable sinks,
+    # dangers.indirect = sinks whose output after execution should be sent back to the web app,
+    # and dangers.exfiltration = sinks whose output should be sent back to the web app
+    look_for_vulnerabilities(pdg, whoami=whoami, sinks=sinks, dangers=dangers)
 
     # Fills with_wa.received_list and with_wa.sent_list
     wa_communication.web_app_communication(pdg, whoami, with_wa, chrome,
@@ -307,7 +381,8 @@ def analyze_extension_part(pdg, whoami, with_wa, extension_part, benchmarks, chr
 
 
 def analyze_extension(cs_path, bp_path, json_analysis=None, pdg=False, chrome=True, war=False,
-                      json_messages=None, json_apis='permissions', manifest_path=None):
+                      json_messages=None, json_apis='permissions', manifest_path=None,
+                      deadline=None):
     """
     Analysis of the complete extension, i.e., CS and BP.
 
@@ -331,6 +406,8 @@ def analyze_extension(cs_path, bp_path, json_analysis=None, pdg=False, chrome=Tr
             respect our template, cf suspicious_apis/README.
     :param manifest_path: str/None, path of the manifest file.
         If None, default will be parent-path-of-<cs_path>/manifest.json.
+    :param deadline: utility_df.Timeout/None, deadline of the caller, e.g., utility_df.Timeout(60)
+        for a budget of 1 minute, which none of the steps of the analysis can go past.
     :return:
     """
 
@@ -344,16 +421,20 @@ def analyze_extension(cs_path, bp_path, json_analysis=None, pdg=False, chrome=Tr
     if manifest_path is None:
         manifest_path = os.path.join(extension_path, 'manifest.json')
 
+    extension = None
     pdg_cs, pdg_bp = build_extension_pdg(cs_path=cs_path, bp_path=bp_path, benchmarks=benchmarks,
-                                         pdg=pdg, chrome=chrome, messages_dict=messages_dict)
+                                         pdg=pdg, chrome=chrome, messages_dict=messages_dict,
+                                         deadline=deadline)
     logging.info('Finished to link CS with BP using the message passing APIs')
 
     try:
-        with utility_df.Timeout(600):  # Tries to analyze an extension within 10 minutes
+        # Tries to analyze an extension within 10 minutes
+        with utility_df.Timeout(600, parent=deadline):
             sensitive_apis = load_sensitive_apis(json_apis, extension_path, manifest_path,
                                                  benchmarks=benchmarks)
             # APIs to be considered
             if sensitive_apis is None:  # Nothing to analyze
+                mark_incomplete(res_dict)
                 store_analysis_results(extension_path, json_analysis, json_messages,
                                        res_dict, messages_dict)
                 return
@@ -377,16 +458,21 @@ def analyze_extension(cs_path, bp_path, json_analysis=None, pdg=False, chrome=Tr
                 return
 
             utility.print_info('---\nVulnerability detection:')
+            prov_index = ProvenanceIndex()  # Shared, e.g., the messages sent to the WA
             analyze_vulnerabilities('cs', res_dict=res_dict, with_wa=with_wa, dangers=cs.dangers,
-                                    benchmarks=benchmarks)
+                                    prov_index=prov_index, benchmarks=benchmarks)
             analyze_vulnerabilities('bp', res_dict=res_dict, with_wa=with_wa, dangers=bp.dangers,
-                                    benchmarks=benchmarks)
+                                    prov_index=prov_index, benchmarks=benchmarks)
 
     except utility_df.Timeout.Timeout:
         logging.exception('Analyzing the extension timed out for %s %s', cs_path, bp_path)
         if 'crashes' not in benchmarks:
             benchmarks['crashes'] = []
         benchmarks['crashes'].append('extension-analysis-timeout')
+        if extension is not None:  # Keeps the dangers found so far
+            add_incomplete_dangers(res_dict, extension)
+
+    mark_incomplete(res_dict)
 
     if PRINT_DEBUG:
         print(json.dumps(res_dict, indent=4, sort_keys=False, default=default, skipkeys=True))
@@ -397,6 +483,14 @@ def analyze_extension(cs_path, bp_path, json_analysis=None, pdg=False, chrome=Tr
                                res_dict, messages_dict)
 
 
+def mark_incomplete(res_dict):
+    """ Marks res_dict as incomplete if a step of the analysis timed out: it then only contains
+    the findings confirmed before, others may be missing. """
+
+    if any(crash.endswith('timeout') for crash in res_dict['benchmarks'].get('crashes', [])):
+        res_dict['incomplete'] = True
+
+
 def load_sensitive_apis(sensitive_apis_path, extension_path, manifest_path, benchmarks):
     """ Loads the sensitive APIs to consider from the sensitive_apis_path JSON file. """
 